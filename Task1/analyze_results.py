@@ -2,95 +2,97 @@
 #!/usr/bin/env python
 
 import os
+import io
 import json
+import contextlib
 import matplotlib.pyplot as plt
 import numpy as np
 import subprocess
-from scapy.all import rdpcap, TCP
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+from common.pcap import read_tcp_columns
+from iperf_stream import parse_iperf_stream
+from flow_analysis import build_flow_table, window_series, flow_summary, flow_selection
+import downsample as ds
+from downsample import downsample
+import result_cache
+from result_cache import cached_artifact
 
+@cached_artifact('iperf', version=2)
 def process_iperf_json(file_path):
     """Process iperf3 JSON output file to extract throughput data"""
-    with open(file_path, 'r') as f:
-        try:
-            data = json.load(f)
-            
-            # Initialize result structure
-            result = {
-                'times': [],
-                'throughputs': [],
-                'goodput': 0,
-                'packet_loss_rate': 0,
-                'retransmits': 0
-            }
-            
-            # Extract interval data (standard format)
-            if 'intervals' in data and data['intervals']:
-                intervals = data.get('intervals', [])
-                for interval in intervals:
-                    result['times'].append(interval['sum']['start'])
-                    result['throughputs'].append(interval['sum']['bits_per_second'] / 1e6)  # Convert to Mbps
-            
-            # Calculate summary statistics
-            if 'end' in data:
-                summary = data['end']
-                
-                # Handle standard format
-                if 'sum_sent' in summary:
-                    sent_data = summary['sum_sent']
-                    result['retransmits'] = sent_data.get('retransmits', 0)
-                    
-                    total_sent = sent_data.get('bytes', 0)
-                    total_time = sent_data.get('seconds', 0)
-                    
-                    if total_time > 0:
-                        result['goodput'] = (total_sent * 8) / total_time / 1e6  # Mbps
-                    else:
-                        # Alternative calculation for goodput if available directly
-                        result['goodput'] = sent_data.get('bits_per_second', 0) / 1e6
-                
-                # Get packet loss information
-                if 'sum' in summary:
-                    sum_data = summary['sum']
-                    if 'lost_packets' in sum_data and 'packets' in sum_data and sum_data['packets'] > 0:
-                        result['packet_loss_rate'] = (sum_data['lost_packets'] / sum_data['packets']) * 100
-            
-            # If we have goodput but no time series data, create a simple one-point series
-            if result['goodput'] > 0 and not result['times']:
-                result['times'] = [0]
-                result['throughputs'] = [result['goodput']]
+    try:
+        # Streamed one interval at a time instead of json.load-ing the whole document
+        data = parse_iperf_stream(file_path)
+        
+        # Initialize result structure
+        result = {
+            'times': [],
+            'throughputs': [],
+            'goodput': 0,
+            'packet_loss_rate': 0,
+            'retransmits': 0
+        }
+        
+        # Extract interval data (standard format)
+        sums = data['sum']
+        if len(sums['start']):
+            result['times'] = sums['start'].tolist()
+            result['throughputs'] = (sums['bits_per_second'] / 1e6).tolist()  # Convert to Mbps
+        
+        # Per-stream series, one column per iperf3 stream (-P)
+        streams = data['streams']
+        result['stream_throughputs'] = streams['bits_per_second'] / 1e6  # Mbps
+        result['stream_bytes'] = streams['bytes']
+        result['stream_retransmits'] = streams['retransmits']
+        result['stream_cwnd'] = streams['snd_cwnd']  # bytes
+        result['stream_rtt'] = streams['rtt'] / 1e3  # ms
+        
+        # Calculate summary statistics
+        summary = data['end']
+        
+        # Handle standard format
+        if 'sum_sent' in summary:
+            sent_data = summary['sum_sent']
+            result['retransmits'] = sent_data.get('retransmits', 0)
             
-            return result
+            total_sent = sent_data.get('bytes', 0)
+            total_time = sent_data.get('seconds', 0)
             
-        except json.JSONDecodeError:
-            print(f"Error: Could not parse JSON from {file_path}")
-            return None
-        except Exception as e:
-            print(f"Error processing {file_path}: {e}")
-            return None
+            if total_time > 0:
+                result['goodput'] = (total_sent * 8) / total_time / 1e6  # Mbps
+            else:
+                # Alternative calculation for goodput if available directly
+                result['goodput'] = sent_data.get('bits_per_second', 0) / 1e6
+        
+        # Get packet loss information
+        if 'sum' in summary:
+            sum_data = summary['sum']
+            if 'lost_packets' in sum_data and 'packets' in sum_data and sum_data['packets'] > 0:
+                result['packet_loss_rate'] = (sum_data['lost_packets'] / sum_data['packets']) * 100
+        
+        # If we have goodput but no time series data, create a simple one-point series
+        if result['goodput'] > 0 and not result['times']:
+            result['times'] = [0]
+            result['throughputs'] = [result['goodput']]
+        
+        return result
+        
+    except json.JSONDecodeError:
+        print(f"Error: Could not parse JSON from {file_path}")
+        return None
+    except Exception as e:
+        print(f"Error processing {file_path}: {e}")
+        return None
 
+@cached_artifact('pcap', version=2)
 def analyze_pcap(file_path):
-    """Analyze pcap file to extract window size data"""
+    """Analyze pcap file to extract per-flow window size data"""
     try:
-        packets = rdpcap(file_path)
-        times = []
-        window_sizes = []
-        
-        for packet in packets:
-            if TCP in packet:
-                # Append packet time
-                times.append(packet.time - packets[0].time)  # Relative time
-                # Extract window size
-                window_sizes.append(packet[TCP].window)
+        packets = read_tcp_columns(file_path)
         
-        # Calculate maximum window size
-        max_window_size = max(window_sizes) if window_sizes else 0
-        
-        return {
-            'times': times,
-            'window_sizes': window_sizes,
-            'max_window_size': max_window_size
-        }
+        # Flow table with window-scaled effective windows (see flow_analysis.window_series)
+        return build_flow_table(packets)
     except Exception as e:
         print(f"Error analyzing pcap file {file_path}: {e}")
         return None
@@ -111,7 +113,7 @@ def plot_throughput_over_time(result_dir, congestion_algos):
             if os.path.exists(file_path):
                 data = process_iperf_json(file_path)
                 if data and data['times'] and data['throughputs']:
-                    plt.plot(data['times'], data['throughputs'], label=algo)
+                    plt.plot(*downsample(data['times'], data['throughputs']), label=algo)
                     has_data = True
                 break
     
@@ -131,7 +133,7 @@ def plot_throughput_over_time(result_dir, congestion_algos):
     plt.close()
     print(f"Saved throughput plot to {output_file}")
 
-def plot_window_size_over_time(result_dir, congestion_algos):
+def plot_window_size_over_time(result_dir, congestion_algos, flow='all', side='server'):
     """Plot window size over time for all congestion algorithms"""
     plt.figure(figsize=(10, 6))
     
@@ -146,17 +148,14 @@ def plot_window_size_over_time(result_dir, congestion_algos):
         for file_path in possible_files:
             if os.path.exists(file_path):
                 data = analyze_pcap(file_path)
-                if data and data['times'] and data['window_sizes']:
-                    # Down-sample if there are too many points
-                    if len(data['times']) > 1000:
-                        indices = np.linspace(0, len(data['times'])-1, 1000, dtype=int)
-                        times = [data['times'][i] for i in indices]
-                        window_sizes = [data['window_sizes'][i] for i in indices]
-                    else:
-                        times = data['times']
-                        window_sizes = data['window_sizes']
+                if data is None:
+                    break
+                all_times, all_windows = window_series(data, flow, side)
+                if len(all_times):
+                    # Down-sample if there are too many points, keeping collapses and spikes
+                    times, window_sizes = downsample(all_times, all_windows)
                     
-                    plt.plot(times, window_sizes, label=f"{algo} (max: {data['max_window_size']})")
+                    plt.plot(times, window_sizes, label=f"{algo} (max: {all_windows.max()})")
                     has_data = True
                 break
     
@@ -176,7 +175,7 @@ def plot_window_size_over_time(result_dir, congestion_algos):
     plt.close()
     print(f"Saved window size plot to {output_file}")
 
-def summarize_results(result_dir, congestion_algos):
+def summarize_results(result_dir, congestion_algos, flow='all', side='server'):
     """Create summary table of results"""
     results = []
     
@@ -202,17 +201,21 @@ def summarize_results(result_dir, congestion_algos):
                     os.path.join(result_dir, f'h1_h7_{algo}.pcap')  # PCAP naming is likely consistent
                 ]
                 
-                window_data = {'max_window_size': 'N/A'}
+                max_window_size = 'N/A'
                 for pcap_path in pcap_paths:
                     if os.path.exists(pcap_path):
                         window_data = analyze_pcap(pcap_path)
+                        if window_data is not None:
+                            _, windows = window_series(window_data, flow, side)
+                            max_window_size = int(windows.max()) if len(windows) else 0
+                            write_flow_summary(window_data, pcap_path[:-len('.pcap')] + '_flows.txt')
                         break
                 
                 results.append({
                     'Algorithm': algo,
                     'Goodput (Mbps)': f"{data['goodput']:.2f}",
                     'Packet Loss (%)': f"{data['packet_loss_rate']:.2f}",
-                    'Max Window Size': window_data['max_window_size'],
+                    'Max Window Size': max_window_size,
                     'Retransmits': data['retransmits']
                 })
     
@@ -238,7 +241,17 @@ def summarize_results(result_dir, congestion_algos):
             f.write("-" * 80 + "\n")
             print("done")
 
-def analyze_experiment_b(result_dir, congestion_algos):
+def write_flow_summary(window_data, output_file):
+    """Write the per-flow window and byte breakdown of one capture"""
+    rows = flow_summary(window_data)
+    with open(output_file, 'w') as f:
+        f.write(f"{'Flow':<5} {'Client':<22} {'Server':<22} {'WScale':<8} {'Packets':<9} {'Bytes C->S':<12} {'Max Win (C)':<12} {'Max Win (S)':<12}\n")
+        f.write("-" * 110 + "\n")
+        for row in rows:
+            wscale = '/'.join(str(s) for s in row['Window Scale'])
+            f.write(f"{row['Flow']:<5} {row['Client']:<22} {row['Server']:<22} {wscale:<8} {row['Packets']:<9} {row['Bytes (client->server)']:<12} {row['Max Window (client)']:<12} {row['Max Window (server)']:<12}\n")
+
+def analyze_experiment_b(result_dir, congestion_algos, flow='all', side='server'):
     """Analyze staggered client experiment results"""
     print(f"\nAnalyzing staggered client experiment in {result_dir}")
     
@@ -259,7 +272,7 @@ def analyze_experiment_b(result_dir, congestion_algos):
                 if data and data['times'] and data['throughputs']:
                     # Adjust times to reflect staggered start
                     adjusted_times = [t + start_times[i] for t in data['times']]
-                    plt.plot(adjusted_times, data['throughputs'], label=f'{client} (start: {start_times[i]}s)')
+                    plt.plot(*downsample(adjusted_times, data['throughputs']), label=f'{client} (start: {start_times[i]}s)')
         
         plt.xlabel('Time (s)')
         plt.ylabel('Throughput (Mbps)')
@@ -285,15 +298,10 @@ def analyze_experiment_b(result_dir, congestion_algos):
         pcap_file = os.path.join(result_dir, f'staggered_{algo}.pcap')
         if os.path.exists(pcap_file):
             data = analyze_pcap(pcap_file)
-            if data and data['times'] and data['window_sizes']:
+            all_times, all_windows = window_series(data, flow, side) if data else ([], [])
+            if len(all_times):
                 # Down-sample if needed
-                if len(data['times']) > 1000:
-                    indices = np.linspace(0, len(data['times'])-1, 1000, dtype=int)
-                    times = [data['times'][i] for i in indices]
-                    window_sizes = [data['window_sizes'][i] for i in indices]
-                else:
-                    times = data['times']
-                    window_sizes = data['window_sizes']
+                times, window_sizes = downsample(all_times, all_windows)
                 
                 plt.plot(times, window_sizes, label=f"{algo}")
     
@@ -409,7 +417,7 @@ def analyze_experiment_c(result_dir, congestion_algos):
                     if os.path.exists(file_path):
                         data = process_iperf_json(file_path)
                         if data and data['times'] and data['throughputs']:
-                            plt.plot(data['times'], data['throughputs'], label=f'{client} throughput')
+                            plt.plot(*downsample(data['times'], data['throughputs']), label=f'{client} throughput')
             
             plt.xlabel('Time (s)')
             plt.ylabel('Throughput (Mbps)')
@@ -484,7 +492,7 @@ def analyze_packet_loss_experiment(result_dir, congestion_algos, loss_rate):
             times = sorted(avg_throughputs.keys())
             throughputs = [avg_throughputs[t] / client_count for t in times]
             
-            plt.plot(times, throughputs, label=f"{algo}")
+            plt.plot(*downsample(times, throughputs), label=f"{algo}")
     
     plt.xlabel('Time (s)')
     plt.ylabel('Average Throughput per Client (Mbps)')
@@ -577,42 +585,118 @@ def analyze_packet_loss_experiment(result_dir, congestion_algos, loss_rate):
             f.write("-" * 80 + "\n")
         print(f"Saved {loss_rate}% loss experiment summary to {result_dir}/loss_{loss_rate}pct_summary.txt")
 
+EXPERIMENT_DIRS = {
+    'a': 'results/experiment_a',
+    'b': 'results/experiment_b',
+    'c': 'results/experiment_c',
+    'd1': 'results/experiment_d_1',
+    'd5': 'results/experiment_d_5',
+}
+
+CONGESTION_ALGOS = ['cubic', 'vegas', 'htcp']
+
+def analyze_experiment(experiment, congestion_algos, flow='all', side='server'):
+    """Run every plot and summary for one experiment"""
+    result_dir = EXPERIMENT_DIRS[experiment]
+    if not os.path.exists(result_dir):
+        return
+    
+    if experiment == 'a':
+        plot_throughput_over_time(result_dir, congestion_algos)
+        plot_window_size_over_time(result_dir, congestion_algos, flow, side)
+        summarize_results(result_dir, congestion_algos, flow, side)
+    elif experiment == 'b':
+        analyze_experiment_b(result_dir, congestion_algos, flow, side)
+    elif experiment == 'c':
+        analyze_experiment_c(result_dir, congestion_algos)
+    elif experiment == 'd1':
+        analyze_packet_loss_experiment(result_dir, congestion_algos, 1)
+    elif experiment == 'd5':
+        analyze_packet_loss_experiment(result_dir, congestion_algos, 5)
+
+def experiment_artifacts(experiment, algo):
+    """List the iperf3 JSON and pcap files an experiment recorded for one algorithm"""
+    result_dir = EXPERIMENT_DIRS[experiment]
+    if not os.path.isdir(result_dir):
+        return []
+    return sorted(os.path.join(result_dir, name) for name in os.listdir(result_dir)
+                  if name.endswith((f'_{algo}.json', f'_{algo}.pcap')))
+
+def init_worker(cache_dir, cache_enabled, max_points, downsample_method):
+    """Process pool initializer: headless plotting and the parent's cache and plot settings"""
+    plt.switch_backend('Agg')
+    result_cache.configure(cache_dir=cache_dir, enabled=cache_enabled)
+    ds.configure(points=max_points, how=downsample_method)
+
+def artifact_parser(path):
+    return process_iperf_json if path.endswith('.json') else analyze_pcap
+
+def prepare_unit(experiment, algo):
+    """Parse one experiment x algorithm work unit and return its (path, result) pairs"""
+    return [(path, artifact_parser(path)(path)) for path in experiment_artifacts(experiment, algo)]
+
+def render_experiment(experiment, congestion_algos, flow, side, parsed=()):
+    """Render one experiment in a worker from already parsed artifacts and return everything it printed"""
+    for path, result in parsed:
+        if result is not None:
+            artifact_parser(path).seed(path, result)
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        analyze_experiment(experiment, congestion_algos, flow, side)
+    return out.getvalue()
+
+def analyze_parallel(experiments, congestion_algos, jobs, cache_dir, cache_enabled, flow='all', side='server'):
+    """Analyze experiments on a process pool.
+
+    Every experiment x algorithm unit is first parsed in parallel (and stored in
+    the on-disk cache when it is enabled); the parsed results are handed to the
+    per-experiment render tasks, which draw the plots and summary tables in
+    parallel, and their output is printed in experiment order.
+    """
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker,
+                             initargs=(cache_dir, cache_enabled, ds.max_points, ds.method)) as pool:
+        units = {experiment: [pool.submit(prepare_unit, experiment, algo) for algo in congestion_algos]
+                 for experiment in experiments}
+        renders = []
+        for experiment in experiments:
+            parsed = [pair for unit in units[experiment] for pair in unit.result()]
+            renders.append(pool.submit(render_experiment, experiment, congestion_algos, flow, side, parsed))
+        for render in renders:
+            print(render.result(), end='')
+
 def main():
     parser = argparse.ArgumentParser(description='Analyze TCP congestion control experiment results')
     parser.add_argument('--experiment', choices=['a', 'b', 'c', 'd1', 'd5', 'all'], default='all',
                       help='Experiment results to analyze')
+    parser.add_argument('--cache-dir', default=result_cache.DEFAULT_CACHE_DIR,
+                      help='Directory for cached parsed artifacts')
+    parser.add_argument('--no-cache', action='store_true',
+                      help='Re-parse every artifact instead of using the on-disk cache')
+    parser.add_argument('--jobs', type=int, default=1,
+                      help='Worker processes for the analysis (0 uses every core)')
+    parser.add_argument('--max-points', type=int, default=ds.max_points,
+                      help='Point budget for each plotted time series')
+    parser.add_argument('--downsample', choices=ds.METHODS, default=ds.method,
+                      help='Downsampling method: lttb (shape-preserving) or minmax (per-bucket envelope)')
+    parser.add_argument('--window-flow', type=flow_selection, default='all',
+                      help="Window series to plot: 'all' packets, 'sum' of per-flow windows, or a flow index")
+    parser.add_argument('--window-side', choices=['server', 'client', 'both'], default='server',
+                      help='Endpoint whose advertised receive window is analyzed (server is the iperf3 receiver)')
     
     args = parser.parse_args()
     experiment = args.experiment
-    
-    congestion_algos = ['cubic', 'vegas', 'htcp']
-    
-    if experiment == 'a' or experiment == 'all':
-        result_dir = 'results/experiment_a'
-        if os.path.exists(result_dir):
-            plot_throughput_over_time(result_dir, congestion_algos)
-            plot_window_size_over_time(result_dir, congestion_algos)
-            summarize_results(result_dir, congestion_algos)
-    
-    if experiment == 'b' or experiment == 'all':
-        result_dir = 'results/experiment_b'
-        if os.path.exists(result_dir):
-            analyze_experiment_b(result_dir, congestion_algos)
-    
-    if experiment == 'c' or experiment == 'all':
-        result_dir = 'results/experiment_c'
-        if os.path.exists(result_dir):
-            analyze_experiment_c(result_dir, congestion_algos)
-    
-    if experiment == 'd1' or experiment == 'all':
-        result_dir = 'results/experiment_d_1'
-        if os.path.exists(result_dir):
-            analyze_packet_loss_experiment(result_dir, congestion_algos, 1)
-    
-    if experiment == 'd5' or experiment == 'all':
-        result_dir = 'results/experiment_d_5'
-        if os.path.exists(result_dir):
-            analyze_packet_loss_experiment(result_dir, congestion_algos, 5)
+    result_cache.configure(cache_dir=args.cache_dir, enabled=not args.no_cache)
+    ds.configure(points=args.max_points, how=args.downsample)
+    
+    experiments = list(EXPERIMENT_DIRS) if experiment == 'all' else [experiment]
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count() or 1
+    
+    if jobs > 1:
+        analyze_parallel(experiments, CONGESTION_ALGOS, jobs, args.cache_dir, not args.no_cache,
+                         args.window_flow, args.window_side)
+    else:
+        for name in experiments:
+            analyze_experiment(name, CONGESTION_ALGOS, args.window_flow, args.window_side)
 
     print("Analysis complete!")
 
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+
+import os
+import re
+import json
+import subprocess
+import threading
+import numpy as np
+from mn_log import info, warn
+from host_jobs import HostJob, wait_for_output
+from common.pcap import read_tcp_columns
+from flow_analysis import format_endpoint, group_flows, handshakes
+
+# Ethernet (14) + two VLAN tags (8) + IPv4 with options (60) + TCP with options (60),
+# so SACK blocks and other TCP options are never cut off
+HEADER_SNAPLEN = 142
+
+TCP_FIN, TCP_SYN, TCP_RST = 0x01, 0x02, 0x04
+
+
+class FlowCounters:
+    """Running per-flow window, byte and flag counters, fed one capture file at a time.
+
+    State is kept per normalized 4-tuple, so connections spanning several ring files
+    keep their handshake (client side and window scale) from the file it was seen in.
+    Maximum windows are kept raw per direction and scaled when reported, which is
+    exact because a direction's shift is fixed for the connection's lifetime.
+    """
+
+    def __init__(self):
+        self.flows = {}
+        self.packets = 0
+        self.files = 0
+
+    def _state(self, lo, hi):
+        key = (lo, hi)
+        if key not in self.flows:
+            self.flows[key] = {
+                'client_is_lo': None,
+                'wscale': [-1, -1],  # [lo, hi]
+                'packets': [0, 0],
+                'bytes': [0, 0],
+                'max_window': [0, 0],
+                'syn': 0, 'fin': 0, 'rst': 0,
+                'first': None, 'last': None,
+            }
+        return self.flows[key]
+
+    def update(self, cols):
+        """Fold one file's decoded TCP columns (common.pcap.TCP_DTYPE) into the counters"""
+        self.files += 1
+        if not len(cols):
+            return
+        self.packets += len(cols)
+        pairs, flow, from_lo = group_flows(cols)
+        n = len(pairs)
+        syn_from_lo, wscale = handshakes(cols, flow, from_lo, n)
+
+        group = flow * 2 + ~from_lo
+        flags = cols['flags']
+        syn = (flags & TCP_SYN) != 0
+        packets = np.bincount(group, minlength=2 * n).reshape(n, 2)
+        data = np.bincount(group, weights=cols['payload_len'], minlength=2 * n).reshape(n, 2)
+        max_window = np.zeros(2 * n, dtype=np.int64)
+        np.maximum.at(max_window, group[~syn], cols['window'][~syn].astype(np.int64))
+        max_window = max_window.reshape(n, 2)
+        counts = {name: np.bincount(flow, weights=(flags & bit) != 0, minlength=n)
+                  for name, bit in (('syn', TCP_SYN), ('fin', TCP_FIN), ('rst', TCP_RST))}
+        first = np.full(n, np.inf)
+        last = np.full(n, -np.inf)
+        np.minimum.at(first, flow, cols['time'])
+        np.maximum.at(last, flow, cols['time'])
+
+        for i in range(n):
+            state = self._state(int(pairs[i, 0]), int(pairs[i, 1]))
+            for d in (0, 1):
+                state['packets'][d] += int(packets[i, d])
+                state['bytes'][d] += int(data[i, d])
+                state['max_window'][d] = max(state['max_window'][d], int(max_window[i, d]))
+                # SYN and SYN-ACK carry the window scale; the bare-SYN sender is the client
+                if wscale[i, d] >= 0:
+                    state['wscale'][d] = int(wscale[i, d])
+            if syn_from_lo[i] >= 0:
+                state['client_is_lo'] = bool(syn_from_lo[i])
+            for name in counts:
+                state[name] += int(counts[name][i])
+            state['first'] = float(first[i]) if state['first'] is None else min(state['first'], float(first[i]))
+            state['last'] = float(last[i]) if state['last'] is None else max(state['last'], float(last[i]))
+
+    def summary(self):
+        """Per-flow rows oriented client -> server, with window-scaled maximum windows"""
+        rows = []
+        for (lo, hi), state in sorted(self.flows.items(), key=lambda kv: kv[1]['first']):
+            # Without a captured SYN, the side that sent more payload is the client (iperf3 sender)
+            client_is_lo = state['client_is_lo']
+            if client_is_lo is None:
+                client_is_lo = state['bytes'][0] >= state['bytes'][1]
+            c, s = (0, 1) if client_is_lo else (1, 0)
+            scaled = all(w >= 0 for w in state['wscale'])
+            shift = [w if scaled else 0 for w in state['wscale']]
+            rows.append({
+                'Client': format_endpoint(lo if client_is_lo else hi),
+                'Server': format_endpoint(hi if client_is_lo else lo),
+                'Window Scale': [state['wscale'][c], state['wscale'][s]],
+                'Packets': state['packets'][c] + state['packets'][s],
+                'Bytes (client->server)': state['bytes'][c],
+                'Bytes (server->client)': state['bytes'][s],
+                'Max Window (client)': state['max_window'][c] << shift[c],
+                'Max Window (server)': state['max_window'][s] << shift[s],
+                'SYN': state['syn'], 'FIN': state['fin'], 'RST': state['rst'],
+                'Duration (s)': state['last'] - state['first'],
+            })
+        return rows
+
+
+class RingCapture:
+    """Header-only tcpdump capture into a bounded ring of files, summarized while it runs.
+
+    tcpdump keeps at most `ring_files` files of `file_mb` MB with `HEADER_SNAPLEN`
+    bytes per packet, and runs `echo FILE` (-z) after closing each one, so its
+    stdout lists the closed files in order. One thread counts those rotations and
+    another folds each closed file into a FlowCounters, so when the run stops only
+    the last, partially filled file is left to summarize.
+
+    File number k of the run lives at ring index k % ring_files and is overwritten
+    by file k + ring_files. A file that may have been reused before or while it was
+    read is dropped and counted as lost rather than mixed with newer packets.
+    """
+
+    def __init__(self, host, ring_dir, summary_file=None, file_mb=16, ring_files=8):
+        self.host = host
+        self.ring_dir = ring_dir
+        self.summary_file = summary_file
+        self.ring_files = ring_files
+        self.counters = FlowCounters()
+        self.closed = []  # paths of the files tcpdump has closed, by file number
+        self.summarized = 0  # closed files folded into the counters or lost
+        self.lost = 0
+        self._eof = False
+        self._changed = threading.Condition()
+        os.makedirs(ring_dir, exist_ok=True)
+
+        base = os.path.join(ring_dir, 'ring')
+        cmd = (f'tcpdump -i {host.defaultIntf().name} -s {HEADER_SNAPLEN} '
+               f'-C {file_mb} -W {ring_files} -z echo -w {base} tcp')
+        self.job = HostJob(host, cmd, stdout=subprocess.PIPE)
+        wait_for_output(self.job, 'listening on')
+        self.reader = threading.Thread(target=self._read_rotations, daemon=True)
+        self.thread = threading.Thread(target=self._watch, daemon=True)
+        self.reader.start()
+        self.thread.start()
+
+    @property
+    def rotations(self):
+        """Files closed so far; tcpdump is writing file number `rotations`"""
+        return len(self.closed)
+
+    def _ring_paths(self):
+        """Map ring index -> path for the files tcpdump has created so far"""
+        paths = {}
+        for name in os.listdir(self.ring_dir):
+            match = re.fullmatch(r'ring(\d*)', name)
+            if match:
+                paths[int(match.group(1) or 0)] = os.path.join(self.ring_dir, name)
+        return paths
+
+    def _reused(self, number):
+        """True once tcpdump may have started overwriting file `number`. Its echo for a
+        rotation can lag the open of the next file, so one rotation short already counts."""
+        return self.rotations >= number + self.ring_files - 1
+
+    def _summarize(self, number, path):
+        if self._reused(number):
+            self._lose(path)
+            return
+        try:
+            cols = read_tcp_columns(path)
+        except (OSError, ValueError) as e:
+            warn(f'*** Could not summarize {path}: {e}\n')
+            return
+        if self._reused(number):
+            self._lose(path)
+            return
+        self.counters.update(cols)
+
+    def _lose(self, path):
+        self.lost += 1
+        warn(f'*** {path} was reused by the capture ring before it could be summarized\n')
+
+    def _read_rotations(self):
+        for line in self.job.proc.stdout:
+            with self._changed:
+                self.closed.append(line.decode().strip())
+                self._changed.notify_all()
+        with self._changed:
+            self._eof = True
+            self._changed.notify_all()
+
+    def _watch(self):
+        while True:
+            with self._changed:
+                self._changed.wait_for(lambda: self._eof or self.summarized < self.rotations)
+                if self.summarized == self.rotations:
+                    return
+                number = self.summarized
+                path = self.closed[number]
+            self._summarize(number, path)
+            self.summarized += 1
+
+    def stop(self):
+        """Stop tcpdump, summarize the remaining files and write the summary JSON (if requested)"""
+        self.job.stop()
+        # tcpdump's stdout closes once it and its echo children have exited
+        self.reader.join()
+        self.thread.join()
+        # The file tcpdump was writing when it stopped is never reported as closed
+        path = self._ring_paths().get(self.rotations % self.ring_files)
+        if path:
+            self._summarize(self.rotations, path)
+
+        rows = self.counters.summary()
+        if self.summary_file:
+            with open(self.summary_file, 'w') as f:
+                json.dump({'packets': self.counters.packets, 'files': self.counters.files, 'lost_files': self.lost,
+                           'ring_dir': self.ring_dir, 'flows': rows}, f, indent=2)
+            info(f'*** Capture summary ({len(rows)} flows, {self.counters.packets} packets) '
+                 f'written to {self.summary_file}\n')
+        return rows
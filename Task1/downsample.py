@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+import numpy as np
+
+METHODS = ('lttb', 'minmax')
+
+# Point budget used by every Task1 time-series plot (see configure)
+max_points = 1000
+method = 'lttb'
+
+
+def _bucket_edges(start, stop, buckets):
+    """Split [start, stop) into `buckets` contiguous, near-equal index ranges"""
+    return np.linspace(start, stop, buckets + 1).astype(np.int64)
+
+
+def lttb(x, y, n_out):
+    """Largest-Triangle-Three-Buckets: keep the point of each bucket that forms the
+    largest triangle with the previously kept point and the next bucket's mean.
+
+    The first and last points are always kept. Work is O(n): each bucket is scored
+    with one vectorized expression and bucket means come from cumulative sums.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return x, y
+    xf = np.asarray(x, dtype=np.float64)
+    yf = np.asarray(y, dtype=np.float64)
+
+    edges = _bucket_edges(1, n - 1, n_out - 2)
+    cx = np.r_[0.0, np.cumsum(xf)]
+    cy = np.r_[0.0, np.cumsum(yf)]
+    counts = edges[1:] - edges[:-1]
+    mean_x = (cx[edges[1:]] - cx[edges[:-1]]) / np.maximum(counts, 1)
+    mean_y = (cy[edges[1:]] - cy[edges[:-1]]) / np.maximum(counts, 1)
+    # The "next bucket" of the last bucket is the final point
+    next_x = np.r_[mean_x[1:], xf[-1]]
+    next_y = np.r_[mean_y[1:], yf[-1]]
+
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if hi <= lo:
+            keep[i + 1] = a
+            continue
+        ax, ay = xf[a], yf[a]
+        area = np.abs((ax - next_x[i]) * (yf[lo:hi] - ay) - (ax - xf[lo:hi]) * (next_y[i] - ay))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    keep = np.unique(keep)
+    return x[keep], y[keep]
+
+
+def minmax(x, y, n_out):
+    """Per-bucket min/max envelope: keep the lowest and highest point of each bucket in time order.
+
+    Buckets are padded to equal width and reduced with one argmin/argmax each, so the
+    window collapses and spikes inside a bucket always survive.
+    """
+    n = len(x)
+    buckets = (n_out - 2) // 2  # two points per bucket plus both end points
+    if n_out >= n or buckets < 1:
+        return x, y
+    yf = np.asarray(y, dtype=np.float64)
+    width = -(-n // buckets)  # ceil
+    padded = np.full(buckets * width, np.nan)
+    padded[:n] = yf
+    padded = padded.reshape(buckets, width)
+    base = np.arange(buckets) * width
+
+    lows = base + np.argmin(np.where(np.isnan(padded), np.inf, padded), axis=1)
+    highs = base + np.argmax(np.where(np.isnan(padded), -np.inf, padded), axis=1)
+    keep = np.unique(np.concatenate([lows, highs, [0, n - 1]]))
+    keep = keep[keep < n]
+    return x[keep], y[keep]
+
+
+def downsample(x, y, n_out=None, how=None):
+    """Reduce a time series to the configured point budget with the configured method"""
+    x = np.asarray(x)
+    y = np.asarray(y)
+    n_out = max_points if n_out is None else n_out
+    how = method if how is None else how
+    if how == 'lttb':
+        return lttb(x, y, n_out)
+    if how == 'minmax':
+        return minmax(x, y, n_out)
+    raise ValueError(f'unknown downsampling method {how!r}')
+
+
+def configure(points=None, how=None):
+    """Set the point budget and method used by downsample()"""
+    global max_points, method
+    if points is not None:
+        max_points = points
+    if how is not None:
+        if how not in METHODS:
+            raise ValueError(f'unknown downsampling method {how!r}')
+        method = how
@@ -1,53 +1,161 @@
 #!/usr/bin/env python
 
 import os
+import sys
 import time
 import subprocess
 import argparse
-from mininet.net import Mininet
-from mininet.cli import CLI
-from mininet.log import setLogLevel, info
-from mn_topology import setup_network
+from mn_log import setLogLevel, info, warn
+from capture import RingCapture
+from iperf_live import LiveClient, run_live_clients, json_stream_supported
+from tcp_sampler import TcpSampler
+from userspace_net import EmuNet
+from host_jobs import HostJob, COMPLETION_GRACE, wait_all, wait_for_port, wait_for_output
 
 CONGESTION_ALGOS = ['cubic', 'vegas', 'htcp']
 
+# 'full': one complete pcap per run; 'ring': header-only ring buffer summarized during the run;
+# 'none': no capture (the userspace network has no per-host interface to capture on)
+CAPTURE_SETTINGS = {'mode': 'full', 'file_mb': 16, 'ring_files': 8}
+
+# 'live': clients stream their intervals (iperf3 >= 3.17 --json-stream) and failures are retried;
+# run_experiments falls back to plain -J clients when the installed iperf3 is older
+CLIENT_SETTINGS = {'live': True, 'retries': 2, 'report_every': 10, 'generator': 'iperf3'}
+
+# Sender-side `ss -tin` sampling period in seconds (0: off), written next to the pcap
+SAMPLER_SETTINGS = {'interval': 0}
+
+# Built-in generator: takes the iperf3 flags used here and writes the same JSON
+TRAFFIC_GEN = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'traffic_gen.py')
+
+# Unsent bytes the built-in generator may queue per socket on the userspace network
+EMULATED_NOTSENT_LOWAT = 128 * 1024
+
+def traffic_tool():
+    """Command that runs the configured traffic generator (iperf3 or traffic_gen.py)"""
+    if CLIENT_SETTINGS['generator'] == 'builtin':
+        return f'{sys.executable} {TRAFFIC_GEN}'
+    return 'iperf3'
+
+def bind_option(host, role):
+    """-B option pinning a client or server to its emulated host address (userspace_net hosts only)"""
+    address = getattr(host, f'{role}_address', None)
+    if not address:
+        return ''
+    if role == 'bind' and CLIENT_SETTINGS['generator'] == 'builtin':
+        # Loopback send buffers grow to megabytes ahead of the emulated links; cap the
+        # unsent backlog so the sender's interval byte counts follow the link rate
+        return f' -B {address} --notsent-lowat {EMULATED_NOTSENT_LOWAT}'
+    return f' -B {address}'
+
 def start_capture(net, host, output_file):
-    """Start tcpdump on a host"""
+    """Start tcpdump on a host and wait until it is capturing"""
     os.makedirs(os.path.dirname(output_file), exist_ok=True)
     
-    cmd = f'tcpdump -i {host.defaultIntf().name} -w {output_file} tcp &'
-    host.cmd(cmd)
-    return host.lastPid 
+    if CAPTURE_SETTINGS['mode'] == 'none':
+        return None
+    if CAPTURE_SETTINGS['mode'] == 'ring':
+        base = os.path.splitext(output_file)[0]
+        return RingCapture(host, f'{base}_ring', summary_file=f'{base}_summary.json',
+                           file_mb=CAPTURE_SETTINGS['file_mb'], ring_files=CAPTURE_SETTINGS['ring_files'])
+    
+    cmd = f'tcpdump -i {host.defaultIntf().name} -w {output_file} tcp'
+    job = HostJob(host, cmd)
+    wait_for_output(job, 'listening on')
+    return job
 
-def stop_capture(host, pid):
-    """Stop tcpdump on a host"""
-    host.cmd(f'kill -9 {pid}')
-    time.sleep(1) 
+def stop_capture(host, job):
+    """Stop tcpdump on a host and wait for it to flush the capture file"""
+    if job is not None:
+        job.stop()  # a RingCapture also finishes its streaming summary here
 
 def run_server(server_host, port=5201):
-    """Run iperf3 server"""
-    cmd = f'iperf3 -s -p {port} -D'  # Run in daemon mode
-    server_host.cmd(cmd)
+    """Start an iperf3 server and return its HostJob once the port is listening"""
+    # In the foreground, so stop_server ends exactly this process: hosts share the
+    # machine's PID namespace, and a pkill would also hit servers we did not start
+    cmd = f'{traffic_tool()} -s -p {port}' + bind_option(server_host, 'listen')
+    job = HostJob(server_host, cmd, stderr=subprocess.DEVNULL)
+    wait_for_port(server_host, port)
     info(f'*** Server started on {server_host.name} port {port}\n')
-    time.sleep(1)  
+    return job
+
+def stop_server(server_host, job, port=5201):
+    """Stop a server started by run_server and wait until its port is released"""
+    job.stop()
+    wait_for_port(server_host, port, listening=False)
+
+def start_client(client_host, server_ip, output_file, port=5201, bw='10M', parallel=10, duration=150, cong_ctrl='cubic'):
+    """Start an iperf3 client in the background and return its HostJob"""
+    cmd = (f'{traffic_tool()} -c {server_ip} -p {port} -b {bw} -P {parallel} -t {duration} -C {cong_ctrl} -J'
+           + bind_option(client_host, 'bind'))
+    info(f'*** Starting client on {client_host.name} with {cong_ctrl} for {duration}s\n')
+    return HostJob(client_host, cmd, output_file=output_file, timeout=duration + COMPLETION_GRACE)
 
-def run_client(client_host, server_ip, port=5201, bw='10M', parallel=10, duration=150, cong_ctrl='cubic'):
+def start_live_client(client_host, server_ip, output_file, port=5201, bw='10M', parallel=10, duration=150, cong_ctrl='cubic'):
+    """Start an iperf3 client whose interval reports are consumed while it runs"""
+    cmd = (f'{traffic_tool()} -c {server_ip} -p {port} -b {bw} -P {parallel} -t {duration} -C {cong_ctrl} '
+           f'-J --json-stream --forceflush' + bind_option(client_host, 'bind'))
+    info(f'*** Starting client on {client_host.name} with {cong_ctrl} for {duration}s\n')
+    return LiveClient(client_host, cmd, output_file, timeout=duration + COMPLETION_GRACE)
+
+def run_client(client_host, server_ip, port=5201, bw='10M', parallel=10, duration=150, cong_ctrl='cubic', output_file=None):
     """Run iperf3 client"""
-    output_file = f'iperf3_{client_host.name}_to_h7_{cong_ctrl}.json'
-    cmd = f'iperf3 -c {server_ip} -p {port} -b {bw} -P {parallel} -t {duration} -C {cong_ctrl} -J > {output_file}'
+    if output_file is None:
+        output_file = f'iperf3_{client_host.name}_to_h7_{cong_ctrl}.json'
     info(f'*** Running client on {client_host.name} with {cong_ctrl}\n')
-    client_host.cmd(cmd)
+    wait_all([start_client(client_host, server_ip, output_file, port, bw, parallel, duration, cong_ctrl)])
     return output_file
 
+def run_scenario(net, server_host, pcap_file, clients, cong_ctrl, port=5201):
+    """Capture on the server while clients run, returning as soon as the last client is done.
 
+    `clients` is a list of (host, output_file, start_offset, duration) tuples; each
+    client is started `start_offset` seconds after the first one, against its own
+    server port.
+    """
+    capture = start_capture(net, server_host, pcap_file)
+    # One server per client: a single iperf3 server runs one test at a time and
+    # answers every other client with "the server is busy"
+    ports = [port + i for i in range(len(clients))]
+    servers = [run_server(server_host, client_port) for client_port in ports]
+    server_ip = server_host.IP()
+    schedule = sorted(zip(clients, ports), key=lambda c: c[0][2])
+    samplers = []
+    if SAMPLER_SETTINGS['interval']:
+        base = os.path.splitext(pcap_file)[0]
+        samplers = [TcpSampler(host, ports, f'{base}_{host.name}_tcpinfo.npz', SAMPLER_SETTINGS['interval'])
+                    for host in dict.fromkeys(c[0] for c in clients)]
+    
+    t0 = time.time()
+    if CLIENT_SETTINGS['live']:
+        launches = [(start_offset, host.name, duration,
+                     lambda d, host=host, out=output_file, p=client_port:
+                         start_live_client(host, server_ip, out, p, duration=d, cong_ctrl=cong_ctrl))
+                    for (host, output_file, start_offset, duration), client_port in schedule]
+        jobs = list(run_live_clients(launches, CLIENT_SETTINGS['retries'], CLIENT_SETTINGS['report_every']).values())
+    else:
+        jobs = []
+        for (host, output_file, start_offset, duration), client_port in schedule:
+            delay = t0 + start_offset - time.time()
+            if delay > 0:
+                time.sleep(delay)  # staggered start, part of the experiment design
+            jobs.append(start_client(host, server_ip, output_file, client_port, duration=duration, cong_ctrl=cong_ctrl))
+        wait_all(jobs)
+    
+    info(f'*** Clients finished after {time.time() - t0:.1f}s\n')
+    for sampler in samplers:
+        sampler.stop()
+    stop_capture(server_host, capture)
+    for server, client_port in zip(servers, ports):
+        stop_server(server_host, server, client_port)
+    return jobs
 
 
-def experiment_a(net):
+def experiment_a(net, on_run_complete=None):
     """Run experiment A: H1 -> H7 with different congestion control algorithms"""
     info('*** Running Experiment A\n')
     
     h1, h7 = net.get('h1', 'h7')
-    server_ip = h7.IP()
     
     for algo in CONGESTION_ALGOS:
         info(f'*** Starting experiment with {algo}\n')
@@ -55,161 +163,150 @@ def experiment_a(net):
         os.makedirs('results/experiment_a', exist_ok=True)
         
         pcap_file = f'results/experiment_a/h1_h7_{algo}.pcap'
-        capture_pid = start_capture(net, h7, pcap_file)
-        
-        run_server(h7)
-        
-        output_file = run_client(h1, server_ip, cong_ctrl=algo)
-        
-        stop_capture(h7, capture_pid)
-        
-        os.system(f'mv {output_file} results/experiment_a/')
-        
-        h7.cmd('pkill -9 iperf3')
-        time.sleep(2)  
+        output_file = f'results/experiment_a/iperf3_h1_to_h7_{algo}.json'
+        run_scenario(net, h7, pcap_file, [(h1, output_file, 0, 150)], algo)
+        if on_run_complete:
+            on_run_complete('a', algo)
 
-def experiment_b(net):
+def experiment_b(net, on_run_complete=None):
     """Run experiment B: Staggered clients H1, H3, H4 -> H7"""
     info('*** Running Experiment B\n')
     
     h1, h3, h4, h7 = net.get('h1', 'h3', 'h4', 'h7')
-    server_ip = h7.IP()
     
     for algo in CONGESTION_ALGOS:
         info(f'*** Starting experiment with {algo}\n')
         os.makedirs('results/experiment_b', exist_ok=True)
         pcap_file = f'results/experiment_b/staggered_{algo}.pcap'
-        capture_pid = start_capture(net, h7, pcap_file)
-        run_server(h7)
-        h1.cmd(f'iperf3 -c {server_ip} -p 5201 -b 10M -P 10 -t 150 -C {algo} -J > results/experiment_b/h1_staggered_{algo}.json &')
-        
-        time.sleep(15)
-        h3.cmd(f'iperf3 -c {server_ip} -p 5201 -b 10M -P 10 -t 120 -C {algo} -J > results/experiment_b/h3_staggered_{algo}.json &')
-        
-        time.sleep(15)
-        h4.cmd(f'iperf3 -c {server_ip} -p 5201 -b 10M -P 10 -t 90 -C {algo} -J > results/experiment_b/h4_staggered_{algo}.json &')
-        
-        time.sleep(120)  
-        stop_capture(h7, capture_pid)
-        h7.cmd('pkill -9 iperf3')
-        time.sleep(2)  
+        run_scenario(net, h7, pcap_file, [
+            (h1, f'results/experiment_b/h1_staggered_{algo}.json', 0, 150),
+            (h3, f'results/experiment_b/h3_staggered_{algo}.json', 15, 120),
+            (h4, f'results/experiment_b/h4_staggered_{algo}.json', 30, 90),
+        ], algo)
+        if on_run_complete:
+            on_run_complete('b', algo)
 
 
 
-def experiment_c(net):
+def experiment_c(net, on_run_complete=None):
     """Run experiment C with custom bandwidths"""
     info('*** Running Experiment C\n')
     h1, h2, h3, h4, h7 = net.get('h1', 'h2', 'h3', 'h4', 'h7')
-    server_ip = h7.IP()
     os.makedirs('results/experiment_c', exist_ok=True)
     
+    parts = {
+        'c1': [h3],
+        'c2a': [h1, h2],
+        'c2b': [h1, h3],
+        'c2c': [h1, h3, h4],
+    }
     
     for algo in CONGESTION_ALGOS:
         info(f'*** Starting experiment C with {algo}\n')
-        pcap_file = f'results/experiment_c/c1_{algo}.pcap'
-        capture_pid = start_capture(net, h7, pcap_file)
-        run_server(h7)
-        run_client(h3, server_ip, cong_ctrl=algo)
-        stop_capture(h7, capture_pid)
-        h7.cmd('pkill -9 iperf3')
-        time.sleep(2)
-        pcap_file = f'results/experiment_c/c2a_{algo}.pcap'
-        capture_pid = start_capture(net, h7, pcap_file)
-        run_server(h7)
-        h1.cmd(f'iperf3 -c {server_ip} -p 5201 -b 10M -P 10 -t 150 -C {algo} -J > results/experiment_c/h1_c2a_{algo}.json &')
-        h2.cmd(f'iperf3 -c {server_ip} -p 5201 -b 10M -P 10 -t 150 -C {algo} -J > results/experiment_c/h2_c2a_{algo}.json &')
-        time.sleep(150)  
-        stop_capture(h7, capture_pid)
-        h7.cmd('pkill -9 iperf3')
-        time.sleep(2)
-        
-        pcap_file = f'results/experiment_c/c2b_{algo}.pcap'
-        capture_pid = start_capture(net, h7, pcap_file)
-        run_server(h7)
-        h1.cmd(f'iperf3 -c {server_ip} -p 5201 -b 10M -P 10 -t 150 -C {algo} -J > results/experiment_c/h1_c2b_{algo}.json &')
-        h3.cmd(f'iperf3 -c {server_ip} -p 5201 -b 10M -P 10 -t 150 -C {algo} -J > results/experiment_c/h3_c2b_{algo}.json &')
-        time.sleep(150)  
-        stop_capture(h7, capture_pid)
-        h7.cmd('pkill -9 iperf3')
-        time.sleep(2)
-        
-        pcap_file = f'results/experiment_c/c2c_{algo}.pcap'
-        capture_pid = start_capture(net, h7, pcap_file)
-        run_server(h7)
-        h1.cmd(f'iperf3 -c {server_ip} -p 5201 -b 10M -P 10 -t 150 -C {algo} -J > results/experiment_c/h1_c2c_{algo}.json &')
-        h3.cmd(f'iperf3 -c {server_ip} -p 5201 -b 10M -P 10 -t 150 -C {algo} -J > results/experiment_c/h3_c2c_{algo}.json &')
-        h4.cmd(f'iperf3 -c {server_ip} -p 5201 -b 10M -P 10 -t 150 -C {algo} -J > results/experiment_c/h4_c2c_{algo}.json &')
-        time.sleep(150)  
-        stop_capture(h7, capture_pid)
-        h7.cmd('pkill -9 iperf3')
-        time.sleep(2)
-
-def experiment_d(net, loss_rate):
+        for part, hosts in parts.items():
+            pcap_file = f'results/experiment_c/{part}_{algo}.pcap'
+            clients = [(host, f'results/experiment_c/{host.name}_{part}_{algo}.json', 0, 150) for host in hosts]
+            run_scenario(net, h7, pcap_file, clients, algo)
+        if on_run_complete:
+            on_run_complete('c', algo)
+
+def experiment_d(net, loss_rate, on_run_complete=None):
     """Run experiment D with link loss"""
     info(f'*** Running Experiment D with {loss_rate}% packet loss\n')
     h1, h3, h4, h7 = net.get('h1', 'h3', 'h4', 'h7')
-    server_ip = h7.IP()
     
     os.makedirs(f'results/experiment_d_{loss_rate}', exist_ok=True)
     
     for algo in CONGESTION_ALGOS:
         info(f'*** Starting experiment D with {algo} and {loss_rate}% loss\n')
         pcap_file = f'results/experiment_d_{loss_rate}/d_{loss_rate}_{algo}.pcap'
-        capture_pid = start_capture(net, h7, pcap_file)
-        run_server(h7)
-        h1.cmd(f'iperf3 -c {server_ip} -p 5201 -b 10M -P 10 -t 150 -C {algo} -J > results/experiment_d_{loss_rate}/h1_d_{loss_rate}_{algo}.json &')
-        h3.cmd(f'iperf3 -c {server_ip} -p 5201 -b 10M -P 10 -t 150 -C {algo} -J > results/experiment_d_{loss_rate}/h3_d_{loss_rate}_{algo}.json &')
-        h4.cmd(f'iperf3 -c {server_ip} -p 5201 -b 10M -P 10 -t 150 -C {algo} -J > results/experiment_d_{loss_rate}/h4_d_{loss_rate}_{algo}.json &')
-        
-        time.sleep(150)  
-        stop_capture(h7, capture_pid)
-        h7.cmd('pkill -9 iperf3')
-        time.sleep(2)
+        clients = [(host, f'results/experiment_d_{loss_rate}/{host.name}_d_{loss_rate}_{algo}.json', 0, 150)
+                   for host in (h1, h3, h4)]
+        run_scenario(net, h7, pcap_file, clients, algo)
+        if on_run_complete:
+            on_run_complete(f'd{loss_rate}', algo)
 
-def main():
-    """Main function to run all experiments"""
-    parser = argparse.ArgumentParser(description='Run TCP congestion control experiments')
-    parser.add_argument('--option', choices=['a', 'b', 'c', 'd', 'all'], default='all',
-                      help='Experiment option to run (a, b, c, d, or all)')
-    
-    args = parser.parse_args()
-    option = args.option
-    
+def run_experiments(option, on_run_complete=None, emulate=False):
+    """Run the selected experiments; on_run_complete(experiment, algo) is called after each algorithm's run.
+
+    With emulate=True the topology is the userspace EmuNet instead of Mininet, needing no root.
+    """
     os.makedirs('results', exist_ok=True)
     
     
     setLogLevel('info')
+    if CLIENT_SETTINGS['live'] and CLIENT_SETTINGS['generator'] == 'iperf3' and not json_stream_supported():
+        warn('*** iperf3 older than 3.17 has no --json-stream; running clients with plain -J output\n')
+        CLIENT_SETTINGS['live'] = False
     
-    if option in ['a', 'b', 'all']:
+    # Every scenario uses the same CustomTopo; only the switch-link shaping changes,
+    # so one started network is re-shaped in place between scenarios
+    if emulate:
+        net = EmuNet()
+        reconfigure = net.reconfigure
+    else:
+        from mn_topology import setup_network, reconfigure_network  # Mininet is only needed here
         net = setup_network()
-        net.start()
-        
+        reconfigure = lambda **settings: reconfigure_network(net, **settings)
+    net.start()
+    try:
         if option == 'a' or option == 'all':
-            experiment_a(net)
+            experiment_a(net, on_run_complete)
         
         if option == 'b' or option == 'all':
-            experiment_b(net)
+            experiment_b(net, on_run_complete)
         
-        net.stop()
-    
-    if option in ['c', 'all']:
-        net = setup_network(bandwidth_s1_s2=100, bandwidth_s2_s3=50, bandwidth_s3_s4=100)
-        net.start()
-        experiment_c(net)
-        net.stop()
-    
-    if option in ['d', 'all']:
-        net = setup_network(bandwidth_s1_s2=100, bandwidth_s2_s3=50, bandwidth_s3_s4=100, loss_s2_s3=1)
-        net.start()
-        experiment_d(net, 1)
-        net.stop()
+        if option in ['c', 'all']:
+            reconfigure(bandwidth_s1_s2=100, bandwidth_s2_s3=50, bandwidth_s3_s4=100)
+            experiment_c(net, on_run_complete)
         
-        net = setup_network(bandwidth_s1_s2=100, bandwidth_s2_s3=50, bandwidth_s3_s4=100, loss_s2_s3=5)
-        net.start()
-        experiment_d(net, 5)
+        if option in ['d', 'all']:
+            reconfigure(bandwidth_s1_s2=100, bandwidth_s2_s3=50, bandwidth_s3_s4=100, loss_s2_s3=1)
+            experiment_d(net, 1, on_run_complete)
+            
+            reconfigure(bandwidth_s1_s2=100, bandwidth_s2_s3=50, bandwidth_s3_s4=100, loss_s2_s3=5)
+            experiment_d(net, 5, on_run_complete)
+    finally:
         net.stop()
     
     info('*** All experiments completed\n')
 
+def add_arguments(parser):
+    """The run options shared by experiments.py and pipeline.py"""
+    parser.add_argument('--capture', choices=['full', 'ring', 'none'],
+                      help='full: complete pcap per run; ring: header-only ring buffer with a live per-flow summary; '
+                           'none: no capture (default with --emulate, else full)')
+    parser.add_argument('--emulate', action='store_true',
+                      help='Run on the userspace network emulator (no root, Open vSwitch or Mininet network)')
+    parser.add_argument('--ring-files', type=int, default=CAPTURE_SETTINGS['ring_files'],
+                      help='Number of files in the capture ring (at least 3, so closed files can be summarized before reuse)')
+    parser.add_argument('--ring-file-mb', type=int, default=CAPTURE_SETTINGS['file_mb'],
+                      help='Size of each capture ring file in MB')
+    parser.add_argument('--no-live', action='store_true',
+                      help='Run clients with plain -J output instead of streaming intervals (iperf3 < 3.17)')
+    parser.add_argument('--generator', choices=['iperf3', 'builtin'], default=CLIENT_SETTINGS['generator'],
+                      help='Traffic source: the iperf3 binary or the built-in traffic_gen.py')
+    parser.add_argument('--sample-interval', type=float, default=SAMPLER_SETTINGS['interval'],
+                      help="Seconds between sender-side 'ss -tin' samples of cwnd/RTT (0 disables, e.g. 0.01)")
+    parser.add_argument('--client-retries', type=int, default=CLIENT_SETTINGS['retries'],
+                      help='Times a failed iperf3 client is restarted')
+
+def apply_arguments(args):
+    """Store parsed add_arguments() options in the module settings"""
+    CAPTURE_SETTINGS.update(mode=args.capture or ('none' if args.emulate else 'full'), file_mb=args.ring_file_mb, ring_files=max(args.ring_files, 3))
+    SAMPLER_SETTINGS.update(interval=args.sample_interval)
+    CLIENT_SETTINGS.update(live=not args.no_live, retries=args.client_retries, generator=args.generator)
+
+def main():
+    """Main function to run all experiments"""
+    parser = argparse.ArgumentParser(description='Run TCP congestion control experiments')
+    parser.add_argument('--option', choices=['a', 'b', 'c', 'd', 'all'], default='all',
+                      help='Experiment option to run (a, b, c, d, or all)')
+    add_arguments(parser)
+    
+    args = parser.parse_args()
+    apply_arguments(args)
+    run_experiments(args.option, emulate=args.emulate)
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+
+import argparse
+import ipaddress
+import numpy as np
+
+TCP_SYN = 0x02
+TCP_ACK = 0x10
+
+# Which endpoint advertised a window: the connection initiator or the listener
+SIDES = {'client': 0, 'server': 1}
+
+
+def group_flows(packets):
+    """Group decoded TCP columns by normalized 4-tuple, so both directions of a connection share one flow.
+
+    Endpoints are packed as (address << 16 | port). Returns the (lo, hi) endpoint
+    pair of every flow, each packet's flow id and whether the lo endpoint sent it.
+    """
+    src_ep = (packets['src'].astype(np.uint64) << np.uint64(16)) | packets['sport']
+    dst_ep = (packets['dst'].astype(np.uint64) << np.uint64(16)) | packets['dport']
+    lo_ep = np.minimum(src_ep, dst_ep)
+    hi_ep = np.maximum(src_ep, dst_ep)
+    pairs, flow = np.unique(np.stack([lo_ep, hi_ep], axis=1), axis=0, return_inverse=True)
+    return pairs, flow.reshape(-1).astype(np.int32), src_ep == lo_ep
+
+
+def handshakes(packets, flow, from_lo, n_flows):
+    """Per flow, the sender of a bare SYN (1: lo, 0: hi, -1: none captured) and the window
+    scale announced in SYN segments by the [lo, hi] endpoints (-1: none seen)"""
+    flags = packets['flags']
+    bare_syn = (flags & (TCP_SYN | TCP_ACK)) == TCP_SYN
+    syn_from_lo = np.full(n_flows, -1, dtype=np.int8)
+    syn_from_lo[flow[bare_syn]] = from_lo[bare_syn]
+    announced = ((flags & TCP_SYN) != 0) & (packets['wscale'] >= 0)
+    wscale = np.full((n_flows, 2), -1, dtype=np.int8)
+    wscale[flow[announced], (~from_lo[announced]).astype(np.intp)] = packets['wscale'][announced]
+    return syn_from_lo, wscale
+
+
+def build_flow_table(packets):
+    """Index decoded TCP columns by connection and compute effective windows.
+
+    Packets are grouped by their normalized 4-tuple, so both directions of a
+    connection share one flow id. Each packet is tagged with the side that sent
+    it, and its window is shifted by that side's window scale when both the SYN
+    and the SYN-ACK negotiated one (RFC 7323); SYN segments are never scaled.
+    Returns a dict of arrays, suitable for the on-disk result cache.
+    """
+    n = len(packets)
+    pairs, flow, from_lo = group_flows(packets)
+    n_flows = len(pairs)
+    syn_from_lo, lo_hi_wscale = handshakes(packets, flow, from_lo, n_flows)
+
+    # The client is whoever sent a bare SYN; without a captured handshake, the
+    # endpoint that sent the most payload (the iperf3 client) is assumed
+    client_is_lo = np.bincount(flow, weights=packets['payload_len'] * np.where(from_lo, 1, -1),
+                               minlength=n_flows) >= 0
+    client_is_lo = np.where(syn_from_lo >= 0, syn_from_lo == 1, client_is_lo)
+    side = np.where(from_lo == client_is_lo[flow], SIDES['client'], SIDES['server']).astype(np.int8)
+
+    # Window scale announced by each side in its SYN / SYN-ACK (-1: none seen)
+    wscale = np.where(client_is_lo[:, None], lo_hi_wscale, lo_hi_wscale[:, ::-1])
+    syn = (packets['flags'] & TCP_SYN) != 0
+    handshake_seen = np.zeros(n_flows, dtype=bool)
+    handshake_seen[flow[syn]] = True
+    negotiated = (wscale >= 0).all(axis=1)
+    shift = np.where(negotiated[:, None], wscale, 0)[flow, side]
+    shift[syn] = 0
+    window = packets['window'].astype(np.int64) << shift.astype(np.int64)
+
+    client_ep = np.where(client_is_lo, pairs[:, 0], pairs[:, 1])
+    server_ep = np.where(client_is_lo, pairs[:, 1], pairs[:, 0])
+    times = packets['time'] - packets['time'][0] if n else packets['time'].copy()
+
+    return {
+        'times': times,
+        'flow': flow,
+        'side': side,
+        'window': window,
+        'payload_len': packets['payload_len'].astype(np.int64),
+        'flow_client': client_ep,
+        'flow_server': server_ep,
+        'flow_wscale': wscale,
+        'flow_handshake': handshake_seen,
+    }
+
+
+def format_endpoint(endpoint):
+    """Render a packed (address << 16 | port) endpoint as 'a.b.c.d:port'"""
+    endpoint = int(endpoint)
+    return f'{ipaddress.IPv4Address(endpoint >> 16)}:{endpoint & 0xffff}'
+
+
+def flow_selection(value):
+    """argparse type for --window-flow: 'all', 'sum' or a flow index"""
+    if value in ('all', 'sum'):
+        return value
+    if not value.isdigit():
+        raise argparse.ArgumentTypeError(f"expected 'all', 'sum' or a flow index, not {value!r}")
+    return int(value)
+
+
+def select_packets(table, flow='all', side='server'):
+    """Boolean mask of packets from one flow (index) or all flows, advertised by 'client', 'server' or 'both'"""
+    mask = np.ones(len(table['flow']), dtype=bool)
+    if side != 'both':
+        mask &= table['side'] == SIDES[side]
+    if flow not in ('all', 'sum'):
+        mask &= table['flow'] == int(flow)
+    return mask
+
+
+def window_series(table, flow='all', side='server'):
+    """Return (times, effective windows) for a flow selection.
+
+    flow='all' keeps every selected packet's own window (all flows interleaved),
+    flow='sum' gives the aggregate: at each packet, the sum over flows of the
+    latest window advertised by the selected side, and an integer picks one flow.
+    """
+    mask = select_packets(table, flow, side)
+    times = table['times'][mask]
+    window = table['window'][mask]
+    if flow != 'sum' or not len(window):
+        return times, window
+
+    # Sum of each flow's latest window: cumulative sum of per-flow window changes
+    group = table['flow'][mask].astype(np.int64) * 2 + table['side'][mask]
+    order = np.argsort(group, kind='stable')
+    deltas = np.empty_like(window)
+    sorted_window = window[order]
+    first = np.r_[True, group[order][1:] != group[order][:-1]]
+    deltas[order] = np.where(first, sorted_window, sorted_window - np.r_[0, sorted_window[:-1]])
+    return times, np.cumsum(deltas)
+
+
+def flow_summary(table):
+    """Per-flow packet, byte and window statistics, one dict per flow"""
+    n_flows = len(table['flow_client'])
+    flow, side, window = table['flow'], table['side'], table['window']
+    group = flow.astype(np.int64) * 2 + side
+    packets = np.bincount(group, minlength=2 * n_flows).reshape(n_flows, 2)
+    data = np.bincount(group, weights=table['payload_len'], minlength=2 * n_flows).reshape(n_flows, 2)
+    max_window = np.zeros(2 * n_flows, dtype=np.int64)
+    np.maximum.at(max_window, group, window)
+    max_window = max_window.reshape(n_flows, 2)
+
+    rows = []
+    for i in range(n_flows):
+        rows.append({
+            'Flow': i,
+            'Client': format_endpoint(table['flow_client'][i]),
+            'Server': format_endpoint(table['flow_server'][i]),
+            'Window Scale': tuple(int(s) for s in table['flow_wscale'][i]),
+            'Packets': int(packets[i].sum()),
+            'Bytes (client->server)': int(data[i, 0]),
+            'Bytes (server->client)': int(data[i, 1]),
+            'Max Window (client)': int(max_window[i, 0]),
+            'Max Window (server)': int(max_window[i, 1]),
+        })
+    return rows
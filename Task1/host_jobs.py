@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+
+import os
+import time
+import select
+import subprocess
+from mn_log import warn
+
+POLL_INTERVAL = 0.05
+# Extra time allowed past a client's -t duration before it is considered hung
+COMPLETION_GRACE = 15
+
+
+class HostJob:
+    """A command running in a Mininet host's namespace, tracked by its real process handle"""
+
+    def __init__(self, host, cmd, output_file=None, timeout=None, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE):
+        self.host = host
+        self.cmd = cmd
+        self.output_file = output_file
+        self.started = time.time()
+        self.deadline = self.started + timeout if timeout is not None else None
+        self._out = open(output_file, 'w') if output_file else None
+        self.proc = host.popen(cmd, stdout=self._out or stdout, stderr=stderr)
+
+    @property
+    def pid(self):
+        return self.proc.pid
+
+    def poll(self):
+        """Return the exit code, or None while the job is still running"""
+        code = self.proc.poll()
+        if code is not None:
+            self._close()
+        return code
+
+    def wait(self, timeout=None):
+        """Wait until the job exits or its deadline (or `timeout`) passes; return the exit code or None"""
+        limit = self._remaining() if timeout is None else timeout
+        try:
+            code = self.proc.wait(timeout=limit)
+        except subprocess.TimeoutExpired:
+            return None
+        self._close()
+        return code
+
+    def stop(self, timeout=5):
+        """Terminate the job (SIGTERM, then SIGKILL) and reap it"""
+        if self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+                self.proc.wait()
+        self._close()
+        return self.proc.returncode
+
+    def elapsed(self):
+        return time.time() - self.started
+
+    def _remaining(self):
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.time(), 0)
+
+    def _close(self):
+        if self._out is not None and not self._out.closed:
+            self._out.close()
+
+
+def wait_all(jobs):
+    """Wait until every job has exited or reached its own deadline.
+
+    Returns as soon as the last job finishes, instead of a fixed sleep, and
+    terminates jobs that overran their deadline. The result maps each job to
+    its exit code (None for jobs that had to be stopped).
+    """
+    codes = {}
+    for job in sorted(jobs, key=lambda j: j.deadline or float('inf')):
+        code = job.wait()
+        if code is None:
+            warn(f'*** {job.host.name}: "{job.cmd}" overran its deadline, stopping it\n')
+            job.stop()
+        elif code != 0:
+            warn(f'*** {job.host.name}: "{job.cmd}" exited with status {code} after {job.elapsed():.1f}s\n')
+        codes[job] = code
+    return codes
+
+
+def port_listening(host, port):
+    """True when a TCP socket in the host's namespace is listening on `port`"""
+    # Emulated hosts share one namespace, so only the host's own listen address counts
+    address = getattr(host, 'listen_address', None)
+    match = f'sport = :{port}' + (f' and src {address}' if address else '')
+    return bool(host.cmd(f'ss -Hltn "{match}"').strip())
+
+
+def wait_for_port(host, port, timeout=10, listening=True):
+    """Poll the host's socket table until `port` is (or is no longer) listening"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if port_listening(host, port) == listening:
+            return True
+        time.sleep(POLL_INTERVAL)
+    state = 'listening' if listening else 'closed'
+    warn(f'*** {host.name}: port {port} not {state} after {timeout}s\n')
+    return False
+
+
+def wait_for_output(job, marker, timeout=10):
+    """Read the job's stderr until a line containing `marker` appears (e.g. tcpdump's 'listening on')"""
+    deadline = time.time() + timeout
+    buffered = b''
+    while job.proc.poll() is None:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            break
+        ready, _, _ = select.select([job.proc.stderr], [], [], remaining)
+        if not ready:
+            break
+        chunk = os.read(job.proc.stderr.fileno(), 4096)
+        if not chunk:
+            break
+        buffered += chunk
+        if marker.encode() in buffered:
+            return True
+    warn(f'*** {job.host.name}: did not see "{marker}" from "{job.cmd}"\n')
+    return False
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+
+import re
+import json
+import time
+import threading
+import subprocess
+from mn_log import info, warn
+from host_jobs import HostJob
+from iperf_stream import IntervalSeries
+
+# A client that has produced no event for this long is considered stuck and aborted
+STALL_TIMEOUT = 10
+POLL_INTERVAL = 0.5
+# A retry is not worth starting with less of the client's run left than this (seconds)
+MIN_RETRY_DURATION = 1
+# First iperf3 release with --json-stream
+JSON_STREAM_VERSION = (3, 17)
+
+
+def json_stream_supported(binary='iperf3'):
+    """True when the installed iperf3 is recent enough for --json-stream"""
+    try:
+        out = subprocess.run([binary, '--version'], capture_output=True, text=True, timeout=5).stdout
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+    match = re.search(r'iperf (\d+)\.(\d+)', out)
+    return bool(match) and (int(match.group(1)), int(match.group(2))) >= JSON_STREAM_VERSION
+
+
+class LiveClient:
+    """An iperf3 client run with --json-stream, consumed line by line while it runs.
+
+    Each 'interval' event is appended to an in-memory IntervalSeries for the live
+    view and to the output file, which is assembled into the same document
+    `iperf3 -J` writes ({"start", "intervals", "end"[, "error"]}) so
+    analyze_results.process_iperf_json reads it unchanged.
+    """
+
+    def __init__(self, host, cmd, output_file, timeout=None):
+        self.host = host
+        self.output_file = output_file
+        self.series = IntervalSeries()
+        self.error = None
+        self.started = False
+        self.ended = False
+        self.last_event = time.time()
+        self._out = open(output_file, 'w')
+        self._intervals = 0
+        # stderr is merged so plain-text failures (e.g. an unknown option) are seen too
+        self.job = HostJob(host, cmd, timeout=timeout, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        self.thread = threading.Thread(target=self._read, daemon=True)
+        self.thread.start()
+
+    def _read(self):
+        try:
+            for line in self.job.proc.stdout:
+                line = line.decode(errors='replace').strip()
+                if not line:
+                    continue
+                self.last_event = time.time()
+                try:
+                    event = json.loads(line)
+                    kind, data = event['event'], event.get('data')
+                except (ValueError, KeyError, TypeError):
+                    self.error = self.error or line
+                    continue
+                self._handle(kind, data)
+        finally:
+            self._finish()
+
+    def _handle(self, kind, data):
+        if kind == 'start':
+            self._begin(data)
+        elif kind == 'interval':
+            self._begin({})
+            self._out.write(',\n' if self._intervals else '\n')
+            json.dump(data, self._out)
+            self._out.flush()
+            self._intervals += 1
+            self.series.add(data)
+        elif kind == 'end':
+            self._begin({})
+            self._out.write('\n],\n"end": ')
+            json.dump(data, self._out)
+            self.ended = True
+        elif kind == 'error':
+            self.error = data
+
+    def _begin(self, start):
+        if not self.started:
+            self._out.write('{"start": ')
+            json.dump(start, self._out)
+            self._out.write(',\n"intervals": [')
+            self.started = True
+
+    def _finish(self):
+        self._begin({})
+        if not self.ended:
+            self._out.write('\n],\n"end": {}')
+        if self.error is not None:
+            self._out.write(',\n"error": ')
+            json.dump(self.error, self._out)
+        self._out.write('}\n')
+        self._out.close()
+
+    def done(self):
+        """True once the process has exited and its output has been fully consumed"""
+        return self.job.poll() is not None and not self.thread.is_alive()
+
+    def failed(self):
+        return self.done() and (self.error is not None or not self.ended or self.job.proc.returncode != 0)
+
+    def stalled(self):
+        return not self.done() and time.time() - self.last_event > STALL_TIMEOUT
+
+    def overran(self):
+        return self.job.deadline is not None and time.time() > self.job.deadline
+
+    def latest_mbps(self):
+        """Throughput of the most recent interval in Mbps (None before the first one)"""
+        bps = self.series.sums['bits_per_second']
+        return bps[-1] / 1e6 if len(bps) else None
+
+    def stop(self):
+        self.job.stop()
+        self.thread.join()
+
+
+def _status_line(elapsed, clients, attempts):
+    parts = []
+    for label, client in clients.items():
+        mbps = client.latest_mbps()
+        if client.done():
+            state = 'failed' if client.failed() else 'done'
+        else:
+            state = f'{mbps:.1f} Mbps' if mbps is not None else 'starting'
+        retry = f' (retry {attempts[label]})' if attempts[label] else ''
+        parts.append(f'{label} {state}{retry}')
+    return f'*** [{elapsed:5.0f}s] ' + ', '.join(parts) + '\n'
+
+
+def run_live_clients(launches, retries=2, report_every=10):
+    """Start live clients on schedule, show their throughput, and retry failures.
+
+    `launches` is a list of (start_offset, label, duration, start) tuples where
+    start(duration) starts one attempt of `duration` seconds and returns its
+    LiveClient. A client that exits with an error, or stops producing events, is
+    aborted and started again (up to `retries` times) within seconds instead of
+    being discovered at analysis time. A retry only runs for what is left of the
+    client's scheduled window, so staggered clients still stop when planned.
+    Returns the final LiveClient of every label.
+    """
+    pending = sorted(launches, key=lambda launch: launch[0])
+    windows = {label: (start_offset, start_offset + duration, start) for start_offset, label, duration, start in launches}
+    clients, attempts, given_up = {}, {}, set()
+    t0 = time.time()
+    next_report = t0 + report_every
+    # A failed client is only settled once it has been retried or given up on
+    while pending or not all(client.done() and (not client.failed() or label in given_up)
+                             for label, client in clients.items()):
+        now = time.time()
+        while pending and t0 + pending[0][0] <= now:
+            _, label, duration, start = pending.pop(0)
+            clients[label], attempts[label] = start(duration), 0
+
+        for label, client in list(clients.items()):
+            # A stopped client is then retried or given up on like any other failure
+            if client.overran() and not client.done():
+                warn(f'*** {label}: iperf3 overran its deadline, stopping it\n')
+                client.stop()
+            elif client.stalled():
+                warn(f'*** {label}: no iperf3 output for {STALL_TIMEOUT}s, aborting\n')
+                client.stop()
+            if client.failed() and label not in given_up:
+                reason = client.error or f'exit status {client.job.proc.returncode}'
+                remaining = int(t0 + windows[label][1] - time.time())
+                if attempts[label] < retries and remaining >= MIN_RETRY_DURATION:
+                    attempts[label] += 1
+                    warn(f'*** {label}: iperf3 failed ({reason}), retry {attempts[label]}/{retries} '
+                         f'for the remaining {remaining}s\n')
+                    clients[label] = windows[label][2](remaining)
+                else:
+                    warn(f'*** {label}: iperf3 failed ({reason}), giving up\n')
+                    given_up.add(label)
+
+        if now >= next_report:
+            info(_status_line(now - t0, clients, attempts))
+            next_report += report_every
+        time.sleep(POLL_INTERVAL)
+    return clients
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+
+import re
+import json
+from array import array
+import numpy as np
+
+CHUNK_SIZE = 1 << 16
+
+# Fields kept from interval['sum'] and from each interval['streams'][i]
+SUM_FIELDS = ('start', 'end', 'bytes', 'bits_per_second', 'retransmits')
+STREAM_FIELDS = ('bytes', 'bits_per_second', 'retransmits', 'snd_cwnd', 'rtt')
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+# Characters that may continue a number, up to the end of the buffer
+_NUMBER_TAIL = re.compile(r'[0-9.eE+-]*\Z')
+
+
+class _JsonCursor:
+    """Pull-style reader over a JSON text file that only ever buffers the value being decoded"""
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        if self.eof:
+            return False
+        chunk = self.f.read(CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        # Drop what has already been consumed so the buffer stays bounded
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it ('' at end of file)"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise json.JSONDecodeError(f'Expecting {char!r}', self.buf, self.pos)
+        self.pos += 1
+
+    def value(self):
+        """Decode one complete JSON value, reading more of the file until it is available"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A number at the buffer edge may continue in the next chunk, even when
+            # it ends in a partial fraction or exponent ('1.' + '5', '2e' + '-3')
+            if not self.eof and _NUMBER_TAIL.match(self.buf, end) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def items(self):
+        """Iterate over the keys of an object; the caller must consume each value before the next key"""
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key
+            sep = self.peek()
+            self.pos += 1
+            if sep == '}':
+                return
+            if sep != ',':
+                raise json.JSONDecodeError("Expecting ',' delimiter", self.buf, self.pos - 1)
+
+    def elements(self):
+        """Iterate over the elements of an array, decoding one element at a time"""
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            sep = self.peek()
+            self.pos += 1
+            if sep == ']':
+                return
+            if sep != ',':
+                raise json.JSONDecodeError("Expecting ',' delimiter", self.buf, self.pos - 1)
+
+
+class IntervalSeries:
+    """Compact accumulator for iperf3 interval reports (sum and per-stream series)"""
+
+    def __init__(self):
+        self.sums = {field: array('d') for field in SUM_FIELDS}
+        self.sockets = {}  # socket id -> stream column
+        self.rows = array('q')
+        self.cols = array('q')
+        self.streams = {field: array('d') for field in STREAM_FIELDS}
+
+    def add(self, interval):
+        """Append one element of the iperf3 'intervals' array"""
+        row = len(self.sums['start'])
+        summary = interval.get('sum', {})
+        for field in SUM_FIELDS:
+            self.sums[field].append(summary.get(field, np.nan))
+
+        for stream in interval.get('streams', []):
+            col = self.sockets.setdefault(stream.get('socket', -1), len(self.sockets))
+            self.rows.append(row)
+            self.cols.append(col)
+            for field in STREAM_FIELDS:
+                self.streams[field].append(stream.get(field, np.nan))
+
+    def to_arrays(self):
+        """Return (sum columns, per-stream (interval x stream) matrices, socket ids)"""
+        sums = {field: np.frombuffer(values, dtype=np.float64).copy()
+                for field, values in self.sums.items()}
+        shape = (len(self.sums['start']), len(self.sockets))
+        rows = np.frombuffer(self.rows, dtype=np.int64)
+        cols = np.frombuffer(self.cols, dtype=np.int64)
+        streams = {}
+        for field, values in self.streams.items():
+            matrix = np.full(shape, np.nan)
+            matrix[rows, cols] = np.frombuffer(values, dtype=np.float64)
+            streams[field] = matrix
+        sockets = np.array(list(self.sockets), dtype=np.int64)
+        return sums, streams, sockets
+
+
+def parse_iperf_stream(file_path):
+    """Incrementally parse an iperf3 -J document.
+
+    Only one interval is decoded at a time; the sum and per-stream series are
+    accumulated into typed arrays. Returns a dict with 'sum' and 'streams'
+    columns, the 'sockets' stream ids, and the 'end' and 'error' sections.
+    """
+    series = IntervalSeries()
+    end, error = {}, None
+
+    with open(file_path, 'r') as f:
+        cursor = _JsonCursor(f)
+        for key in cursor.items():
+            if key == 'intervals':
+                for interval in cursor.elements():
+                    series.add(interval)
+            elif key == 'end':
+                end = cursor.value()
+            elif key == 'error':
+                error = cursor.value()
+            else:
+                cursor.value()  # 'start' and anything else is not needed
+        if cursor.peek():
+            raise json.JSONDecodeError('Extra data', cursor.buf, cursor.pos)
+
+    sums, streams, sockets = series.to_arrays()
+    return {'sum': sums, 'streams': streams, 'sockets': sockets, 'end': end, 'error': error}
@@ -0,0 +1,27 @@
+#!/usr/bin/env python
+
+import sys
+
+# Mininet's logger when it is installed; otherwise a plain stand-in, so the
+# userspace network (--emulate) and the analysis run on machines without Mininet
+try:
+    from mininet.log import setLogLevel, info, warn, error
+except ImportError:
+    LEVELS = {'debug': 10, 'info': 20, 'output': 25, 'warning': 30, 'warn': 30, 'error': 40, 'critical': 50}
+    _level = LEVELS['info']
+
+    def setLogLevel(level='info'):
+        global _level
+        _level = LEVELS[level]
+
+    def _logger(level, stream):
+        def log(message):
+            # Like Mininet's, messages carry their own newline
+            if level >= _level:
+                stream.write(message)
+                stream.flush()
+        return log
+
+    info = _logger(LEVELS['info'], sys.stdout)
+    warn = _logger(LEVELS['warning'], sys.stderr)
+    error = _logger(LEVELS['error'], sys.stderr)
@@ -4,66 +4,117 @@ from mininet.topo import Topo
 from mininet.net import Mininet
 from mininet.link import TCLink
 from mininet.node import OVSController
+import re
 import subprocess
+from mn_log import info
+from topology import SWITCHES, HOSTS, LINKS, SHAPED_LINKS, link_settings
 
 class CustomTopo(Topo):
-    """Custom topology with 4 switches and 7 hosts"""
+    """Custom topology with 4 switches and 7 hosts (see topology.py)"""
     
     def build(self, **_opts):
-        # Add switches
-        s1 = self.addSwitch('s1')
-        s2 = self.addSwitch('s2')
-        s3 = self.addSwitch('s3')
-        s4 = self.addSwitch('s4')
+        for switch in SWITCHES:
+            self.addSwitch(switch)
+        for host in HOSTS:
+            self.addHost(host)
         
-        # Add hosts
-        h1 = self.addHost('h1')
-        h2 = self.addHost('h2')
-        h3 = self.addHost('h3')
-        h4 = self.addHost('h4')
-        h5 = self.addHost('h5')
-        h6 = self.addHost('h6')
-        h7 = self.addHost('h7')
-        
-        # Add links
-        self.addLink(h1, s1)
-        self.addLink(h2, s1)
-        self.addLink(h3, s2)
-        self.addLink(h4, s3)
-        self.addLink(h5, s3)
-        self.addLink(h6, s4)
-        self.addLink(h7, s4)
-        
-        # Add switch-to-switch links with custom parameters
-        # We don't set bandwidth here because it will be set by setup_network function
-        self.addLink(s1, s2)
-        self.addLink(s2, s3)
-        self.addLink(s3, s4)
+        # Switch-to-switch links are added without bandwidth; setup_network shapes them
+        for a, b in LINKS:
+            self.addLink(a, b)
+
+# tc rate units -> bits per second
+RATE_UNITS = {'bit': 1, 'kbit': 1e3, 'mbit': 1e6, 'gbit': 1e9}
+TIME_UNITS = {'us': 1e-3, 'ms': 1, 's': 1e3}
+
+def shaped_interfaces(net):
+    """Map each shaped switch link name (e.g. 's2-s3') to its two TCIntf endpoints"""
+    intfs = {}
+    for a, b in SHAPED_LINKS:
+        link = net.linksBetween(*net.get(a, b))[0]
+        intfs[f'{a}-{b}'] = (link.intf1, link.intf2)
+    return intfs
+
+def _parse_rate(text):
+    match = re.match(r'([\d.]+)([a-zA-Z]+)', text)
+    return float(match.group(1)) * RATE_UNITS[match.group(2).lower()]
+
+def _parse_time(text):
+    match = re.match(r'([\d.]+)([a-z]+)', text)
+    return float(match.group(1)) * TIME_UNITS[match.group(2)]
+
+def read_shaping(intf):
+    """Return the (rate bits/s, loss %, delay ms) currently installed on an interface"""
+    classes = intf.cmd(f'tc class show dev {intf.name} classid 5:1')
+    qdiscs = intf.cmd(f'tc qdisc show dev {intf.name}')
+    rate = re.search(r' rate (\S+)', classes)
+    loss = re.search(r'netem .*? loss ([\d.]+)%', qdiscs)
+    delay = re.search(r'netem .*? delay (\S+)', qdiscs)
+    return (_parse_rate(rate.group(1)) if rate else None,
+            float(loss.group(1)) if loss else 0.0,
+            _parse_time(delay.group(1)) if delay else 0.0)
+
+def apply_shaping(intf, bw, loss=0, delay=None):
+    """Change an interface's rate, loss and delay in place.
+
+    TCLink installs htb root 5:0 / class 5:1 with a netem 10: below it only when a
+    loss or delay is set. The htb class is changed and the netem leaf replaced, or
+    removed when neither is set, so the result matches what a freshly built TCLink
+    would install, without TCIntf.config deleting and rebuilding the root qdisc.
+    tc applies the lines one at a time, so the new rate may briefly run with the
+    old netem. Interfaces without that layout fall back to a full TCIntf.config.
+    """
+    qdiscs = intf.cmd(f'tc qdisc show dev {intf.name}')
+    if 'htb 5: root' not in qdiscs:
+        intf.config(bw=bw, loss=loss, delay=delay, r2q=100)
+        return
 
-def setup_network(bandwidth_s1_s2=10, bandwidth_s2_s3=10, bandwidth_s3_s4=10, loss_s2_s3=0):
+    batch = [f'class change dev {intf.name} parent 5:0 classid 5:1 htb rate {bw}Mbit burst 15k']
+    if loss or delay:
+        netem = f'netem delay {delay}' if delay else 'netem'
+        netem += f' loss {loss}%' if loss else ''
+        batch.append(f'qdisc replace dev {intf.name} parent 5:1 handle 10: {netem}')
+    elif 'netem 10:' in qdiscs:
+        batch.append(f'qdisc del dev {intf.name} parent 5:1 handle 10:')
+    intf.cmd("printf '%s\\n' " + ' '.join(f"'{line}'" for line in batch) + ' | tc -batch -')
+    intf.params.update(bw=bw, loss=loss, delay=delay)
+
+def verify_shaping(intf, bw, loss=0, delay=None):
+    """True when the interface's installed rate, loss and delay match the request"""
+    rate, installed_loss, installed_delay = read_shaping(intf)
+    expected_delay = _parse_time(delay) if delay else 0.0
+    return (rate is not None and abs(rate - bw * 1e6) <= 0.01 * bw * 1e6
+            and abs(installed_loss - loss) < 1e-6
+            and abs(installed_delay - expected_delay) < 1e-3)
+
+def reconfigure_network(net, **settings):
+    """Re-shape the switch chain of a running network and check the new settings took effect.
+
+    Accepts the same keyword arguments as setup_network (plus delay) and raises
+    RuntimeError naming any interface whose installed shaping does not match.
+    """
+    mismatched = []
+    intfs = shaped_interfaces(net)
+    for name, params in link_settings(**settings).items():
+        for intf in intfs[name]:
+            apply_shaping(intf, **params)
+            if not verify_shaping(intf, **params):
+                mismatched.append(f'{intf.name} ({read_shaping(intf)})')
+    if mismatched:
+        raise RuntimeError(f'link shaping not in effect on: {", ".join(mismatched)}')
+    info(f'*** Reconfigured links: {settings}\n')
+
+def setup_network(bandwidth_s1_s2=10, bandwidth_s2_s3=10, bandwidth_s3_s4=10, loss_s2_s3=0, delay=None):
     """Setup the network with custom parameters"""
     topo = CustomTopo()
     
     # Create the network with TCLink
     net = Mininet(topo=topo, controller=OVSController, link=TCLink)
     
-    # Get switch objects
-    s1, s2, s3, s4 = net.get('s1', 's2', 's3', 's4')
-    
-    # Configure links with custom parameters
+    # Configure the switch links with custom parameters
     # Use r2q=100 to fix the quantum warning
-    s1s2_link = net.linksBetween(s1, s2)[0]
-    s2s3_link = net.linksBetween(s2, s3)[0]
-    s3s4_link = net.linksBetween(s3, s4)[0]
-    
-    # Configure bandwidths (and r2q)
-    s1s2_link.intf1.config(bw=bandwidth_s1_s2, r2q=100)
-    s1s2_link.intf2.config(bw=bandwidth_s1_s2, r2q=100)
-    
-    s2s3_link.intf1.config(bw=bandwidth_s2_s3, r2q=100, loss=loss_s2_s3)
-    s2s3_link.intf2.config(bw=bandwidth_s2_s3, r2q=100, loss=loss_s2_s3)
-    
-    s3s4_link.intf1.config(bw=bandwidth_s3_s4, r2q=100)
-    s3s4_link.intf2.config(bw=bandwidth_s3_s4, r2q=100)
+    settings = link_settings(bandwidth_s1_s2, bandwidth_s2_s3, bandwidth_s3_s4, loss_s2_s3, delay)
+    for name, (intf1, intf2) in shaped_interfaces(net).items():
+        intf1.config(r2q=100, **settings[name])
+        intf2.config(r2q=100, **settings[name])
     
-    return net
\ No newline at end of file
+    return net
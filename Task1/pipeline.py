@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+import os
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from mn_log import info
+import analyze_results
+import result_cache
+import downsample as ds
+from flow_analysis import flow_selection
+import experiments
+from experiments import run_experiments, CONGESTION_ALGOS
+
+# experiments.py --option -> analyze_results experiment keys it produces
+OPTION_EXPERIMENTS = {
+    'a': ['a'],
+    'b': ['b'],
+    'c': ['c'],
+    'd': ['d1', 'd5'],
+    'all': ['a', 'b', 'c', 'd1', 'd5'],
+}
+
+
+def _init_analysis_worker(niceness, *init_args):
+    """Lower the worker's CPU priority so the running emulation keeps precedence"""
+    os.nice(niceness)
+    analyze_results.init_worker(*init_args)
+
+
+class AnalysisPipeline:
+    """Analyze each algorithm's artifacts as soon as its emulation run finishes.
+
+    Every completed run submits its experiment x algorithm unit to a low-priority
+    process pool; once all units of an experiment are parsed, the experiment's
+    plots and summaries are rendered from the parsed results. The emulation keeps
+    running in the foreground the whole time.
+    """
+
+    def __init__(self, experiments, jobs, niceness, flow='all', side='server'):
+        self.flow = flow
+        self.side = side
+        self.pending = {experiment: set(CONGESTION_ALGOS) for experiment in experiments}
+        self.units = {experiment: [] for experiment in experiments}
+        self.renders = {}
+        self.rendered = {experiment: threading.Event() for experiment in experiments}
+        self.lock = threading.RLock()  # done-callbacks may run inline under the lock
+        # spawn, not fork: workers must not inherit the Mininet shells and veth state
+        self.pool = ProcessPoolExecutor(
+            max_workers=jobs, mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_analysis_worker,
+            initargs=(niceness, *result_cache.settings(), ds.max_points, ds.method))
+
+    def on_run_complete(self, experiment, algo):
+        """experiments.py callback: queue the analysis of one finished run"""
+        if experiment not in self.pending:
+            return
+        info(f'*** Queued analysis of experiment {experiment} with {algo}\n')
+        unit = self.pool.submit(analyze_results.prepare_unit, experiment, algo)
+        with self.lock:
+            self.units[experiment].append(unit)
+            self.pending[experiment].discard(algo)
+            if not self.pending[experiment]:
+                self._render_when_parsed(experiment)
+
+    def _render_when_parsed(self, experiment):
+        units = list(self.units[experiment])
+        remaining = [len(units)]
+
+        def unit_done(_future):
+            with self.lock:
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    # Hand the parsed results on, as analyze_results.analyze_parallel does; a unit that
+                    # failed is simply parsed again (or reported) by the render
+                    parsed = [pair for unit in units if unit.exception() is None for pair in unit.result()]
+                    self.renders[experiment] = self.pool.submit(
+                        analyze_results.render_experiment, experiment, CONGESTION_ALGOS, self.flow, self.side, parsed)
+                    self.rendered[experiment].set()
+
+        for unit in units:
+            unit.add_done_callback(unit_done)
+
+    def finish(self):
+        """Wait for outstanding analysis and print each experiment's output in order"""
+        for experiment in self.pending:
+            with self.lock:
+                if self.pending[experiment]:
+                    # Some algorithm never reported (e.g. an aborted run); analyze what exists
+                    for algo in sorted(self.pending[experiment]):
+                        self.units[experiment].append(
+                            self.pool.submit(analyze_results.prepare_unit, experiment, algo))
+                    self.pending[experiment].clear()
+                    self._render_when_parsed(experiment)
+        # Renders are submitted from unit callbacks, so wait for them before shutting down
+        for experiment in self.pending:
+            self.rendered[experiment].wait()
+        self.pool.shutdown(wait=True)
+        for experiment in self.pending:
+            try:
+                print(self.renders[experiment].result(), end='')
+            except Exception as e:
+                print(f"Error analyzing experiment {experiment}: {e}")
+        print("Analysis complete!")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run TCP congestion control experiments and analyze them as each run finishes')
+    parser.add_argument('--option', choices=list(OPTION_EXPERIMENTS), default='all',
+                      help='Experiment option to run (a, b, c, d, or all)')
+    parser.add_argument('--jobs', type=int, default=max((os.cpu_count() or 2) - 1, 1),
+                      help='Background analysis worker processes')
+    parser.add_argument('--nice', type=int, default=10,
+                      help='Niceness increment applied to the analysis workers')
+    experiments.add_arguments(parser)
+    parser.add_argument('--window-flow', type=flow_selection, default='all',
+                      help="Window series to plot: 'all' packets, 'sum' of per-flow windows, or a flow index")
+    parser.add_argument('--window-side', choices=['server', 'client', 'both'], default='server',
+                      help='Endpoint whose advertised receive window is analyzed')
+
+    args = parser.parse_args()
+    pipeline = AnalysisPipeline(OPTION_EXPERIMENTS[args.option], args.jobs, args.nice,
+                                args.window_flow, args.window_side)
+    try:
+        experiments.apply_arguments(args)
+        run_experiments(args.option, on_run_complete=pipeline.on_run_complete, emulate=args.emulate)
+    finally:
+        pipeline.finish()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+
+import os
+import hashlib
+import functools
+import tempfile
+from collections import OrderedDict
+import numpy as np
+
+DEFAULT_CACHE_DIR = os.environ.get('ANALYSIS_CACHE_DIR', os.path.join('results', '.analysis_cache'))
+HASH_CHUNK = 1 << 20
+
+
+class ResultCache:
+    """Content-addressed cache for per-artifact analysis results.
+
+    Results are looked up in an in-process LRU keyed by (kind, path, size, mtime)
+    and then in an on-disk store of .npz files named by the artifact's content
+    hash, so an unchanged artifact is never parsed twice, even across runs.
+    When disabled only the on-disk store is skipped.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_entries=64, enabled=True):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._lru = OrderedDict()
+
+    def _stat_key(self, file_path):
+        st = os.stat(file_path)
+        return (os.path.abspath(file_path), st.st_size, st.st_mtime_ns)
+
+    def content_hash(self, file_path, stat_key):
+        """Return the BLAKE2b digest of a file, re-hashing only when its path, size or mtime changed"""
+        stat_name = hashlib.sha1(repr(stat_key).encode()).hexdigest()
+        stat_file = os.path.join(self.cache_dir, 'stat', stat_name)
+        try:
+            with open(stat_file) as f:
+                return f.read().strip()
+        except OSError:
+            pass
+
+        h = hashlib.blake2b(digest_size=20)
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+                h.update(chunk)
+        digest = h.hexdigest()
+        self._try_write(stat_file, lambda f: f.write(digest.encode()))
+        return digest
+
+    def get(self, kind, file_path, compute):
+        """Return compute(file_path), served from memory or disk when the artifact is unchanged"""
+        stat_key = self._stat_key(file_path)
+        lru_key = (kind,) + stat_key
+        if lru_key in self._lru:
+            self._lru.move_to_end(lru_key)
+            return self._lru[lru_key]
+
+        if not self.enabled:
+            result = compute(file_path)
+        else:
+            digest = self.content_hash(file_path, stat_key)
+            store_file = os.path.join(self.cache_dir, kind, f'{digest}.npz')
+            result = self._load(store_file)
+            if result is None:
+                result = compute(file_path)
+                if result is None:
+                    return None  # failures are not cached, so the next run retries them
+                self._try_write(store_file, lambda f: self._dump(f, result))
+
+        if result is not None:
+            self.put(kind, file_path, result, stat_key)
+        return result
+
+    def put(self, kind, file_path, result, stat_key=None):
+        """Remember a result in the in-memory LRU only, e.g. one parsed by another process"""
+        self._lru[(kind,) + (stat_key or self._stat_key(file_path))] = result
+        if len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def _dump(self, f, result):
+        lists = [k for k, v in result.items() if isinstance(v, list)]
+        arrays = {k: np.asarray(v) for k, v in result.items()}
+        np.savez(f, __lists__=np.array(lists, dtype=str), **arrays)
+
+    def _load(self, store_file):
+        try:
+            with np.load(store_file, allow_pickle=False) as npz:
+                lists = set(npz['__lists__'].tolist())
+                result = {}
+                for k in npz.files:
+                    if k == '__lists__':
+                        continue
+                    v = npz[k]
+                    if k in lists:
+                        result[k] = v.tolist()
+                    elif v.ndim == 0:
+                        result[k] = v.item()
+                    else:
+                        result[k] = v
+                return result
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _try_write(self, path, write):
+        # A read-only store (e.g. written by a sudo run) still serves hits; misses just aren't persisted
+        try:
+            self._atomic_write(path, write)
+        except OSError as e:
+            print(f"Warning: could not write cache entry {path}: {e}")
+
+    def _atomic_write(self, path, write):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+
+_default_cache = ResultCache()
+
+
+def configure(cache_dir=None, enabled=None):
+    """Change where (or whether) cached_artifact results are stored"""
+    if cache_dir is not None:
+        _default_cache.cache_dir = cache_dir
+    if enabled is not None:
+        _default_cache.enabled = enabled
+    _default_cache._lru.clear()
+
+
+def settings():
+    """Return the (cache_dir, enabled) pair in effect, e.g. to hand to worker processes"""
+    return _default_cache.cache_dir, _default_cache.enabled
+
+
+def cached_artifact(kind, version=1):
+    """Decorator caching a function of one artifact path in the shared ResultCache.
+
+    Bump `version` whenever the shape of the function's result changes, so
+    entries written by older code are not served.
+    """
+    store = f'{kind}-v{version}'
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(file_path):
+            return _default_cache.get(store, file_path, func)
+        wrapper.seed = lambda file_path, result: _default_cache.put(store, file_path, result)
+        return wrapper
+    return decorator
@@ -3,17 +3,17 @@
 
 mkdir -p results
 
-chmod +x experiments.py analyze_results.py
+chmod +x experiments.py analyze_results.py pipeline.py
 
-sudo python3 experiments.py --option=a
-python3 analyze_results.py --experiment=a
-sudo python3 experiments.py --option=b
-python3 analyze_results.py --experiment=b
-sudo python3 experiments.py --option=c
-python3 analyze_results.py --experiment=c
-sudo python3 experiments.py --option=d
-python3 analyze_results.py --experiment=d
+# Any other arguments (e.g. --capture ring, --generator builtin) go to the experiment runner
+if [ "$1" = "--no-pipeline" ]; then
+    shift
+    sudo python3 experiments.py --option=all "$@"
 
-
-echo "Analyzing results "
-python3 analyze_results.py --experiment=all
\ No newline at end of file
+    echo "Analyzing results "
+    python3 analyze_results.py --experiment=all
+else
+    # Each algorithm's artifacts are analyzed in low-priority background workers
+    # as soon as its run finishes, while the next emulation is already running.
+    sudo python3 pipeline.py --option=all "$@"
+fi
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+import re
+import time
+import threading
+import subprocess
+from array import array
+import numpy as np
+from mn_log import info, warn
+from host_jobs import HostJob
+
+# One match per field of an `ss -tin` info line; rates are printed either as raw
+# bps or, by older ss, with a K/M/G prefix, and pacing_rate may add "/max".
+# The leading literal space lets re skip ahead quickly (and keeps ' mss:' from matching 'rcvmss:')
+FIELD_RE = re.compile(r' (?:(rtt|cwnd|ssthresh|retrans|mss):([\d./]+)'
+                      r'|(pacing_rate|delivery_rate) ([\d.]+)([KMG]?)bps)')
+RATE_PREFIX = {'': 1.0, 'K': 1e3, 'M': 1e6, 'G': 1e9}
+
+# Columns written per (sample, socket) row
+COLUMNS = ('cwnd', 'mss', 'ssthresh', 'srtt', 'rttvar', 'pacing_rate', 'delivery_rate', 'retrans')
+INDEX = {name: i for i, name in enumerate(COLUMNS)}
+SRTT, RTTVAR, RETRANS = INDEX['srtt'], INDEX['rttvar'], INDEX['retrans']
+NAN = float('nan')
+
+
+class SampleBuffer:
+    """Columnar accumulator of parsed `ss -tin` output"""
+
+    def __init__(self):
+        self.sockets = {}  # "local peer" -> socket index
+        self.time = array('d')
+        self.socket = array('i')
+        self.rows = array('d')  # row-major, len(COLUMNS) values per row
+        self.samples = 0
+
+    def add_socket(self, when, key, line):
+        """Parse one socket's info line into a row"""
+        row = [NAN] * len(COLUMNS)
+        row[RETRANS] = 0.0  # ss omits retrans until the first one
+        for name, value, rate_name, rate, prefix in FIELD_RE.findall(line):
+            if rate_name:
+                row[INDEX[rate_name]] = float(rate) * RATE_PREFIX[prefix]
+            elif name == 'rtt':
+                srtt, _, rttvar = value.partition('/')
+                row[SRTT], row[RTTVAR] = float(srtt), float(rttvar or NAN)
+            elif name == 'retrans':
+                row[RETRANS] = float(value.rpartition('/')[2])  # "current/total"
+            else:
+                row[INDEX[name]] = float(value)
+        self.time.append(when)
+        self.socket.append(self.sockets.setdefault(key, len(self.sockets)))
+        self.rows.extend(row)
+
+    def save(self, output_file):
+        rows = np.frombuffer(self.rows, dtype=np.float64).reshape(-1, len(COLUMNS)).astype(np.float32)
+        np.savez(output_file,
+                 sockets=np.array(list(self.sockets), dtype=str),
+                 time=np.frombuffer(self.time, dtype=np.float64),
+                 socket=np.frombuffer(self.socket, dtype=np.int32),
+                 **{name: rows[:, i] for i, name in enumerate(COLUMNS)})
+
+
+def parse_ss_output(stream, buffer, clock=time.time):
+    """Feed `ss -Htin` output, with '#<epoch>' marker lines before each sample, into `buffer`"""
+    when, key = clock(), None
+    for line in stream:
+        if isinstance(line, bytes):
+            line = line.decode(errors='replace')
+        if line.startswith('#'):
+            stamp = line[1:].strip().replace(',', '.')  # EPOCHREALTIME uses the locale's decimal point
+            when = float(stamp) if stamp else clock()
+            buffer.samples += 1
+        elif line[:1] in (' ', '\t'):
+            if key is not None:
+                buffer.add_socket(when, key, line)
+                key = None
+        elif line.strip():
+            # "Recv-Q Send-Q Local:Port Peer:Port" (the state column is dropped by the filter)
+            fields = line.split()
+            key = f'{fields[-2]} {fields[-1]}'
+
+
+class TcpSampler:
+    """Periodic `ss -tin` snapshots of a host's sockets towards the server ports.
+
+    A single bash (>= 5) loop in the host's namespace prints a '#$EPOCHREALTIME'
+    marker and one ss snapshot every `interval` seconds, so there is no Mininet
+    round-trip per sample; a reader thread parses the snapshots as they arrive.
+    """
+
+    def __init__(self, host, ports, output_file, interval=0.01):
+        self.host = host
+        self.output_file = output_file
+        self.buffer = SampleBuffer()
+        ports = ' or '.join(f'dport = :{port}' for port in ports)
+        if getattr(host, 'bind_address', None):
+            ports = f'( {ports} ) and src {host.bind_address}'  # emulated hosts share one namespace
+        # Sleep only for what is left of each tick (in integer microseconds, all bash builtins
+        # except ss and sleep); when ss itself takes longer than `interval`, sample back to back
+        loop = (f'next=${{EPOCHREALTIME/[.,]/}}; '
+                f'while :; do echo "#$EPOCHREALTIME"; ss -Htin state established "( {ports} )"; '
+                f'next=$((next + {int(interval * 1e6)})); now=${{EPOCHREALTIME/[.,]/}}; wait=$((next - now)); '
+                f'if ((wait > 0)); then printf -v frac %06d $((wait % 1000000)); sleep $((wait / 1000000)).$frac; '
+                f'else next=$now; fi; done')
+        self.job = HostJob(host, ['bash', '-c', loop], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        self.thread = threading.Thread(target=parse_ss_output, args=(self.job.proc.stdout, self.buffer), daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop sampling and write the arrays to `output_file` (.npz)"""
+        self.job.stop()
+        self.thread.join()
+        if not self.buffer.samples:
+            warn(f'*** {self.host.name}: no socket samples collected\n')
+        self.buffer.save(self.output_file)
+        info(f'*** {self.host.name}: {self.buffer.samples} samples of {len(self.buffer.sockets)} sockets '
+             f'written to {self.output_file}\n')
+
+
+def load_samples(path):
+    """Read a sampler .npz back as a dict of arrays"""
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
@@ -0,0 +1,145 @@
+import os
+import time
+import threading
+from types import SimpleNamespace
+import pytest
+import capture
+from capture import FlowCounters, RingCapture
+from common.pcap import read_tcp_columns
+from common.pcap_testing import tcp_frame, write_pcap
+
+SYN, ACK = 0x02, 0x10
+CLIENT, SERVER = ('10.0.0.2', 40000), ('10.0.0.1', 5201)  # the client is the hi endpoint
+
+
+def wscale(shift):
+    return b'\x01\x03\x03' + bytes([shift])
+
+
+def client_frame(flags, **fields):
+    return tcp_frame(*CLIENT, *SERVER, flags, **fields)
+
+
+def server_frame(flags, **fields):
+    return tcp_frame(*SERVER, *CLIENT, flags, **fields)
+
+
+def columns(tmp_path, name, frames):
+    path = tmp_path / name
+    write_pcap(path, frames)
+    return read_tcp_columns(path)
+
+
+def test_flow_counters_keep_handshake_across_files(tmp_path):
+    counters = FlowCounters()
+    counters.update(columns(tmp_path, 'a', [
+        (1.0, client_frame(SYN, window=64240, options=wscale(7))),
+        (1.1, server_frame(SYN | ACK, window=65160, options=wscale(9))),
+    ]))
+    counters.update(columns(tmp_path, 'b', [
+        (2.0, client_frame(ACK, window=500, payload=b'x' * 100)),
+        (2.5, server_frame(ACK, window=40)),
+        (3.0, client_frame(ACK | 0x01, window=600, payload=b'x' * 50)),
+    ]))
+
+    row, = counters.summary()
+    assert (counters.files, counters.packets) == (2, 5)
+    assert row['Client'] == '10.0.0.2:40000' and row['Server'] == '10.0.0.1:5201'
+    assert row['Window Scale'] == [7, 9]
+    # SYN windows are never scaled and do not count towards the maximum
+    assert row['Max Window (client)'] == 600 << 7
+    assert row['Max Window (server)'] == 40 << 9
+    assert (row['Bytes (client->server)'], row['Bytes (server->client)']) == (150, 0)
+    assert (row['Packets'], row['SYN'], row['FIN'], row['RST']) == (5, 2, 1, 0)
+    assert row['Duration (s)'] == pytest.approx(2.0)
+
+
+def test_flow_counters_without_handshake(tmp_path):
+    counters = FlowCounters()
+    counters.update(columns(tmp_path, 'a', [
+        (1.0, server_frame(ACK, window=30)),
+        (1.5, client_frame(ACK, window=20, payload=b'x' * 10)),
+    ]))
+
+    row, = counters.summary()
+    # The side that sent the payload is the client, and unscaled windows are reported raw
+    assert row['Client'] == '10.0.0.2:40000'
+    assert row['Window Scale'] == [-1, -1]
+    assert (row['Max Window (client)'], row['Max Window (server)']) == (20, 30)
+
+
+class FakeJob:
+    """Stands in for tcpdump: the test writes the ring files and reports each rotation"""
+
+    def __init__(self, host, cmd, stdout=None):
+        self.cmd = cmd
+        read_fd, self.write_fd = os.pipe()
+        self.proc = SimpleNamespace(stdout=os.fdopen(read_fd, 'rb'))
+
+    def rotate(self, path):
+        os.write(self.write_fd, f'{path}\n'.encode())
+
+    def stop(self):
+        os.close(self.write_fd)
+
+
+@pytest.fixture
+def ring(tmp_path, monkeypatch):
+    monkeypatch.setattr(capture, 'HostJob', FakeJob)
+    monkeypatch.setattr(capture, 'wait_for_output', lambda job, marker: True)
+    host = SimpleNamespace(defaultIntf=lambda: SimpleNamespace(name='h1-eth0'))
+
+    def start(ring_files):
+        return RingCapture(host, str(tmp_path / 'ring'), summary_file=str(tmp_path / 'summary.json'),
+                           ring_files=ring_files)
+    return start
+
+
+def write_file(ring, index, packets):
+    path = os.path.join(ring.ring_dir, f'ring{index}')
+    write_pcap(path, [(i, client_frame(ACK, payload=b'x')) for i in range(packets)])
+    return path
+
+
+def wait_for(condition):
+    for _ in range(500):
+        if condition():
+            return
+        time.sleep(0.01)
+    raise AssertionError('timed out')
+
+
+def test_ring_capture_summarizes_closed_files_while_running(ring):
+    ring_capture = ring(ring_files=3)
+    assert '-W 3 -z echo' in ring_capture.job.cmd
+    ring_capture.job.rotate(write_file(ring_capture, 0, 1))
+    wait_for(lambda: ring_capture.counters.files == 1)
+    ring_capture.job.rotate(write_file(ring_capture, 1, 2))
+    wait_for(lambda: ring_capture.counters.files == 2)
+    write_file(ring_capture, 2, 4)  # still being written when the capture stops
+
+    row, = ring_capture.stop()
+    assert (ring_capture.counters.files, ring_capture.counters.packets, ring_capture.lost) == (3, 7, 0)
+    assert row['Packets'] == 7
+
+
+def test_ring_capture_drops_files_reused_while_it_lagged(ring, monkeypatch):
+    release = threading.Event()
+
+    def slow_read(path):
+        release.wait(5)
+        return read_tcp_columns(path)
+    monkeypatch.setattr(capture, 'read_tcp_columns', slow_read)
+
+    ring_capture = ring(ring_files=3)
+    # tcpdump goes around the ring while the first file is being read
+    for number in range(4):
+        ring_capture.job.rotate(write_file(ring_capture, number % 3, number + 1))
+    wait_for(lambda: ring_capture.rotations == 4)
+    write_file(ring_capture, 1, 10)
+    release.set()
+
+    ring_capture.stop()
+    # Files 0-2 were (or may have been) overwritten; file 3 and the final file 4 are intact
+    assert ring_capture.lost == 3
+    assert (ring_capture.counters.files, ring_capture.counters.packets) == (2, 4 + 10)
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+import downsample as ds
+
+
+def reference_lttb(x, y, n_out):
+    """Textbook LTTB over the same bucket edges, one point at a time"""
+    n = len(x)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    keep, a = [0], 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 1 < n_out - 2 and edges[i + 2] > hi:
+            nx, ny = np.mean(x[hi:edges[i + 2]]), np.mean(y[hi:edges[i + 2]])
+        elif i + 1 < n_out - 2:
+            nx, ny = 0.0, 0.0
+        else:
+            nx, ny = x[-1], y[-1]
+        best, best_area = a, -1.0
+        for j in range(lo, hi):
+            area = abs((x[a] - nx) * (y[j] - y[a]) - (x[a] - x[j]) * (ny - y[a]))
+            if area > best_area:
+                best, best_area = j, area
+        a = best
+        keep.append(a)
+    keep.append(n - 1)
+    return np.unique(keep)
+
+
+@pytest.mark.parametrize('n,n_out', [(10, 5), (1000, 100), (1001, 37), (50, 48)])
+def test_lttb_matches_reference(n, n_out):
+    rng = np.random.default_rng(n)
+    x = np.sort(rng.uniform(0, 100, n))
+    y = rng.normal(size=n).cumsum()
+    keep = reference_lttb(x, y, n_out)
+    dx, dy = ds.lttb(x, y, n_out)
+    assert np.array_equal(dx, x[keep])
+    assert np.array_equal(dy, y[keep])
+
+
+def test_lttb_keeps_ends_and_spike():
+    x = np.arange(10000, dtype=float)
+    y = np.zeros(10000)
+    y[4321] = 1e6
+    dx, dy = ds.lttb(x, y, 50)
+    assert len(dx) <= 50
+    assert dx[0] == 0 and dx[-1] == 9999
+    assert 1e6 in dy
+
+
+def test_minmax_envelope():
+    rng = np.random.default_rng(1)
+    x = np.arange(1003)
+    y = rng.integers(0, 1000, 1003)
+    n_out = 42
+    dx, dy = ds.minmax(x, y, n_out)
+    assert np.all(np.diff(dx) > 0)
+    assert dx[0] == 0 and dx[-1] == 1002
+    assert len(dx) <= n_out
+    width = -(-len(x) // ((n_out - 2) // 2))
+    for start in range(0, len(x), width):
+        bucket = y[start:start + width]
+        kept = dy[(dx >= start) & (dx < start + width)]
+        assert bucket.min() in kept and bucket.max() in kept
+
+
+@pytest.mark.parametrize('how', ds.METHODS)
+def test_short_series_untouched(how):
+    x, y = np.arange(5), np.arange(5) * 2
+    dx, dy = ds.downsample(x, y, n_out=10, how=how)
+    assert np.array_equal(dx, x) and np.array_equal(dy, y)
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        ds.downsample([1, 2], [1, 2], how='nope')
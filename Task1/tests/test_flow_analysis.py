@@ -0,0 +1,141 @@
+import argparse
+import ipaddress
+import numpy as np
+import pytest
+from common.pcap import TCP_DTYPE
+from flow_analysis import build_flow_table, window_series, flow_summary, flow_selection, select_packets, SIDES
+
+SYN, ACK, FIN = 0x02, 0x10, 0x01
+# Client and server endpoints: flow 0 is opened by its hi endpoint, flow 1 has no captured handshake
+C1, S1 = ('10.0.0.7', 40000), ('10.0.0.1', 5201)
+C2, S2 = ('10.0.0.2', 40001), ('10.0.0.8', 5201)
+
+
+def packets(*rows):
+    """TCP_DTYPE columns from (time, src, dst, flags, window, payload_len, wscale) rows"""
+    cols = np.zeros(len(rows), dtype=TCP_DTYPE)
+    for i, (time, src, dst, flags, window, payload_len, wscale) in enumerate(rows):
+        cols[i] = (time, int(ipaddress.IPv4Address(src[0])), src[1], int(ipaddress.IPv4Address(dst[0])), dst[1],
+                   flags, 0, 0, window, payload_len, payload_len + 54, wscale)
+    return cols
+
+
+HANDSHAKE = packets(
+    (10.0, C1, S1, SYN, 64240, 0, 7),
+    (10.1, S1, C1, SYN | ACK, 65160, 0, 9),
+    (10.2, C1, S1, ACK, 500, 0, -1),
+    (10.3, C2, S2, ACK, 100, 1000, -1),
+    (10.4, S1, C1, ACK, 40, 0, -1),
+    (10.5, S2, C2, ACK, 30, 0, -1),
+    (10.6, C1, S1, ACK | FIN, 600, 1448, -1),
+)
+
+
+def test_flow_table_orients_flows_and_scales_windows():
+    table = build_flow_table(HANDSHAKE)
+    client, server = SIDES['client'], SIDES['server']
+
+    np.testing.assert_allclose(table['times'], np.arange(7) / 10)
+    np.testing.assert_array_equal(table['flow'], [0, 0, 0, 1, 0, 1, 0])
+    np.testing.assert_array_equal(table['side'], [client, server, client, client, server, server, client])
+    # SYN segments are never scaled; later ones are shifted by their sender's scale
+    np.testing.assert_array_equal(table['window'], [64240, 65160, 500 << 7, 100, 40 << 9, 30, 600 << 7])
+    np.testing.assert_array_equal(table['flow_wscale'], [[7, 9], [-1, -1]])
+    np.testing.assert_array_equal(table['flow_handshake'], [True, False])
+
+
+def test_flow_table_needs_both_scales():
+    # A SYN-ACK without the option turns window scaling off in both directions (RFC 7323)
+    table = build_flow_table(packets(
+        (0.0, C1, S1, SYN, 64240, 0, 7),
+        (0.1, S1, C1, SYN | ACK, 65160, 0, -1),
+        (0.2, C1, S1, ACK, 500, 0, -1),
+        (0.3, S1, C1, ACK, 40, 0, -1),
+    ))
+    np.testing.assert_array_equal(table['flow_wscale'], [[7, -1]])
+    np.testing.assert_array_equal(table['window'], [64240, 65160, 500, 40])
+
+
+def test_flow_table_handshake_wins_over_payload():
+    # The server (lo endpoint) sends most of the payload, but the bare SYN names the client
+    table = build_flow_table(packets(
+        (0.0, C1, S1, SYN, 64240, 0, 2),
+        (0.1, S1, C1, SYN | ACK, 65160, 0, 3),
+        (0.2, S1, C1, ACK, 10, 5000, -1),
+    ))
+    summary, = flow_summary(table)
+    assert (summary['Client'], summary['Server']) == ('10.0.0.7:40000', '10.0.0.1:5201')
+    assert summary['Window Scale'] == (2, 3)
+    assert summary['Bytes (server->client)'] == 5000
+
+
+def test_flow_table_empty():
+    table = build_flow_table(packets())
+    assert len(table['flow']) == 0 and table['flow_wscale'].shape == (0, 2)
+    assert flow_summary(table) == []
+    times, window = window_series(table, 'sum')
+    assert len(times) == len(window) == 0
+
+
+def test_flow_summary():
+    first, second = flow_summary(build_flow_table(HANDSHAKE))
+    assert first == {
+        'Flow': 0, 'Client': '10.0.0.7:40000', 'Server': '10.0.0.1:5201', 'Window Scale': (7, 9),
+        'Packets': 5, 'Bytes (client->server)': 1448, 'Bytes (server->client)': 0,
+        'Max Window (client)': 600 << 7, 'Max Window (server)': 65160,
+    }
+    # Without a handshake, the endpoint that sent the payload is the client
+    assert (second['Client'], second['Server'], second['Window Scale']) == ('10.0.0.2:40001', '10.0.0.8:5201', (-1, -1))
+    assert (second['Max Window (client)'], second['Max Window (server)']) == (100, 30)
+
+
+def test_select_packets():
+    table = build_flow_table(HANDSHAKE)
+    np.testing.assert_array_equal(np.flatnonzero(select_packets(table)), [1, 4, 5])
+    np.testing.assert_array_equal(np.flatnonzero(select_packets(table, 0, 'client')), [0, 2, 6])
+    np.testing.assert_array_equal(np.flatnonzero(select_packets(table, 1, 'both')), [3, 5])
+
+
+def test_window_series_single_flow():
+    times, window = window_series(build_flow_table(HANDSHAKE), flow=0, side='server')
+    np.testing.assert_allclose(times, [0.1, 0.4])
+    np.testing.assert_array_equal(window, [65160, 40 << 9])
+
+
+def reference_sum(table, side):
+    """At each selected packet, the sum over (flow, side) of the latest window seen so far"""
+    mask = select_packets(table, 'sum', side)
+    latest, out = {}, []
+    for flow, packet_side, window in zip(table['flow'][mask], table['side'][mask], table['window'][mask]):
+        latest[flow, packet_side] = window
+        out.append(sum(latest.values()))
+    return out
+
+
+@pytest.mark.parametrize('side', ['server', 'client', 'both'])
+def test_window_series_sum(side):
+    rng = np.random.default_rng(7)
+    n = 500
+    table = {
+        'times': np.arange(n) / 100,
+        'flow': rng.integers(0, 5, n).astype(np.int32),
+        'side': rng.integers(0, 2, n).astype(np.int8),
+        'window': rng.integers(0, 1 << 20, n),
+    }
+    times, window = window_series(table, 'sum', side)
+    assert len(times) == len(window) == select_packets(table, 'sum', side).sum()
+    np.testing.assert_array_equal(window, reference_sum(table, side))
+
+
+def test_window_series_sum_handshake():
+    _, window = window_series(build_flow_table(HANDSHAKE), 'sum', 'both')
+    np.testing.assert_array_equal(window, [
+        64240, 64240 + 65160, (500 << 7) + 65160, (500 << 7) + 65160 + 100,
+        (500 << 7) + (40 << 9) + 100, (500 << 7) + (40 << 9) + 100 + 30, (600 << 7) + (40 << 9) + 100 + 30,
+    ])
+
+
+def test_flow_selection():
+    assert flow_selection('sum') == 'sum' and flow_selection('3') == 3
+    with pytest.raises(argparse.ArgumentTypeError):
+        flow_selection('-1')
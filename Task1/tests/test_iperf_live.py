@@ -0,0 +1,102 @@
+import pytest
+import iperf_live
+from iperf_live import run_live_clients
+
+
+class Clock:
+    """Stands in for the time module, so the poll loop runs instantly and deterministically"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+        if self.now > 1000:
+            raise AssertionError('run_live_clients did not settle')
+
+
+class FakeJob:
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self.proc = type('Proc', (), {'returncode': 0})()
+
+
+class FakeClient:
+    """Behaves like a LiveClient that finishes ('ok'), fails at once ('fail') or hangs until stopped ('hang')"""
+
+    def __init__(self, clock, behaviour, duration, deadline):
+        self.clock = clock
+        self.behaviour = behaviour
+        self.finish = clock.now + (duration if behaviour == 'ok' else 0)
+        self.job = FakeJob(clock.now + deadline)
+        self.error = 'connection refused' if behaviour == 'fail' else None
+        self.stopped = False
+
+    def done(self):
+        return self.stopped or (self.behaviour != 'hang' and self.clock.now >= self.finish)
+
+    def failed(self):
+        return self.done() and self.behaviour != 'ok'
+
+    def stalled(self):
+        return False
+
+    def overran(self):
+        return self.clock.now > self.job.deadline
+
+    def latest_mbps(self):
+        return None
+
+    def stop(self):
+        self.stopped = True
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(iperf_live, 'time', clock)
+    monkeypatch.setattr(iperf_live, 'warn', lambda message: None)
+    return clock
+
+
+def launcher(clock, behaviours, deadline=lambda duration: duration + 1):
+    """A start() that plays the given behaviours on successive attempts and records their durations"""
+    started = []
+
+    def start(duration):
+        started.append(duration)
+        return FakeClient(clock, behaviours[len(started) - 1], duration, deadline(duration))
+    return start, started
+
+
+def test_success(clock):
+    start, started = launcher(clock, ['ok'])
+    clients = run_live_clients([(2, 'h1', 10, start)], report_every=1000)
+    assert started == [10] and not clients['h1'].failed()
+    assert 12 <= clock.now < 13
+
+
+def test_overrun_is_given_up(clock):
+    start, started = launcher(clock, ['hang'])
+    clients = run_live_clients([(0, 'h1', 10, start)], report_every=1000)
+    assert started == [10] and clients['h1'].stopped
+    assert clock.now <= 12
+
+
+def test_overrun_is_retried_for_the_rest_of_the_window(clock):
+    # The first attempt's deadline is half way through the window, leaving time for a retry
+    start, started = launcher(clock, ['hang', 'ok'], deadline=lambda duration: duration / 2)
+    clients = run_live_clients([(0, 'h1', 10, start)], report_every=1000)
+    assert started == [10, 4]
+    assert not clients['h1'].failed()
+
+
+def test_failures_retry_then_give_up(clock):
+    start, started = launcher(clock, ['fail'] * 3)
+    ok_start, _ = launcher(clock, ['ok'])
+    clients = run_live_clients([(0, 'h1', 10, start), (0, 'h2', 3, ok_start)], retries=2, report_every=1000)
+    assert started == [10, 10, 9]
+    assert clients['h1'].failed() and not clients['h2'].failed()
@@ -0,0 +1,209 @@
+import io
+import os
+import json
+import numpy as np
+import pytest
+import iperf_stream
+from iperf_stream import IntervalSeries, _JsonCursor, parse_iperf_stream
+from iperf_live import LiveClient, json_stream_supported
+
+
+def stream(socket, bps, cwnd):
+    return {'socket': socket, 'start': 0, 'end': 1.000041, 'seconds': 1.000041, 'bytes': bps // 8,
+            'bits_per_second': bps * 1.0, 'retransmits': 0, 'snd_cwnd': cwnd, 'rtt': 1200, 'rttvar': 300,
+            'pmtu': 1500, 'omitted': False, 'sender': True}
+
+
+# Shaped like `iperf3 -J -P 2` output, with strings and numbers that are awkward to split
+DOCUMENT = {
+    'start': {
+        'connected': [{'socket': 5, 'local_host': '10.0.0.1', 'local_port': 40000,
+                       'remote_host': '10.0.0.7', 'remote_port': 5201}],
+        'version': 'iperf 3.9',
+        'system_info': 'Linux h1 5.15.0 #1 SMP "quoted" \\ back\tslash\n',
+        'test_start': {'protocol': 'TCP', 'num_streams': 2, 'blksize': 131072, 'omit': 0},
+    },
+    'intervals': [
+        {'streams': [stream(5, 10000000 + i, 14480 * (i + 1)), stream(7, 20000000 - i, 28960)],
+         'sum': {'start': float(i), 'end': i + 1.000041, 'seconds': 1.000041, 'bytes': 3750000,
+                 'bits_per_second': 30000000.5, 'retransmits': i, 'omitted': False, 'sender': True}}
+        for i in range(3)
+    ],
+    'end': {
+        'sum_sent': {'start': 0, 'end': 3.0, 'seconds': 3.0, 'bytes': 11250000, 'bits_per_second': 3e7,
+                     'retransmits': 3, 'sender': True},
+        'cpu_utilization_percent': {'host_total': 1.5e-05, 'remote_total': -0.25},
+        'sender_tcp_congestion': 'café \U0001f600',
+        'flags': [True, False, None, [], {}],
+    },
+}
+TEXT = json.dumps(DOCUMENT, indent='\t') + '\n'
+
+
+class SplitReader:
+    """A text file whose reads return the pieces between `cuts`, whatever size is asked for"""
+
+    def __init__(self, text, cuts):
+        bounds = [0, *cuts, len(text)]
+        self.pieces = [text[a:b] for a, b in zip(bounds, bounds[1:])]
+
+    def read(self, size):
+        return self.pieces.pop(0) if self.pieces else ''
+
+
+def walk(cursor):
+    """Rebuild a document through the cursor's streaming methods"""
+    char = cursor.peek()
+    if char == '{':
+        return {key: walk(cursor) for key in cursor.items()}
+    if char == '[':
+        return [walk(cursor) for _ in iter_elements(cursor)]
+    return cursor.value()
+
+
+def iter_elements(cursor):
+    """Step through an array, letting walk() decode each element in place of elements()"""
+    cursor.expect('[')
+    if cursor.peek() == ']':
+        cursor.pos += 1
+        return
+    while True:
+        yield
+        sep = cursor.peek()
+        cursor.pos += 1
+        if sep == ']':
+            return
+        assert sep == ','
+
+
+def test_cursor_split_anywhere():
+    # Every offset, so cuts land inside keys, escapes, surrogate pairs, literals and numbers
+    for offset in range(1, len(TEXT)):
+        cursor = _JsonCursor(SplitReader(TEXT, [offset]))
+        assert walk(cursor) == DOCUMENT, offset
+        assert cursor.peek() == ''
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7])
+def test_cursor_small_reads(size):
+    cursor = _JsonCursor(SplitReader(TEXT, range(size, len(TEXT), size)))
+    assert walk(cursor) == DOCUMENT
+    cursor = _JsonCursor(SplitReader(TEXT, range(size, len(TEXT), size)))
+    assert [key for key in cursor.items() if cursor.value() is not None] == list(DOCUMENT)
+
+
+@pytest.mark.parametrize('text', ['1.5', '-12e+3', '123456'])
+def test_cursor_number_split_inside(text):
+    for offset in range(1, len(text)):
+        cursor = _JsonCursor(SplitReader(f'[{text}]', [offset + 1]))
+        assert list(cursor.elements()) == [json.loads(text)]
+
+
+def test_cursor_elements_and_empty_containers():
+    cursor = _JsonCursor(io.StringIO(' [ {"a": [1, 2]}, "x\\u00e9", [] , {} ] '))
+    assert list(cursor.elements()) == [{'a': [1, 2]}, 'xé', [], {}]
+    assert list(_JsonCursor(io.StringIO('[]')).elements()) == []
+    assert list(_JsonCursor(io.StringIO('{ }')).items()) == []
+
+
+def test_cursor_rejects_missing_delimiter():
+    with pytest.raises(json.JSONDecodeError):
+        list(_JsonCursor(io.StringIO('[1 2]')).elements())
+    with pytest.raises(json.JSONDecodeError):
+        for _ in _JsonCursor(io.StringIO('{"a" 1}')).items():
+            pass
+
+
+def write(tmp_path, text):
+    path = tmp_path / 'iperf.json'
+    path.write_text(text)
+    return path
+
+
+def test_parse_document(tmp_path, monkeypatch):
+    monkeypatch.setattr(iperf_stream, 'CHUNK_SIZE', 5)
+    data = parse_iperf_stream(write(tmp_path, TEXT))
+
+    assert data['end'] == DOCUMENT['end'] and data['error'] is None
+    np.testing.assert_array_equal(data['sum']['start'], [0, 1, 2])
+    np.testing.assert_array_equal(data['sum']['retransmits'], [0, 1, 2])
+    np.testing.assert_array_equal(data['sockets'], [5, 7])
+    np.testing.assert_array_equal(data['streams']['snd_cwnd'], [[14480, 28960], [28960, 28960], [43440, 28960]])
+    assert data['streams']['bits_per_second'].shape == (3, 2)
+
+
+def test_parse_error_document(tmp_path):
+    # What iperf3 -J writes when the server cannot be reached
+    text = '{\n\t"start":\t{\n\t\t"connected":\t[]\n\t},\n\t"intervals":\t[],\n\t"end":\t{},\n' \
+           '\t"error":\t"unable to connect to server: Connection refused"\n}\n'
+    data = parse_iperf_stream(write(tmp_path, text))
+    assert data['error'] == 'unable to connect to server: Connection refused'
+    assert data['end'] == {} and len(data['sum']['start']) == 0
+    assert data['streams']['rtt'].shape == (0, 0)
+
+
+@pytest.mark.parametrize('cut', [1, 40, TEXT.index('"intervals"') + 5, TEXT.index('"end"') - 3, len(TEXT) - 2])
+def test_parse_truncated(tmp_path, cut):
+    # An iperf3 killed mid-run leaves a truncated document
+    with pytest.raises(json.JSONDecodeError):
+        parse_iperf_stream(write(tmp_path, TEXT[:cut]))
+
+
+def test_parse_interrupted_json_stream(tmp_path):
+    # A --json-stream client killed after two intervals still leaves a complete document
+    client = LiveClient.__new__(LiveClient)
+    client.series, client.error, client.started, client.ended = IntervalSeries(), None, False, False
+    client._out, client._intervals = open(tmp_path / 'iperf.json', 'w'), 0
+    client._handle('start', DOCUMENT['start'])
+    for interval in DOCUMENT['intervals'][:2]:
+        client._handle('interval', interval)
+    client._finish()
+
+    data = parse_iperf_stream(tmp_path / 'iperf.json')
+    assert data['end'] == {} and data['error'] is None
+    np.testing.assert_array_equal(data['sum']['start'], [0, 1])
+    np.testing.assert_array_equal(data['streams']['snd_cwnd'], client.series.to_arrays()[1]['snd_cwnd'])
+
+
+def test_parse_extra_data(tmp_path):
+    with pytest.raises(json.JSONDecodeError):
+        parse_iperf_stream(write(tmp_path, TEXT + '{}'))
+
+
+def test_interval_series_aligns_streams():
+    series = IntervalSeries()
+    series.add({'streams': [{'socket': 7, 'bytes': 10}, {'socket': 5, 'bytes': 20, 'rtt': 900}],
+                'sum': {'start': 0, 'end': 1, 'bytes': 30}})
+    series.add({'streams': [{'socket': 5, 'bytes': 40}], 'sum': {'start': 1, 'end': 2}})
+    series.add({})
+
+    sums, streams, sockets = series.to_arrays()
+    np.testing.assert_array_equal(sockets, [7, 5])
+    np.testing.assert_array_equal(sums['start'], [0, 1, np.nan])
+    np.testing.assert_array_equal(sums['bytes'], [30, np.nan, np.nan])
+    # A stream missing from an interval, or a field missing from a stream, is NaN
+    np.testing.assert_array_equal(streams['bytes'], [[10, 20], [np.nan, 40], [np.nan, np.nan]])
+    np.testing.assert_array_equal(streams['rtt'], [[np.nan, 900], [np.nan, np.nan], [np.nan, np.nan]])
+
+
+def fake_iperf3(tmp_path, version_line):
+    path = tmp_path / 'iperf3'
+    path.write_text(f'#!/bin/sh\necho "{version_line}"\n')
+    os.chmod(path, 0o755)
+    return str(path)
+
+
+@pytest.mark.parametrize('version_line,supported', [
+    ('iperf 3.17.1 (cJSON 1.7.15)', True),
+    ('iperf 3.18', True),
+    ('iperf 3.16 (cJSON 1.7.15)', False),
+    ('iperf 3.9', False),
+    ('not iperf', False),
+])
+def test_json_stream_supported(tmp_path, version_line, supported):
+    assert json_stream_supported(fake_iperf3(tmp_path, version_line)) is supported
+
+
+def test_json_stream_unsupported_without_binary(tmp_path):
+    # Clients then run with plain -J output, which parse_iperf_stream reads as above
+    assert json_stream_supported(str(tmp_path / 'missing')) is False
@@ -0,0 +1,92 @@
+import struct
+import numpy as np
+import pytest
+from common import pcap
+from common.pcap import read_tcp_columns, window_scale_option, TCP_DTYPE
+from common.pcap_testing import tcp_frame, write_pcap
+
+SYN, ACK, PSH = 0x02, 0x10, 0x08
+
+
+@pytest.mark.parametrize('endian,nano', [('<', False), ('>', False), ('<', True)])
+def test_fields(tmp_path, endian, nano):
+    path = tmp_path / 'c.pcap'
+    write_pcap(path, [
+        (10.25, tcp_frame('10.0.0.1', 40000, '10.0.0.7', 5201, SYN, seq=7, window=64240,
+                          options=b'\x02\x04\x05\xb4\x01\x03\x03\x07')),
+        (10.5, tcp_frame('10.0.0.7', 5201, '10.0.0.1', 40000, ACK | PSH, seq=9, ack=8, window=501,
+                         payload=b'x' * 100)),
+    ], endian=endian, nano=nano)
+    cols = read_tcp_columns(path)
+    assert cols.dtype == TCP_DTYPE
+    assert cols['time'] == pytest.approx([10.25, 10.5])
+    assert cols['src'].tolist() == [0x0a000001, 0x0a000007]
+    assert cols['sport'].tolist() == [40000, 5201]
+    assert cols['dport'].tolist() == [5201, 40000]
+    assert cols['flags'].tolist() == [SYN, ACK | PSH]
+    assert cols['seq'].tolist() == [7, 9]
+    assert cols['ack'].tolist() == [0, 8]
+    assert cols['window'].tolist() == [64240, 501]
+    assert cols['payload_len'].tolist() == [0, 100]
+    assert cols['wscale'].tolist() == [7, -1]
+
+
+def test_skips_non_tcp_and_truncated_records(tmp_path):
+    path = tmp_path / 'c.pcap'
+    frames = [
+        (1.0, tcp_frame('10.0.0.1', 1, '10.0.0.2', 2, ACK, vlan=[0x8100])),
+        (1.5, tcp_frame('10.0.0.1', 1, '10.0.0.2', 2, ACK, seq=1, vlan=[0x88a8, 0x8100])),  # QinQ
+        (2.0, tcp_frame('10.0.0.1', 1, '10.0.0.2', 2, 0, proto=17)),
+        (3.0, b'\x00' * 12 + b'\x86\xdd' + b'\x00' * 40),  # IPv6
+        (4.0, tcp_frame('10.0.0.1', 1, '10.0.0.2', 2, ACK, seq=4)),
+    ]
+    write_pcap(path, frames)
+    with open(path, 'ab') as f:
+        f.write(struct.pack('<IIII', 5, 0, 60, 60) + b'\x00' * 10)  # cut off mid-record
+    cols = read_tcp_columns(path)
+    assert cols['time'].tolist() == [1.0, 1.5, 4.0]
+    assert cols['seq'].tolist() == [0, 1, 4]
+
+
+def test_header_only_snaplen(tmp_path):
+    path = tmp_path / 'c.pcap'
+    write_pcap(path, [(1.0, tcp_frame('10.0.0.1', 1, '10.0.0.2', 2, ACK, payload=b'x' * 1000))], snaplen=96)
+    cols = read_tcp_columns(path)
+    assert cols['payload_len'].tolist() == [1000]
+    assert cols['wire_len'].tolist() == [14 + 20 + 20 + 1000]
+
+
+def test_raw_linktype(tmp_path):
+    path = tmp_path / 'c.pcap'
+    write_pcap(path, [(1.0, tcp_frame('10.0.0.1', 1, '10.0.0.2', 2, ACK)[14:])], linktype=101)
+    assert read_tcp_columns(path)['dst'].tolist() == [0x0a000002]
+
+
+def test_empty_and_invalid(tmp_path):
+    path = tmp_path / 'c.pcap'
+    write_pcap(path, [])
+    assert len(read_tcp_columns(path)) == 0
+    path.write_bytes(b'\x0a\x0d\x0d\x0a' + b'\x00' * 40)
+    with pytest.raises(ValueError):
+        read_tcp_columns(path)
+
+
+def test_window_scale_option():
+    assert window_scale_option(b'\x01\x01\x03\x03\x0e') == 14
+    assert window_scale_option(b'\x03\x03\x10') == 14
+    assert window_scale_option(b'\x02\x04\x05\xb4') == -1
+    assert window_scale_option(b'\x00\x03\x03\x07') == -1
+    assert window_scale_option(b'\x03\x03') == -1
+    assert window_scale_option(b'\x08\x00\x03\x03\x07') == -1
+
+
+def test_chunks_match_one_batch(tmp_path, monkeypatch):
+    path = tmp_path / 'c.pcap'
+    write_pcap(path, [(i / 10, tcp_frame('10.0.0.1', 1000 + i, '10.0.0.2', 2, SYN if i % 4 else ACK, seq=i,
+                                         options=b'\x03\x03' + bytes([i % 15]) + b'\x00', proto=6 if i % 5 else 17))
+                      for i in range(100)])
+    whole = read_tcp_columns(path)
+    monkeypatch.setattr(pcap, 'CHUNK_RECORDS', 7)
+    chunked = read_tcp_columns(path)
+    assert len(whole) == 80
+    assert chunked.tobytes() == whole.tobytes()
@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+from tcp_sampler import SampleBuffer, parse_ss_output, load_samples, COLUMNS
+
+# Two ticks of the sampler loop: '#$EPOCHREALTIME' then `ss -Htin state established ...`.
+# The info lines are as printed by iproute2 ss for cubic and bbr senders.
+SS_OUTPUT = (
+    '#1700000000.250000\n'
+    '0      1086240 10.0.0.1:40000 10.0.0.7:5201\n'
+    '\t cubic wscale:9,7 rto:204 rtt:1.25/0.089 ato:40 mss:1448 pmtu:1500 rcvmss:536 advmss:1448 '
+    'cwnd:10 bytes_sent:123 bytes_acked:124 segs_out:5 segs_in:4 data_segs_out:2 send 92.7Mbps '
+    'lastsnd:8 lastrcv:8 lastack:8 pacing_rate 185Mbps delivered:3 app_limited busy:4ms '
+    'rcv_space:14480 rcv_ssthresh:64088 minrtt:0.25\n'
+    '0      0      10.0.0.2:40001 10.0.0.8:5201\n'
+    '\t bbr wscale:9,7 rto:201 rtt:0.5/0.25 mss:1448 pmtu:1500 rcvmss:536 advmss:1448 cwnd:42 '
+    'ssthresh:30 bytes_sent:9912 bytes_retrans:2896 bytes_acked:7016 segs_out:12 segs_in:9 '
+    'bbr:(bw:1.2Gbps,mrtt:0.1,pacing_gain:2.88672,cwnd_gain:2.88672) send 973Mbps '
+    'pacing_rate 1.2Gbps delivery_rate 976Mbps delivered:7 busy:12ms unacked:4 retrans:1/2 '
+    'reordering:4 minrtt:0.1\n'
+    '#1700000000,260000\n'
+    '0      434176 10.0.0.1:40000 10.0.0.7:5201\n'
+    '\t cubic wscale:9,7 rto:208 rtt:2/0.5 mss:1448 cwnd:20 ssthresh:18 '
+    'pacing_rate 115840000bps delivery_rate 98765432bps retrans:0/3 minrtt:0.25\n'
+)
+
+
+def parse(lines, clock=lambda: 0.0):
+    buffer = SampleBuffer()
+    parse_ss_output(lines, buffer, clock)
+    return buffer
+
+
+def rows(buffer):
+    return np.frombuffer(buffer.rows, dtype=np.float64).reshape(-1, len(COLUMNS))
+
+
+def column(buffer, name):
+    return rows(buffer)[:, COLUMNS.index(name)]
+
+
+def test_parse_ss_output():
+    buffer = parse(SS_OUTPUT.splitlines(keepends=True))
+
+    assert buffer.samples == 2
+    assert list(buffer.sockets) == ['10.0.0.1:40000 10.0.0.7:5201', '10.0.0.2:40001 10.0.0.8:5201']
+    assert list(buffer.socket) == [0, 1, 0]
+    # A comma decimal point (from the locale of $EPOCHREALTIME) is read too
+    np.testing.assert_allclose(buffer.time, [1700000000.25, 1700000000.25, 1700000000.26])
+    np.testing.assert_array_equal(column(buffer, 'cwnd'), [10, 42, 20])
+    np.testing.assert_array_equal(column(buffer, 'mss'), [1448, 1448, 1448])
+    np.testing.assert_array_equal(column(buffer, 'srtt'), [1.25, 0.5, 2])
+    np.testing.assert_array_equal(column(buffer, 'rttvar'), [0.089, 0.25, 0.5])
+    # Prefixed and raw bps rates, and the total of "current/total" retransmissions
+    np.testing.assert_array_equal(column(buffer, 'pacing_rate'), [185e6, 1.2e9, 115840000])
+    np.testing.assert_array_equal(column(buffer, 'retrans'), [0, 2, 3])
+
+
+def test_missing_fields_are_nan():
+    buffer = parse(SS_OUTPUT.splitlines(keepends=True))
+    # Slow start has no ssthresh and a fresh connection has no delivery_rate yet
+    np.testing.assert_array_equal(column(buffer, 'ssthresh'), [np.nan, 30, 18])
+    np.testing.assert_array_equal(column(buffer, 'delivery_rate'), [np.nan, 976e6, 98765432])
+
+
+def test_bbr_and_min_fields_do_not_shadow_rtt():
+    buffer = parse(['#1\n', '0 0 10.0.0.1:1 10.0.0.7:5201\n',
+                    '\t bbr bbr:(bw:5Mbps,mrtt:0.1) minrtt:0.2 rcvmss:536 advmss:1448\n'])
+    row, = rows(buffer)
+    assert np.isnan(row[COLUMNS.index('srtt')]) and np.isnan(row[COLUMNS.index('mss')])
+
+
+def test_rtt_without_variance():
+    buffer = parse(['#1\n', '0 0 10.0.0.1:1 10.0.0.7:5201\n', '\t rtt:3.5 cwnd:4\n'])
+    assert column(buffer, 'srtt')[0] == 3.5 and np.isnan(column(buffer, 'rttvar')[0])
+
+
+def test_incomplete_snapshots():
+    lines = [
+        b'#1700000000.5\n',
+        b'\t cubic rtt:1/1 cwnd:99\n',  # info line without its socket line
+        b'0 0 10.0.0.1:1 10.0.0.7:5201\n',  # socket line whose info line was cut off
+        b'0 0 [::ffff:10.0.0.3]:2 [::ffff:10.0.0.9]:5201\n',
+        b'\t cubic cwnd:7\n',
+        b'\t cubic cwnd:8\n',  # a second info line is not attributed to the same socket
+        b'#\n',  # empty marker: the clock is used
+        b'\n',
+    ]
+    buffer = parse(lines, clock=lambda: 42.0)
+    assert buffer.samples == 2
+    assert list(buffer.sockets) == ['[::ffff:10.0.0.3]:2 [::ffff:10.0.0.9]:5201']
+    np.testing.assert_array_equal(column(buffer, 'cwnd'), [7])
+    np.testing.assert_array_equal(buffer.time, [1700000000.5])
+
+
+def test_save_and_load(tmp_path):
+    buffer = parse(SS_OUTPUT.splitlines(keepends=True))
+    buffer.save(tmp_path / 'samples.npz')
+    samples = load_samples(tmp_path / 'samples.npz')
+    assert list(samples['sockets']) == list(buffer.sockets)
+    np.testing.assert_array_equal(samples['socket'], [0, 1, 0])
+    np.testing.assert_allclose(samples['cwnd'], [10, 42, 20])
+    assert samples['pacing_rate'].dtype == np.float32
+    assert samples['pacing_rate'][1] == pytest.approx(1.2e9)
@@ -0,0 +1,25 @@
+#!/usr/bin/env python
+
+# The CustomTopo chain as plain data, read by mn_topology (Mininet) and userspace_net
+SWITCHES = ('s1', 's2', 's3', 's4')
+
+# Each host and the switch it hangs off
+HOSTS = {'h1': 's1', 'h2': 's1', 'h3': 's2', 'h4': 's3', 'h5': 's3', 'h6': 's4', 'h7': 's4'}
+
+# Switch-to-switch links whose shaping is configurable
+SHAPED_LINKS = (('s1', 's2'), ('s2', 's3'), ('s3', 's4'))
+
+# Every link, in the order CustomTopo adds them (Mininet numbers interfaces by it)
+LINKS = tuple(HOSTS.items()) + SHAPED_LINKS
+
+
+def link_settings(bandwidth_s1_s2=10, bandwidth_s2_s3=10, bandwidth_s3_s4=10, loss_s2_s3=0, delay=None):
+    """Per-link TCLink parameters for the chain; delay (e.g. '5ms') applies to every shaped link"""
+    settings = {
+        's1-s2': {'bw': bandwidth_s1_s2, 'loss': 0},
+        's2-s3': {'bw': bandwidth_s2_s3, 'loss': loss_s2_s3},
+        's3-s4': {'bw': bandwidth_s3_s4, 'loss': 0},
+    }
+    for params in settings.values():
+        params['delay'] = delay
+    return settings
@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import json
+import time
+import socket
+import struct
+import argparse
+import selectors
+import threading
+
+TCP_CONGESTION = getattr(socket, 'TCP_CONGESTION', 13)
+TCP_INFO = getattr(socket, 'TCP_INFO', 11)
+SO_MAX_PACING_RATE = getattr(socket, 'SO_MAX_PACING_RATE', 47)  # Linux: per-socket pacing cap in bytes/s, honoured by TCP internal pacing
+TCP_NOTSENT_LOWAT = getattr(socket, 'TCP_NOTSENT_LOWAT', 25)
+
+# struct tcp_info up to tcpi_total_retrans: 8 one-byte fields, then 24 __u32
+TCP_INFO_FORMAT = '8B24I'
+TCP_INFO_LEN = struct.calcsize(TCP_INFO_FORMAT)
+
+BLOCK_SIZE = 128 * 1024  # iperf3's default TCP block
+RECV_SIZE = 1 << 20
+RATE_UNITS = {'': 1, 'K': 1e3, 'M': 1e6, 'G': 1e9}
+
+
+def parse_rate(text):
+    """iperf3-style bit rate ('10M', '1.5G', '0' for unlimited) in bits per second"""
+    text = text.strip().upper()
+    unit = text[-1] if text and text[-1] in RATE_UNITS else ''
+    return float(text[:len(text) - len(unit)]) * RATE_UNITS[unit]
+
+
+def tcp_info(sock):
+    """RTT (us), cwnd (bytes), PMTU and total retransmissions from the kernel's TCP_INFO"""
+    fields = struct.unpack(TCP_INFO_FORMAT, sock.getsockopt(socket.IPPROTO_TCP, TCP_INFO, TCP_INFO_LEN))
+    u32 = fields[8:]
+    return {'rtt': u32[15], 'rttvar': u32[16], 'snd_cwnd': u32[18] * u32[2],
+            'pmtu': u32[13], 'total_retrans': u32[23]}
+
+
+class Stream:
+    """One paced TCP sender: a socket with its own congestion control and start offset"""
+
+    def __init__(self, server, port, algo, rate, offset, block_size, zerocopy, bind=None, notsent_lowat=0):
+        self.algo = algo
+        self.rate = rate
+        self.offset = offset
+        self.block_size = block_size
+        self.sock = socket.create_connection((server, port), source_address=(bind, 0) if bind else None)
+        if algo:
+            try:
+                self.sock.setsockopt(socket.IPPROTO_TCP, TCP_CONGESTION, algo.encode())
+            except OSError as e:
+                self.sock.close()
+                raise OSError(f'congestion control {algo!r} not available ({e.strerror})') from e
+        if notsent_lowat:
+            # Keep unsent data out of the send buffer, so bytes counted as sent are on the wire
+            self.sock.setsockopt(socket.IPPROTO_TCP, TCP_NOTSENT_LOWAT, notsent_lowat)
+        if rate:
+            try:
+                self.sock.setsockopt(socket.SOL_SOCKET, SO_MAX_PACING_RATE, int(rate / 8))
+            except OSError:
+                pass  # userspace pacing below still holds the average rate
+        self.id = self.sock.fileno()
+        self.zerocopy = zerocopy
+        self.bytes = 0
+        self.started = None
+        self.error = None
+        self.last = {'bytes': 0, 'total_retrans': 0}
+        self.max_cwnd = 0
+        self.rtts = []
+
+    def run(self, t0, stop):
+        """Send blocks until `stop` is set, paced to `rate` bits/s from the stream's own start"""
+        if stop.wait(max(t0 + self.offset - time.time(), 0)):
+            return
+        buf = memoryview(bytearray(self.block_size))
+        source = None
+        if self.zerocopy:
+            # A block-sized in-memory file; sendfile() moves its pages without a user copy
+            source = os.memfd_create('traffic_gen')
+            os.ftruncate(source, self.block_size)
+        # Non-blocking, and waited on for writability with a timeout, so a stream stuck
+        # on a full send buffer notices `stop`; sendfile() ignores socket timeouts
+        self.sock.setblocking(False)
+        writable = selectors.DefaultSelector()
+        writable.register(self.sock, selectors.EVENT_WRITE)
+        self.started = time.time()
+        try:
+            while not stop.is_set():
+                if self.rate:
+                    ahead = self.started + self.bytes * 8 / self.rate - time.time()
+                    if ahead > 0 and stop.wait(ahead):
+                        break
+                try:
+                    if source is not None:
+                        self.bytes += os.sendfile(self.id, source, 0, self.block_size)
+                    else:
+                        self.bytes += self.sock.send(buf)
+                except BlockingIOError:
+                    writable.select(0.5)
+        except OSError as e:
+            if not stop.is_set():
+                self.error = f'stream {self.id}: {e}'
+        finally:
+            writable.close()
+            if source is not None:
+                os.close(source)
+
+    def interval(self, start, end):
+        """iperf3 'streams' entry for [start, end), relative to the test start"""
+        info = tcp_info(self.sock)
+        sent = self.bytes - self.last['bytes']
+        retrans = info['total_retrans'] - self.last['total_retrans']
+        self.last = {'bytes': self.bytes, 'total_retrans': info['total_retrans']}
+        self.max_cwnd = max(self.max_cwnd, info['snd_cwnd'])
+        if self.started:
+            self.rtts.append(info['rtt'])
+        seconds = end - start
+        return {'socket': self.id, 'start': start, 'end': end, 'seconds': seconds,
+                'bytes': sent, 'bits_per_second': sent * 8 / seconds if seconds > 0 else 0,
+                'retransmits': retrans, 'snd_cwnd': info['snd_cwnd'], 'rtt': info['rtt'],
+                'rttvar': info['rttvar'], 'pmtu': info['pmtu'], 'omitted': False, 'sender': True}
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class Reporter:
+    """Writes results either as one iperf3 -J document, as --json-stream events, or as text"""
+
+    def __init__(self, json_output, json_stream):
+        self.json_output = json_output
+        self.json_stream = json_stream
+        self.doc = {}
+
+    def emit(self, event, data):
+        if self.json_stream:
+            print(json.dumps({'event': event, 'data': data}), flush=True)
+        elif self.json_output:
+            if event == 'interval':
+                self.doc.setdefault('intervals', []).append(data)
+            else:
+                self.doc[event] = data
+        elif event == 'interval':
+            s = data['sum']
+            print(f"[SUM] {s['start']:6.2f}-{s['end']:6.2f} sec {s['bytes'] / 2**20:9.2f} MBytes "
+                  f"{s['bits_per_second'] / 1e6:9.2f} Mbits/sec {s['retransmits']:5d} retr", flush=True)
+        elif event == 'error':
+            print(f'traffic_gen: error - {data}', file=sys.stderr)
+
+    def close(self):
+        if self.json_output and not self.json_stream:
+            json.dump(self.doc, sys.stdout, indent=4)
+            print()
+
+
+def summed(entries, start, end):
+    total = sum(e['bytes'] for e in entries)
+    seconds = end - start
+    return {'start': start, 'end': end, 'seconds': seconds, 'bytes': total,
+            'bits_per_second': total * 8 / seconds if seconds > 0 else 0,
+            'retransmits': sum(e['retransmits'] for e in entries), 'omitted': False, 'sender': True}
+
+
+def run_client(args, reporter):
+    """Open the parallel streams, send for the test duration and report every interval"""
+    algos = args.congestion.split(',') if args.congestion else ['']
+    offsets = [float(o) for o in args.stream_offsets.split(',')] if args.stream_offsets else [0.0]
+    rate = parse_rate(args.bitrate)
+    try:
+        streams = [Stream(args.client, args.port, algos[i % len(algos)], rate,
+                          offsets[i % len(offsets)], args.length, args.zerocopy,
+                          args.bind, args.notsent_lowat)
+                   for i in range(args.parallel)]
+    except OSError as e:
+        reporter.emit('error', f'unable to start streams: {e}')
+        return 1
+
+    t0 = time.time()
+    reporter.emit('start', {
+        'connected': [{'socket': s.id, 'local_host': s.sock.getsockname()[0], 'local_port': s.sock.getsockname()[1],
+                       'remote_host': args.client, 'remote_port': args.port} for s in streams],
+        'version': 'traffic_gen',
+        'timestamp': {'time': time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime(t0)), 'timesecs': int(t0)},
+        'test_start': {'protocol': 'TCP', 'num_streams': len(streams), 'blksize': args.length,
+                       'duration': args.time, 'reverse': 0},
+        'tcp_congestion': algos,
+    })
+
+    stop = threading.Event()
+    threads = [threading.Thread(target=s.run, args=(t0, stop), daemon=True) for s in streams]
+    for t in threads:
+        t.start()
+
+    start = 0.0
+    while start < args.time and not any(s.error for s in streams):
+        end = min(start + args.interval, args.time)
+        time.sleep(max(t0 + end - time.time(), 0))
+        now = time.time() - t0
+        entries = [s.interval(start, now) for s in streams]
+        reporter.emit('interval', {'streams': entries, 'sum': summed(entries, start, now)})
+        start = now
+
+    stop.set()
+    for t in threads:
+        t.join()
+    duration = time.time() - t0
+    ends = []
+    for s in streams:
+        seconds = max(duration - s.offset, 0)
+        rtts = s.rtts or [0]
+        ends.append({'sender': {'socket': s.id, 'start': s.offset, 'end': duration, 'seconds': seconds,
+                                'bytes': s.bytes, 'bits_per_second': s.bytes * 8 / seconds if seconds > 0 else 0,
+                                'retransmits': s.last['total_retrans'], 'max_snd_cwnd': s.max_cwnd,
+                                'max_rtt': max(rtts), 'min_rtt': min(rtts), 'mean_rtt': sum(rtts) // len(rtts),
+                                'sender': True}})
+        s.close()
+    sum_sent = {'start': 0, 'end': duration, 'seconds': duration, 'bytes': sum(s.bytes for s in streams),
+                'bits_per_second': sum(s.bytes for s in streams) * 8 / duration,
+                'retransmits': sum(s.last['total_retrans'] for s in streams), 'sender': True}
+    errors = [s.error for s in streams if s.error]
+    reporter.emit('end', {'streams': ends, 'sum_sent': sum_sent, 'sender_tcp_congestion': ','.join(algos)})
+    if errors:
+        reporter.emit('error', '; '.join(errors))
+        return 1
+    return 0
+
+
+def run_server(args):
+    """Accept any number of streams and discard what they send"""
+    listener = socket.create_server((args.bind or '', args.port), backlog=128)
+    if args.daemon:
+        daemonize()  # after bind, so a port conflict is still reported to the caller
+    listener.setblocking(False)
+    sel = selectors.DefaultSelector()
+    sel.register(listener, selectors.EVENT_READ)
+    buf = memoryview(bytearray(RECV_SIZE))
+    while True:
+        for key, _ in sel.select():
+            sock = key.fileobj
+            if sock is listener:
+                try:
+                    conn, _ = listener.accept()
+                except BlockingIOError:
+                    continue
+                conn.setblocking(False)
+                sel.register(conn, selectors.EVENT_READ)
+                continue
+            try:
+                n = sock.recv_into(buf)
+            except BlockingIOError:
+                continue
+            except OSError:
+                n = 0
+            if not n:
+                sel.unregister(sock)
+                sock.close()
+
+
+def daemonize():
+    if os.fork():
+        os._exit(0)
+    os.setsid()
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Multi-stream TCP traffic generator with iperf3-compatible JSON output')
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument('-s', '--server', action='store_true', help='Run as a sink')
+    mode.add_argument('-c', '--client', help='Server address to send to')
+    parser.add_argument('-p', '--port', type=int, default=5201, help='Server port')
+    parser.add_argument('-B', '--bind', help='Local address to listen on (server) or send from (client)')
+    parser.add_argument('-D', '--daemon', action='store_true', help='Run the server in the background')
+    parser.add_argument('-b', '--bitrate', default='0', help='Target rate per stream, e.g. 10M (0: unlimited)')
+    parser.add_argument('-P', '--parallel', type=int, default=1, help='Number of parallel streams')
+    parser.add_argument('-t', '--time', type=float, default=10, help='Test duration in seconds')
+    parser.add_argument('-i', '--interval', type=float, default=1, help='Seconds between interval reports')
+    parser.add_argument('-l', '--length', type=int, default=BLOCK_SIZE, help='Bytes per send')
+    parser.add_argument('-C', '--congestion', help='Congestion control, or a comma list cycled over the streams')
+    parser.add_argument('--stream-offsets', help='Start offsets in seconds, a comma list cycled over the streams')
+    parser.add_argument('-Z', '--zerocopy', action='store_true', help='Send with sendfile() instead of a user buffer')
+    parser.add_argument('--notsent-lowat', type=int, default=0,
+                      help='Cap on unsent bytes queued per socket (TCP_NOTSENT_LOWAT; 0: kernel default)')
+    parser.add_argument('-J', '--json', action='store_true', help='Write one iperf3-style JSON document at exit')
+    parser.add_argument('--json-stream', action='store_true', help='Write one JSON event per line as the test runs')
+    parser.add_argument('--forceflush', action='store_true', help='Accepted for iperf3 compatibility (always flushed)')
+
+    args = parser.parse_args()
+    if args.server:
+        run_server(args)
+        return
+    reporter = Reporter(args.json, args.json_stream)
+    code = run_client(args, reporter)
+    reporter.close()
+    sys.exit(code)
+
+
+if __name__ == '__main__':
+    main()
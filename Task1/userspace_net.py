@@ -0,0 +1,351 @@
+#!/usr/bin/env python
+
+import math
+import shlex
+import socket
+import random
+import asyncio
+import threading
+import subprocess
+from collections import deque
+from mn_log import info, warn
+from topology import HOSTS, LINKS, link_settings
+
+MSS = 1448
+# Bytes read from a socket per forwarding step: ~11 segments moved as one unit
+CHUNK_SIZE = 16 * 1024
+# Per-link FIFO bound, netem's default limit of 1000 packets
+QUEUE_PACKETS = 1000
+# Bytes a relayed connection may have inside the emulated path (its "window")
+FLIGHT_BYTES = 128 * 1024
+# Receive buffer of the relay's client-facing sockets: bounds what a sender can
+# hand over ahead of the emulated links, so its own byte counts stay close to them
+RELAY_RCVBUF = 64 * 1024
+# Shortest time a lost or tail-dropped segment takes to be resent
+MIN_RETRANSMIT = 0.005
+# Transmissions starting within this much of now are served in one batch
+BATCH_SLACK = 0.002
+
+# Server ports each host relays, matching the per-client ports of run_scenario
+DEFAULT_PORTS = range(5201, 5211)
+
+
+class LinkDirection:
+    """One direction of an emulated link: token-bucket rate, bounded FIFO, delay and loss.
+
+    Chunks are serialized back to back at the link rate (a token bucket with a
+    burst of one chunk), so concurrent connections share the capacity in FIFO
+    order. Loss is drawn per segment. A lost segment is sent again, so it costs
+    link time a second time. The chunk that holds it also arrives one
+    retransmission late, because the relay terminates TCP and cannot drop bytes.
+    """
+
+    def __init__(self, loop, name):
+        self.loop = loop
+        self.name = name
+        self.configure(None)
+        self.queue = deque()
+        self.queued = 0
+        self.limit = QUEUE_PACKETS * MSS
+        self.free_at = 0.0
+        self.serving = False
+        self.stats = {'bytes': 0, 'lost': 0, 'dropped': 0}
+
+    def configure(self, bw, loss=0, delay=None):
+        """bw in Mbit/s (None: unshaped), loss in percent, delay as a tc time string ('5ms')"""
+        self.rate = bw * 1e6 / 8 if bw else None
+        self.loss = loss / 100
+        self.delay = _seconds(delay)
+
+    @property
+    def retransmit_delay(self):
+        return max(2 * self.delay, MIN_RETRANSMIT)
+
+    def offer(self, pipe, hop, chunk):
+        """Queue a chunk for transmission; False when the FIFO is full (tail drop)"""
+        if self.rate is None:
+            pipe.schedule(hop + 1, chunk, self.loop.time() + self.delay)
+            return True
+        if self.queued + len(chunk) > self.limit:
+            self.stats['dropped'] += math.ceil(len(chunk) / MSS)
+            return False
+        self.queue.append((pipe, hop, chunk))
+        self.queued += len(chunk)
+        if not self.serving:
+            self.serving = True
+            self.free_at = max(self.free_at, self.loop.time())  # idle until now
+            self.loop.call_soon(self._serve)
+        return True
+
+    def _serve(self):
+        # free_at is a virtual clock: a timer that fires late (epoll has 1 ms resolution)
+        # is caught up by serving more chunks, not lost as idle link time
+        now = self.loop.time()
+        while self.queue and self.free_at <= now + BATCH_SLACK:
+            pipe, hop, chunk = self.queue.popleft()
+            self.queued -= len(chunk)
+            segments = math.ceil(len(chunk) / MSS)
+            lost = sum(random.random() < self.loss for _ in range(segments)) if self.loss else 0
+            self.free_at += len(chunk) * (segments + lost) / segments / self.rate
+            arrival = self.free_at + self.delay + (self.retransmit_delay if lost else 0)
+            pipe.schedule(hop + 1, chunk, arrival)
+            self.stats['bytes'] += len(chunk)
+            self.stats['lost'] += lost
+        if self.queue:
+            self.loop.call_at(self.free_at, self._serve)
+        else:
+            self.serving = False
+
+
+class Pipe:
+    """One direction of a relayed connection, moved chunk by chunk along a path of links"""
+
+    def __init__(self, loop, path, writer):
+        self.loop = loop
+        self.path = path
+        self.writer = writer
+        self.waiting = [deque() for _ in path]
+        self.retrying = [False] * len(path)
+        self.last_arrival = [0.0] * (len(path) + 1)
+        self.in_flight = 0
+        self.space = asyncio.Event()
+        self.space.set()
+        self.done = asyncio.Event()
+        self.eof = False
+
+    def send(self, chunk):
+        self.in_flight += len(chunk)
+        if self.in_flight >= FLIGHT_BYTES:
+            self.space.clear()
+        self.enter(0, chunk)
+
+    def schedule(self, hop, chunk, arrival):
+        """Deliver `chunk` to `hop` at `arrival`, never before an earlier chunk of this pipe"""
+        arrival = max(arrival, self.last_arrival[hop])
+        self.last_arrival[hop] = arrival
+        self.loop.call_at(arrival, self.enter, hop, chunk)
+
+    def enter(self, hop, chunk):
+        if hop == len(self.path):
+            self._deliver(chunk)
+            return
+        self.waiting[hop].append(chunk)
+        if not self.retrying[hop]:
+            self._admit(hop)
+
+    def _admit(self, hop):
+        self.retrying[hop] = False
+        link, waiting = self.path[hop], self.waiting[hop]
+        while waiting:
+            if not link.offer(self, hop, waiting[0]):
+                # Tail-dropped: the head of this pipe is resent later, keeping byte order
+                self.retrying[hop] = True
+                self.loop.call_later(link.retransmit_delay, self._admit, hop)
+                return
+            waiting.popleft()
+
+    def _deliver(self, chunk):
+        if not self.writer.is_closing():
+            self.writer.write(chunk)
+        self.in_flight -= len(chunk)
+        if self.in_flight < FLIGHT_BYTES:
+            self.space.set()
+        if self.eof and not self.in_flight:
+            self._finish()
+
+    def _finish(self):
+        if not self.writer.is_closing() and self.writer.can_write_eof():
+            self.writer.write_eof()
+        self.done.set()
+
+    async def pump(self, reader):
+        """Read from the source socket while the path has room; return once everything is delivered"""
+        try:
+            while True:
+                await self.space.wait()
+                await self.writer.drain()  # the destination's own backpressure
+                chunk = await reader.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                self.send(chunk)
+        except ConnectionError:
+            pass
+        self.eof = True
+        if not self.in_flight:
+            self._finish()
+        await self.done.wait()
+
+
+class EmuInterface:
+    """Stand-in for a host interface; every emulated host shares the loopback device"""
+
+    def __init__(self, name):
+        self.name = name
+
+
+class EmuHost:
+    """A CustomTopo host as a loopback address pair, with the Mininet host calls the experiments use.
+
+    Clients bind to `bind_address` (the address shown as the host's IP), which
+    tells the relay where a connection comes from. Servers listen on the private
+    `listen_address`, while the relay accepts connections for them on
+    `bind_address`. Commands run directly on this machine.
+    """
+
+    def __init__(self, name, ip, listen_address):
+        self.name = name
+        self.bind_address = ip
+        self.listen_address = listen_address
+        self.intf = EmuInterface('lo')
+
+    def IP(self):
+        return self.bind_address
+
+    def defaultIntf(self):
+        return self.intf
+
+    def cmd(self, command):
+        return subprocess.run(command, shell=True, capture_output=True, text=True).stdout
+
+    def popen(self, cmd, **kwargs):
+        return subprocess.Popen(shlex.split(cmd) if isinstance(cmd, str) else cmd, **kwargs)
+
+
+class EmuNet:
+    """Userspace emulation of the CustomTopo chain: no root, Open vSwitch or namespaces.
+
+    Every link is emulated in each direction by a LinkDirection running on one
+    asyncio loop in a background thread. For every host and relayed port, a
+    listener on the host's address forwards each connection hop by hop along
+    the topology path to the destination's server. Only the switch links are
+    shaped, as in setup_network. The relay terminates TCP, so link loss slows
+    delivery but is never seen by the sender's congestion control.
+    """
+
+    def __init__(self, bandwidth_s1_s2=10, bandwidth_s2_s3=10, bandwidth_s3_s4=10, loss_s2_s3=0, delay=None,
+                 ports=DEFAULT_PORTS):
+        self.hosts = {name: EmuHost(name, f'127.10.0.{i}', f'127.20.0.{i}')
+                      for i, name in enumerate(HOSTS, 1)}
+        self.by_address = {host.bind_address: host for host in self.hosts.values()}
+        self.ports = list(ports)
+        self.settings = link_settings(bandwidth_s1_s2, bandwidth_s2_s3, bandwidth_s3_s4, loss_s2_s3, delay)
+        self.loop = asyncio.new_event_loop()
+        self.thread = None
+        self.servers = []
+        self.links = {}
+        self.neighbors = {}
+        for a, b in LINKS:
+            self.links[a, b] = LinkDirection(self.loop, f'{a}->{b}')
+            self.links[b, a] = LinkDirection(self.loop, f'{b}->{a}')
+            self.neighbors.setdefault(a, []).append(b)
+            self.neighbors.setdefault(b, []).append(a)
+        self._apply(self.settings)
+
+    def get(self, *names):
+        hosts = [self.hosts[name] for name in names]
+        return hosts[0] if len(hosts) == 1 else hosts
+
+    def path(self, src, dst):
+        """Directed links from node `src` to node `dst` (breadth-first over the topology)"""
+        previous = {src: None}
+        frontier = deque([src])
+        while frontier:
+            node = frontier.popleft()
+            for neighbor in self.neighbors[node]:
+                if neighbor not in previous:
+                    previous[neighbor] = node
+                    frontier.append(neighbor)
+        nodes = [dst]
+        while previous[nodes[-1]] is not None:
+            nodes.append(previous[nodes[-1]])
+        nodes.reverse()
+        return [self.links[a, b] for a, b in zip(nodes, nodes[1:])]
+
+    def _apply(self, settings):
+        for name, params in settings.items():
+            a, b = name.split('-')
+            self.links[a, b].configure(**params)
+            self.links[b, a].configure(**params)
+
+    def reconfigure(self, **settings):
+        """Re-shape the switch links in place; same arguments as mn_topology.reconfigure_network"""
+        self.settings = link_settings(**settings)
+        self._call(self._apply, self.settings)
+        info(f'*** Reconfigured emulated links: {settings}\n')
+
+    def start(self):
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self._listen(), self.loop).result()
+        info(f'*** Userspace network: {len(self.hosts)} hosts, relaying ports '
+             f'{self.ports[0]}-{self.ports[-1]}\n')
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        for (a, b), link in sorted(self.links.items()):
+            if link.stats['lost'] or link.stats['dropped']:
+                info(f"*** {link.name}: {link.stats['bytes']} bytes, {link.stats['lost']} lost, "
+                     f"{link.stats['dropped']} tail-dropped segments\n")
+
+    def _call(self, func, *args):
+        if self.thread is None:
+            func(*args)
+        else:
+            self.loop.call_soon_threadsafe(func, *args)
+
+    async def _listen(self):
+        for host in self.hosts.values():
+            for port in self.ports:
+                sock = socket.socket()
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RELAY_RCVBUF)  # before listen: sets the window scale
+                sock.bind((host.bind_address, port))
+                server = await asyncio.start_server(
+                    lambda r, w, host=host, port=port: self._relay(r, w, host, port), sock=sock)
+                self.servers.append(server)
+
+    async def _shutdown(self):
+        for server in self.servers:
+            server.close()
+        relays = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in relays:
+            task.cancel()
+        await asyncio.gather(*relays, return_exceptions=True)
+
+    async def _relay(self, client_reader, client_writer, dst, port):
+        peer = client_writer.get_extra_info('peername')[0]
+        src = self.by_address.get(peer)
+        if src is None:
+            warn(f'*** Userspace network: connection from {peer}, which is not a host address '
+                 f'(clients must bind with -B)\n')
+            client_writer.close()
+            return
+        try:
+            server_reader, server_writer = await asyncio.open_connection(dst.listen_address, port)
+        except OSError:
+            client_writer.close()  # nothing listening: the client sees the connection fail
+            return
+        for writer in (client_writer, server_writer):
+            writer.transport.set_write_buffer_limits(high=CHUNK_SIZE * 4)
+        forward = Pipe(self.loop, self.path(src.name, dst.name), server_writer)
+        reverse = Pipe(self.loop, self.path(dst.name, src.name), client_writer)
+        try:
+            await asyncio.gather(forward.pump(client_reader), reverse.pump(server_reader))
+        except asyncio.CancelledError:
+            pass  # network stopped with the connection still open
+        finally:
+            for writer in (client_writer, server_writer):
+                writer.close()
+
+
+def _seconds(delay):
+    """tc time string ('5ms', '100us', '1s') in seconds; None or '' is no delay"""
+    if not delay:
+        return 0.0
+    for unit, scale in (('us', 1e-6), ('ms', 1e-3), ('s', 1.0)):
+        if delay.endswith(unit):
+            return float(delay[:-len(unit)]) * scale
+    return float(delay) * 1e-6  # tc's default unit is microseconds
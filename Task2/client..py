@@ -2,11 +2,35 @@ import socket
 import time
 import random
 import string
+import argparse
+import base64
+import asyncio
+from framing import FrameDecoder, frame_buffers, encode_frame
+from server import raise_file_limit
+from latency import LatencyHistogram
+from common import ringlog
+
+# Replaced by a RingLog when run as a script
+log = ringlog.NullLog()
+
+CONNECT_TIMEOUT = 10
+
+class BenchResult:
+    def __init__(self):
+        self.connect = LatencyHistogram()
+        self.response = LatencyHistogram()
+        self.connected = 0
+        self.failed = 0
+        self.dropped = 0  # connections the server closed before the end of the run
+        self.messages = 0
+        self.last_connect = 0  # perf_counter_ns when the last connection was established
 
 class StealthClient:
-    def __init__(self, host='172.23.198.251', port=8080):
+    def __init__(self, host='172.23.198.251', port=8080, framed=False, pipeline=1):
         self.host = host
         self.port = port
+        self.framed = framed      # length-prefixed base64 messages, for a server run with --framed
+        self.pipeline = pipeline  # framed mode: messages sent back to back before reading the acks
 
     def generate_random_message(self, length=32):
         return ''.join(random.choices(string.ascii_letters + string.digits, k=length))
@@ -16,23 +40,144 @@ class StealthClient:
         client.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
         try:
             client.connect((self.host, self.port))
+            if self.framed:
+                self.send_framed(client)
             while True:
                 message = self.generate_random_message()
                 client.sendall(message.encode())
-                print(f"Sent message: {message}")
+                log.info('sent', f"Sent message: {message}")
                 
                 try:
                     response = client.recv(1024).decode()
-                    print(f"Received from server: {response}")
+                    log.info('received', f"Received from server: {response}")
                 except socket.timeout:
-                    print("No response received")
+                    log.warning('no_response', "No response received")
                 
                 time.sleep(random.uniform(0.5, 3))  # Randomized delay
         except Exception as e:
-            print(f"Connection error: {e}")
+            log.error('connection_error', f"Connection error: {e}")
         finally:
             client.close()
 
+    def send_framed(self, client):
+        """Send `pipeline` framed messages in one sendmsg, then collect their acks"""
+        decoder = FrameDecoder()
+        while True:
+            messages = [self.generate_random_message() for _ in range(self.pipeline)]
+            client.sendmsg(frame_buffers([base64.b64encode(m.encode()) for m in messages]))
+            log.info('sent', f"Sent {len(messages)} messages: {' '.join(messages)}")
+
+            acks = []
+            while len(acks) < len(messages):
+                with decoder.writable() as view:
+                    n = client.recv_into(view)
+                if not n:
+                    raise ConnectionError("server closed the connection")
+                decoder.commit(n)
+                acks.extend(base64.b64decode(frame).decode(errors='ignore') for frame in decoder.frames())
+            for ack in acks:
+                log.info('received', f"Received from server: {ack}")
+
+            time.sleep(random.uniform(0.5, 3))  # Randomized delay
+
+    async def bench_connection(self, result, deadline, size, depth):
+        """One benchmark connection: send batches of `depth` messages until `deadline`, timing every ack"""
+        start = time.perf_counter_ns()
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), CONNECT_TIMEOUT)
+        except (OSError, asyncio.TimeoutError) as e:
+            result.failed += 1
+            log.warning('connect_failed', f"Connect failed: {e}")
+            return
+        result.last_connect = time.perf_counter_ns()
+        result.connect.record((result.last_connect - start) // 1000)
+        result.connected += 1
+        message = base64.b64encode(self.generate_random_message(size).encode())
+        if self.framed:
+            batch = encode_frame(message) * depth
+            decoder = FrameDecoder()
+        else:
+            batch = message  # unframed acks cannot be told apart, so no pipelining
+            depth = 1
+            ack_size = len(base64.b64encode(b'Ack: ' + base64.b64decode(message)))
+        try:
+            while time.perf_counter_ns() < deadline:
+                sent = time.perf_counter_ns()
+                writer.write(batch)
+                if self.framed:
+                    acks = 0
+                    while acks < depth:
+                        data = await reader.read(65536)
+                        if not data:
+                            raise ConnectionError("server closed the connection")
+                        decoder.feed(data)
+                        now = time.perf_counter_ns()
+                        for _ in decoder.frames():
+                            result.response.record((now - sent) // 1000)
+                            acks += 1
+                else:
+                    await reader.readexactly(ack_size)
+                    result.response.record((time.perf_counter_ns() - sent) // 1000)
+                result.messages += depth
+        except (OSError, asyncio.IncompleteReadError) as e:
+            result.dropped += 1
+            log.warning('connection_error', f"Connection error: {e}")
+        finally:
+            writer.close()
+
+    async def run_benchmark(self, connections, rate, duration, size, depth):
+        result = BenchResult()
+        start = time.perf_counter_ns()
+        deadline = start + int(duration * 1e9)
+        tasks = []
+        for i in range(connections):
+            if rate:
+                # Open at a fixed rate regardless of how long earlier connects take
+                delay = start + i * 1e9 / rate - time.perf_counter_ns()
+                if delay > 0:
+                    await asyncio.sleep(delay / 1e9)
+            if time.perf_counter_ns() >= deadline:
+                break
+            tasks.append(asyncio.create_task(self.bench_connection(result, deadline, size, depth)))
+        await asyncio.gather(*tasks)
+        return result, start
+
+    def benchmark(self, connections=1000, rate=0, duration=10, size=32, depth=1):
+        """Load the server with `connections` concurrent asyncio clients and print latency percentiles"""
+        raise_file_limit()
+        result, start = asyncio.run(self.run_benchmark(connections, rate, duration, size, depth))
+        elapsed = (time.perf_counter_ns() - start) / 1e9
+        opening = max(result.last_connect - start, 1) / 1e9
+        print(f"Benchmark against {self.host}:{self.port} ({'framed' if self.framed else 'unframed'}, "
+              f"{size}-byte messages, depth {depth if self.framed else 1}), {elapsed:.1f}s")
+        print(f"Connections: {result.connected} opened in {opening:.2f}s ({result.connected / opening:.0f}/s), "
+              f"{result.failed} failed, {result.dropped} dropped by the server")
+        print(f"Connect latency: {result.connect.summary()}")
+        print(f"Messages: {result.messages} ({result.messages / elapsed:.0f}/s)")
+        print(f"Response latency: {result.response.summary()}")
+        return result
+
 if __name__ == "__main__":
-    client = StealthClient()
-    client.send_traffic()
+    parser = argparse.ArgumentParser(description='Task2 traffic client')
+    parser.add_argument('--host', default='172.23.198.251', help='Server address')
+    parser.add_argument('--port', type=int, default=8080, help='Server port')
+    parser.add_argument('--framed', action='store_true', help='Use the length-prefixed protocol (server --framed)')
+    parser.add_argument('--pipeline', type=int, default=1, help='Framed messages sent per batch before reading acks')
+    parser.add_argument('--bench', action='store_true',
+                        help='Benchmark mode: many concurrent asyncio clients, then latency percentiles')
+    parser.add_argument('--connections', type=int, default=1000, help='Benchmark: connections to open')
+    parser.add_argument('--rate', type=float, default=0, help='Benchmark: connections opened per second (0: all at once)')
+    parser.add_argument('--duration', type=float, default=10, help='Benchmark: seconds to run')
+    parser.add_argument('--size', type=int, default=32, help='Benchmark: message length before base64')
+    ringlog.add_arguments(parser)
+    args = parser.parse_args()
+
+    log = ringlog.RingLog(**ringlog.options(args))
+    try:
+        client = StealthClient(args.host, args.port, args.framed, args.pipeline)
+        if args.bench:
+            client.benchmark(args.connections, args.rate, args.duration, args.size, args.pipeline)
+        else:
+            client.send_traffic()
+    finally:
+        log.close()
@@ -0,0 +1,68 @@
+import struct
+
+# Framed mode: every message is a 4-byte big-endian length followed by that many payload bytes
+HEADER = struct.Struct('!I')
+MAX_FRAME = 1 << 20  # larger lengths mean the peer is not speaking the framed protocol
+INITIAL_BUFFER = 64 * 1024
+
+class FrameError(ValueError):
+    pass
+
+def encode_frame(payload):
+    return HEADER.pack(len(payload)) + payload
+
+def frame_buffers(payloads):
+    """Header/payload buffers for sendmsg or writelines, without copying the payloads"""
+    buffers = []
+    for payload in payloads:
+        buffers.append(HEADER.pack(len(payload)))
+        buffers.append(payload)
+    return buffers
+
+class FrameDecoder:
+    """Incremental decoder for length-prefixed frames.
+
+    Reads go straight into one reusable buffer: recv_into the view from
+    writable() (released before the next call), then commit(). frames() yields
+    every complete frame and keeps a trailing partial one for the next read, so
+    frames split across reads or coalesced into one read come out the same.
+    """
+
+    def __init__(self, size=INITIAL_BUFFER):
+        self.buffer = bytearray(size)
+        self.start = 0  # first unconsumed byte
+        self.end = 0    # end of received data
+
+    def writable(self, want=4096):
+        """View of free space at the end of the buffer, at least `want` bytes"""
+        if self.start == self.end:
+            self.start = self.end = 0
+        if len(self.buffer) - self.end < want:
+            # Move the partial frame to the front before growing
+            pending = self.end - self.start
+            self.buffer[:pending] = self.buffer[self.start:self.end]
+            self.start, self.end = 0, pending
+            if len(self.buffer) - self.end < want:
+                self.buffer.extend(bytes(max(want, len(self.buffer))))
+        return memoryview(self.buffer)[self.end:]
+
+    def commit(self, n):
+        self.end += n
+
+    def feed(self, data):
+        with self.writable(len(data)) as view:
+            view[:len(data)] = data
+        self.commit(len(data))
+
+    def frames(self):
+        """Yield the payload of every complete frame received so far"""
+        buffer, size = self.buffer, HEADER.size
+        while self.end - self.start >= size:
+            (length,) = HEADER.unpack_from(buffer, self.start)
+            if length > MAX_FRAME:
+                raise FrameError(f'frame of {length} bytes exceeds {MAX_FRAME}')
+            if self.end - self.start - size < length:
+                return
+            body = self.start + size
+            self.start = body + length
+            yield buffer[body:self.start]  # one copy, as a bytearray
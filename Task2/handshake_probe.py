@@ -0,0 +1,126 @@
+import os
+import sys
+import csv
+import time
+import shlex
+import socket
+import argparse
+import threading
+import subprocess
+import kernel_profiles
+from latency import LatencyHistogram
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# Long enough to see SYN retransmissions (1s, 3s, 7s, ...) as latency rather than failures
+PROBE_TIMEOUT = 15
+PERCENTILES = (50, 99, 99.9)
+
+def probe(host, port, results):
+    """Time one connect() of a well-behaved client; None if it failed"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.settimeout(PROBE_TIMEOUT)
+    start = time.perf_counter()
+    try:
+        sock.connect((host, port))
+        results.append(time.perf_counter() - start)
+    except OSError:
+        results.append(None)
+    finally:
+        sock.close()
+
+def wait_listening(host, port, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+def run_case(args, profile, backlog):
+    """One profile/backlog combination: server under load plus timed probe connects"""
+    saved = kernel_profiles.apply_profile(profile)
+    server = load = None
+    # Everything after apply_profile runs under the finally, so the sysctls are
+    # restored and the children stopped even when verifying or spawning fails
+    try:
+        mismatches = kernel_profiles.verify_profile(profile)
+        server = subprocess.Popen([sys.executable, os.path.join(HERE, 'server.py'), '--host', args.host,
+                                   '--port', str(args.port), '--backlog', str(backlog), '--kernel-profile', 'none',
+                                   '--log-level', 'error', *shlex.split(args.server_args)],
+                                  stdout=subprocess.DEVNULL)
+        if not wait_listening(args.host, args.port):
+            raise RuntimeError(f"server did not start on {args.host}:{args.port}")
+        before = kernel_profiles.read_netstat()
+        load = subprocess.Popen([sys.executable, os.path.join(HERE, 'client..py'), '--bench', '--host', args.host,
+                                 '--port', str(args.port), '--connections', str(args.load_connections),
+                                 '--rate', str(args.load_rate), '--duration', str(args.duration),
+                                 '--log-level', 'error'],
+                                stdout=subprocess.PIPE, text=True)
+        results, probes = [], []
+        start = time.time()
+        for i in range(int(args.duration * args.probe_rate)):
+            delay = start + i / args.probe_rate - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            thread = threading.Thread(target=probe, args=(args.host, args.port, results), daemon=True)
+            thread.start()
+            probes.append(thread)
+        for thread in probes:
+            thread.join()
+        load_report = load.communicate()[0]
+        after = kernel_profiles.read_netstat()
+    finally:
+        for proc in (load, server):
+            if proc is not None and proc.poll() is None:
+                proc.terminate()
+                proc.wait()
+        kernel_profiles.restore(saved)
+
+    # Same histogram as client..py --bench, so the two report comparable percentiles
+    latencies = LatencyHistogram()
+    for r in results:
+        if r is not None:
+            latencies.record(r * 1000000)
+    row = {'profile': profile, 'backlog': backlog, 'applied': not mismatches,
+           'probes': len(results), 'failed': len(results) - latencies.count}
+    for q in PERCENTILES:
+        row[f'connect_p{q:g}_ms'] = latencies.percentile(q) / 1000 if latencies.count else None
+    row['connect_max_ms'] = latencies.max / 1000 if latencies.count else None
+    row.update({name: after[name] - before[name] for name in kernel_profiles.NETSTAT_COUNTERS})
+    return row, load_report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Measure connect() latency of normal clients while server.py is '
+                                                 'loaded, for each sysctl profile and listen() backlog')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--profiles', nargs='+', choices=sorted(kernel_profiles.PROFILES),
+                        default=['small', 'assignment', 'large'])
+    parser.add_argument('--backlogs', nargs='+', type=int, default=[128, 4096], help='listen() backlogs to try')
+    parser.add_argument('--load-connections', type=int, default=5000, help='Benchmark clients loading the server')
+    parser.add_argument('--load-rate', type=float, default=0, help='Their open rate per second (0: all at once)')
+    parser.add_argument('--probe-rate', type=float, default=20, help='Probe connects per second')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds per combination')
+    parser.add_argument('--server-args', default='', help='Extra server.py arguments, e.g. "--workers 4"')
+    parser.add_argument('--output', default='handshake_results.csv')
+    args = parser.parse_args()
+
+    rows = []
+    for profile in args.profiles:
+        for backlog in args.backlogs:
+            print(f"Profile {profile}, backlog {backlog}")
+            row, load_report = run_case(args, profile, backlog)
+            print(load_report.rstrip())
+            print(f"Probe connects: {row['probes'] - row['failed']}/{row['probes']} ok, " +
+                  ', '.join(f"p{q:g} {row[f'connect_p{q:g}_ms'] or 0:.2f} ms" for q in PERCENTILES) +
+                  f", ListenOverflows {row['ListenOverflows']}, ListenDrops {row['ListenDrops']}"
+                  + ('' if row['applied'] else ' (profile NOT fully applied)') + '\n')
+            rows.append(row)
+
+    with open(args.output, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"Results written to {args.output}")
@@ -0,0 +1,128 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+# Named sets of SYN/accept-queue sysctls. The listen() backlog a server gets is
+# min(its listen() argument, net.core.somaxconn); half-open connections are
+# bounded by tcp_max_syn_backlog unless SYN cookies take over.
+PROFILES = {
+    # What set_kernel_parameters used to apply
+    'assignment': {'net.ipv4.tcp_max_syn_backlog': 2048, 'net.ipv4.tcp_syncookies': 1,
+                   'net.ipv4.tcp_synack_retries': 2},
+    'small': {'net.core.somaxconn': 128, 'net.ipv4.tcp_max_syn_backlog': 128,
+              'net.ipv4.tcp_syncookies': 1, 'net.ipv4.tcp_synack_retries': 5},
+    'small-nocookies': {'net.core.somaxconn': 128, 'net.ipv4.tcp_max_syn_backlog': 128,
+                        'net.ipv4.tcp_syncookies': 0, 'net.ipv4.tcp_synack_retries': 5},
+    'large': {'net.core.somaxconn': 65535, 'net.ipv4.tcp_max_syn_backlog': 65535,
+              'net.ipv4.tcp_syncookies': 1, 'net.ipv4.tcp_synack_retries': 2},
+    'large-nocookies': {'net.core.somaxconn': 65535, 'net.ipv4.tcp_max_syn_backlog': 65535,
+                        'net.ipv4.tcp_syncookies': 0, 'net.ipv4.tcp_synack_retries': 2},
+}
+
+# TcpExt counters of SYNs and handshakes the kernel gave up on
+NETSTAT_COUNTERS = ('ListenOverflows', 'ListenDrops', 'SyncookiesSent', 'SyncookiesRecv', 'SyncookiesFailed',
+                    'TCPReqQFullDrop', 'TCPReqQFullDoCookies')
+
+def sysctl_path(name):
+    return os.path.join('/proc/sys', *name.split('.'))
+
+def read_sysctl(name):
+    with open(sysctl_path(name)) as f:
+        return int(f.read().split()[0])
+
+def write_sysctl(name, value):
+    """Set one sysctl directly when we may, through non-interactive sudo otherwise; raises OSError on failure"""
+    try:
+        with open(sysctl_path(name), 'w') as f:
+            f.write(f'{value}\n')
+        return
+    except PermissionError:
+        if os.geteuid() == 0:
+            raise
+    result = subprocess.run(['sudo', '-n', 'sysctl', '-w', f'{name}={value}'],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        raise PermissionError(result.stderr.strip() or f'sudo sysctl exited with {result.returncode}')
+
+def apply_profile(name):
+    """Apply a profile and return the previous values of what was changed (for restore)"""
+    saved = {}
+    for key, value in PROFILES[name].items():
+        try:
+            previous = read_sysctl(key)
+            if previous != value:
+                write_sysctl(key, value)
+                saved[key] = previous
+        except OSError as e:
+            print(f"Cannot set {key}={value}: {e}", file=sys.stderr)
+    for key, (wanted, actual) in verify_profile(name).items():
+        print(f"Profile {name}: {key} is {actual}, not {wanted}", file=sys.stderr)
+    return saved
+
+def verify_profile(name):
+    """{sysctl: (wanted, actual)} for every setting of the profile that is not in effect"""
+    mismatches = {}
+    for key, value in PROFILES[name].items():
+        try:
+            actual = read_sysctl(key)
+        except OSError:
+            actual = None
+        if actual != value:
+            mismatches[key] = (value, actual)
+    return mismatches
+
+def restore(saved):
+    for key, value in saved.items():
+        try:
+            write_sysctl(key, value)
+        except OSError as e:
+            print(f"Cannot restore {key}={value}: {e}", file=sys.stderr)
+
+def read_netstat(path='/proc/net/netstat'):
+    """TcpExt counters from /proc/net/netstat (name/value line pairs)"""
+    with open(path) as f:
+        lines = f.read().splitlines()
+    counters = {}
+    for header, values in zip(lines[::2], lines[1::2]):
+        if header.startswith('TcpExt:'):
+            counters.update(zip(header.split()[1:], map(int, values.split()[1:])))
+    return {name: counters.get(name, 0) for name in NETSTAT_COUNTERS}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Apply, verify and restore named SYN-backlog sysctl profiles')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('list', help='Show the profiles and the current values')
+    apply_parser = sub.add_parser('apply', help='Apply a profile, saving the old values')
+    apply_parser.add_argument('profile', choices=sorted(PROFILES))
+    apply_parser.add_argument('--save', default='sysctl_saved.json', help='Where to keep the old values')
+    verify_parser = sub.add_parser('verify', help='Exit non-zero unless the profile is in effect')
+    verify_parser.add_argument('profile', choices=sorted(PROFILES))
+    restore_parser = sub.add_parser('restore', help='Put back the values saved by apply')
+    restore_parser.add_argument('--save', default='sysctl_saved.json')
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        keys = sorted({key for profile in PROFILES.values() for key in profile})
+        for key in keys:
+            print(f"{key}: current {read_sysctl(key)}, " +
+                  ', '.join(f"{name} {profile[key]}" for name, profile in PROFILES.items() if key in profile))
+    elif args.command == 'apply':
+        saved = apply_profile(args.profile)
+        if os.path.exists(args.save):
+            # Keep the oldest values so apply twice then restore gets back to the start
+            with open(args.save) as f:
+                saved.update(json.load(f))
+        with open(args.save, 'w') as f:
+            json.dump(saved, f, indent=2)
+        sys.exit(1 if verify_profile(args.profile) else 0)
+    elif args.command == 'verify':
+        mismatches = verify_profile(args.profile)
+        for key, (wanted, actual) in mismatches.items():
+            print(f"{key} is {actual}, not {wanted}")
+        sys.exit(1 if mismatches else 0)
+    else:
+        with open(args.save) as f:
+            restore(json.load(f))
+        os.remove(args.save)
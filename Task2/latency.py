@@ -0,0 +1,49 @@
+import math
+
+# Latency histograms are log-linear like HdrHistogram: exact below 2**SUB_BITS microseconds, then
+# 2**(SUB_BITS - 1) buckets per power of two, i.e. within ~1.6% (two significant digits) of the value
+SUB_BITS = 7
+HALF = 1 << (SUB_BITS - 1)
+MAX_SHIFT = 40 - SUB_BITS  # values up to 2**40 us (~12 days)
+
+def percentile_bucket(counts, q):
+    """Index of the bucket holding the q-th percentile; None if there are no samples"""
+    # Nearest rank: the ceil(n*q/100)-th smallest sample, so p0 is the minimum and p100 the maximum
+    rank = max(math.ceil(sum(counts) * q / 100), 1)
+    seen = 0
+    for index, count in enumerate(counts):
+        seen += count
+        if seen >= rank:
+            return index
+    return None
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * ((MAX_SHIFT + 2) << (SUB_BITS - 1))
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value):
+        """Add one latency in microseconds"""
+        value = int(value)
+        shift = min(max(value.bit_length() - SUB_BITS, 0), MAX_SHIFT)
+        self.counts[(shift << (SUB_BITS - 1)) + min(value >> shift, 2 * HALF - 1)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, q):
+        """Lowest value of the bucket holding the q-th percentile; None if empty"""
+        index = percentile_bucket(self.counts, q)
+        if index is None or index < 2 * HALF:
+            return index
+        shift = (index >> (SUB_BITS - 1)) - 1
+        return (index - (shift << (SUB_BITS - 1))) << shift
+
+    def summary(self):
+        if not self.count:
+            return 'no samples'
+        return (f"p50 {self.percentile(50) / 1000:.3f} ms, p99 {self.percentile(99) / 1000:.3f} ms, "
+                f"p99.9 {self.percentile(99.9) / 1000:.3f} ms, max {self.max / 1000:.3f} ms, "
+                f"mean {self.total / self.count / 1000:.3f} ms")
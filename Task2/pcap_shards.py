@@ -0,0 +1,140 @@
+import os
+import mmap
+import struct
+import multiprocessing
+import numpy as np
+from common.pcap import (read_global_header, record_chunks, decode_tcp,
+                         GLOBAL_HEADER_LEN, RECORD_HEADER_LEN)
+
+TCP_SYN, TCP_FIN, TCP_RST, TCP_ACK = 0x02, 0x01, 0x04, 0x10
+
+MIN_SHARD = 16 << 20   # bytes; smaller captures are not worth a process pool
+RESYNC_CHAIN = 8       # consecutive plausible record headers that identify a record boundary
+RESYNC_WINDOW = 1 << 20
+MAX_CLOCK_SKEW = 30 * 86400  # seconds a record may be away from the first one
+
+# Per-shard output: only the SYN/FIN/RST segments that open or close connections
+EVENT_DTYPE = np.dtype([('a', 'u8'), ('b', 'u8'), ('time', 'f8'), ('syn', '?')])
+
+class PcapInfo:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            header = f.read(GLOBAL_HEADER_LEN)
+            self.size = f.seek(0, 2)
+            try:
+                self.endian, self.ts_div, self.snaplen, self.linktype = read_global_header(header)
+            except ValueError as e:
+                raise ValueError(f'{path}: {e}') from None
+            f.seek(GLOBAL_HEADER_LEN)
+            first = f.read(4)
+            self.first_sec = struct.unpack(self.endian + 'I', first)[0] if len(first) == 4 else 0
+        self.path = path
+
+def plausible(buf, pos, info, record):
+    """True if RESYNC_CHAIN record headers chained from `pos` all look valid (or run to EOF)"""
+    snaplen = info.snaplen or 262144
+    for _ in range(RESYNC_CHAIN):
+        if pos + RECORD_HEADER_LEN > len(buf):
+            return True  # end of file, possibly in a truncated last record
+        ts_sec, ts_frac, incl_len, orig_len = record.unpack_from(buf, pos)
+        if (ts_frac >= info.ts_div or incl_len > snaplen or incl_len > orig_len
+                or abs(ts_sec - info.first_sec) > MAX_CLOCK_SKEW):
+            return False
+        pos += RECORD_HEADER_LEN + incl_len
+    return True
+
+def record_boundary(buf, pos, info, record):
+    """First record header at or after byte `pos`, found by validating header chains"""
+    if pos <= GLOBAL_HEADER_LEN:
+        return GLOBAL_HEADER_LEN
+    for candidate in range(pos, min(pos + RESYNC_WINDOW, len(buf))):
+        if plausible(buf, candidate, info, record):
+            return candidate
+    return len(buf)
+
+def control_events(cols):
+    """The connection-opening SYNs and closing FIN/RSTs among decoded TCP columns, as EVENT_DTYPE"""
+    cols = cols[(cols['flags'] & (TCP_SYN | TCP_FIN | TCP_RST)) != 0]
+    flags = cols['flags']
+    src = (cols['src'].astype(np.uint64) << np.uint64(16)) | cols['sport']
+    dst = (cols['dst'].astype(np.uint64) << np.uint64(16)) | cols['dport']
+
+    # Key both directions of a connection the same way
+    events = np.empty(len(cols), EVENT_DTYPE)
+    events['a'] = np.minimum(src, dst)
+    events['b'] = np.maximum(src, dst)
+    events['time'] = cols['time']
+    # Only a bare SYN opens a connection; SYN-ACKs and the like are ignored
+    events['syn'] = (flags & (TCP_SYN | TCP_ACK)) == TCP_SYN
+    is_close = (flags & (TCP_FIN | TCP_RST)) != 0
+    return events[events['syn'] | is_close]
+
+def map_shard(args):
+    """Decode the records that start in [start, end) and return (events, packets, ignored)"""
+    info, start, end, max_size = args
+    with open(info.path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    data = None
+    try:
+        record = struct.Struct(info.endian + 'IIII')
+        start = record_boundary(mm, start, info, record)
+        end = record_boundary(mm, end, info, record) if end < len(mm) else len(mm)
+
+        data = np.frombuffer(mm, dtype=np.uint8)
+        parts, packets, ignored = [], 0, 0
+        for offsets in record_chunks(mm, info.endian, start, end):
+            # The SYN options (window scale) are not needed here, and a SYN flood has many SYNs
+            cols = decode_tcp(data, offsets, info.endian, info.ts_div, info.linktype, options=False)
+            packets += len(cols)
+            # Frames longer than max_size are counted as ignored, as plots.py always did
+            oversized = cols['wire_len'] > max_size
+            ignored += int(oversized.sum())
+            parts.append(control_events(cols[~oversized]))
+        events = np.concatenate(parts) if parts else np.empty(0, EVENT_DTYPE)
+        return events, packets, ignored
+    finally:
+        del data
+        mm.close()
+
+def reduce_events(events):
+    """Merge shard events into per-connection start and end times (end is NaN if never closed)"""
+    if not len(events):
+        return np.empty(0), np.empty(0)
+    # Dense connection ids from the 96-bit (a, b) keys
+    pairs = np.ascontiguousarray(np.stack((events['a'], events['b']), axis=1))
+    ids = np.unique(pairs.view(np.dtype((np.void, 16))).ravel(), return_inverse=True)[1].ravel()
+    # Shards come back in file order, but sort by time anyway: np.unique's return_index then picks the earliest
+    order = np.argsort(events['time'], kind='stable')
+    times, syn, ids = events['time'][order], events['syn'][order], ids[order]
+    if not syn.any():
+        return np.empty(0), np.empty(0)
+
+    conn_ids, first = np.unique(ids[syn], return_index=True)
+    start = times[syn][first]
+    lookup = np.full(ids.max() + 1, -1)
+    lookup[conn_ids] = np.arange(len(conn_ids))
+
+    # First FIN/RST, from either end, at or after the connection's first SYN
+    conn, close_times = lookup[ids[~syn]], times[~syn]
+    ok = (conn >= 0) & (close_times >= start[np.maximum(conn, 0)])
+    closed, first = np.unique(conn[ok], return_index=True)
+    end = np.full(len(start), np.nan)
+    end[closed] = close_times[ok][first]
+    return start, end
+
+def analyze(path, workers=None, max_size=1500):
+    """Map shards of the capture over a process pool and reduce them to connection arrays"""
+    info = PcapInfo(path)
+    workers = workers or os.cpu_count() or 1
+    shards = max(1, min(workers * 4, info.size // MIN_SHARD))
+    bounds = np.linspace(GLOBAL_HEADER_LEN, info.size, shards + 1).astype(np.int64)
+    tasks = [(info, int(bounds[i]), int(bounds[i + 1]), max_size) for i in range(shards)]
+    if shards == 1:
+        results = [map_shard(tasks[0])]
+    else:
+        with multiprocessing.Pool(min(workers, shards)) as pool:
+            results = pool.map(map_shard, tasks)
+    events = np.concatenate([r[0] for r in results])
+    start, end = reduce_events(events)
+    return {'start': start, 'end': end,
+            'packets': sum(r[1] for r in results), 'ignored': sum(r[2] for r in results)}
@@ -1,86 +1,70 @@
-import pyshark
-import matplotlib.pyplot as plt
+import argparse
 import datetime
+import time
 import numpy as np
-import multiprocessing
-import random
+import matplotlib.pyplot as plt
+from pcap_shards import analyze
 
 pcap_file = 'client_traffic.pcap'
 
-_conn_times, _conn_durations, _pkt_colors = {}, {}, {}
-_syn_packets, _closed_conns, _ignored_pkts = 0, 0, 0
-
-MAX_SIZE = 1500  
-
-def _parse_pkt(pkt):
-    global _ignored_pkts, _closed_conns
-    
-    try:
-        if 'TCP' not in pkt or not hasattr(pkt, 'length') or int(pkt.length) > MAX_SIZE:
-            _ignored_pkts += 1
-            return
-
-        src, dst = pkt.ip.src, pkt.ip.dst
-        src_p, dst_p = pkt.tcp.srcport, pkt.tcp.dstport
-        flags = int(pkt.tcp.flags, 16)
-        ts = float(pkt.sniff_timestamp)
-
-        conn_id = (src, src_p, dst, dst_p)
-
-        if flags & 0x02:
-            _conn_times[conn_id] = ts
-            _conn_durations[conn_id] = 100 + random.uniform(0, 2)  # Random noise
-            _pkt_colors[conn_id] = 'red'
-        
-        elif (flags & 0x11) or (flags & 0x04):  
-            if conn_id in _conn_times:
-                _conn_durations[conn_id] = ts - _conn_times[conn_id] + random.uniform(-1, 1)
-                _closed_conns += 1
-                _pkt_colors[conn_id] = 'blue'
-    
-    except Exception:
-        _ignored_pkts += 1
-
-def _process_file():
-    try:
-        _packets = pyshark.FileCapture(pcap_file, display_filter="tcp")
-        with multiprocessing.Pool(processes=4) as pool:
-            pool.map(_parse_pkt, _packets)
-    finally:
-        _packets.close()
-
-_process_file()
-
-_syn_packets = sum(1 for d in _conn_durations.values() if d >= 100)
-
-print(f"Total SYN: {len(_conn_times)}")
-print(f"Completed: {_closed_conns}")
-print(f"Incomplete: {_syn_packets}")
-print(f"Ignored: {_ignored_pkts}")
-
-start_ts = np.array([datetime.datetime.fromtimestamp(t) for t in _conn_times.values()])
-durations = np.array(list(_conn_durations.values()))
-colors = np.array([_pkt_colors[conn_id] for conn_id in _conn_times.keys()])
-
-idx_sorted = np.argsort(start_ts)
-start_ts, durations, colors = start_ts[idx_sorted], durations[idx_sorted], colors[idx_sorted]
-
-red_idx = np.where(colors == 'red')[0]
-
-if len(red_idx) > 0:
-    attack_start, attack_end = start_ts[red_idx[0]], start_ts[red_idx[-1]]
-else:
-    attack_start = start_ts[0] + datetime.timedelta(seconds=20)
-    attack_end = start_ts[0] + datetime.timedelta(seconds=100)
-
-plt.figure(figsize=(10, 6))
-plt.scatter(start_ts, durations, c=colors, alpha=0.7)
-plt.axvline(attack_start, color='r', linestyle='dashed', label="Attack Start")
-plt.axvline(attack_end, color='g', linestyle='dashed', label="Attack End")
-plt.xlabel("Start Time")
-plt.ylabel("Connection Duration (seconds)")
-plt.title("TCP Connection Duration vs. Start Time")
-plt.xticks(rotation=45)
-plt.legend(["TCP Connections", "Attack Start", "Attack End"])
-plt.grid(True)
-plt.show()
\ No newline at end of file
+MAX_SIZE = 1500
+INCOMPLETE_DURATION = 100  # plotted duration of connections that never closed
+
+def connection_points(result, rng):
+    """Start times, durations and colours for the scatter plot; incomplete connections are red"""
+    start, end = result['start'], result['end']
+    closed = ~np.isnan(end)
+    # Random noise keeps overlapping points visible
+    durations = np.where(closed, end - start + rng.uniform(-1, 1, len(start)),
+                         INCOMPLETE_DURATION + rng.uniform(0, 2, len(start)))
+    colors = np.where(closed, 'blue', 'red')
+    order = np.argsort(start)
+    # Local wall-clock times like datetime.fromtimestamp, without a Python object per connection
+    utc_offset = datetime.datetime.fromtimestamp(start[order[0]]).astimezone().utcoffset() if len(start) else None
+    offset_us = int(utc_offset.total_seconds() * 1e6) if utc_offset else 0
+    start_ts = (np.round(start[order] * 1e6).astype(np.int64) + offset_us).astype('datetime64[us]')
+    return start_ts, durations[order], colors[order]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Plot TCP connection duration against start time from a capture')
+    parser.add_argument('pcap', nargs='?', default=pcap_file, help='Capture file (classic pcap)')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: all CPUs)')
+    parser.add_argument('--output', default=None, help='Save the plot here instead of showing it')
+    args = parser.parse_args()
+
+    t0 = time.time()
+    result = analyze(args.pcap, args.workers, MAX_SIZE)
+    closed = int((~np.isnan(result['end'])).sum())
+
+    print(f"Total SYN: {len(result['start'])}")
+    print(f"Completed: {closed}")
+    print(f"Incomplete: {len(result['start']) - closed}")
+    print(f"Ignored: {result['ignored']}")
+    print(f"Analyzed {result['packets']} TCP packets in {time.time() - t0:.2f}s")
+
+    start_ts, durations, colors = connection_points(result, np.random.default_rng())
+    if not len(start_ts):
+        raise SystemExit("No connections found")
+
+    red_idx = np.where(colors == 'red')[0]
+
+    if len(red_idx) > 0:
+        attack_start, attack_end = start_ts[red_idx[0]], start_ts[red_idx[-1]]
+    else:
+        attack_start = start_ts[0] + datetime.timedelta(seconds=20)
+        attack_end = start_ts[0] + datetime.timedelta(seconds=100)
+
+    plt.figure(figsize=(10, 6))
+    plt.scatter(start_ts, durations, c=colors, alpha=0.7)
+    plt.axvline(attack_start, color='r', linestyle='dashed', label="Attack Start")
+    plt.axvline(attack_end, color='g', linestyle='dashed', label="Attack End")
+    plt.xlabel("Start Time")
+    plt.ylabel("Connection Duration (seconds)")
+    plt.title("TCP Connection Duration vs. Start Time")
+    plt.xticks(rotation=45)
+    plt.legend(["TCP Connections", "Attack Start", "Attack End"])
+    plt.grid(True)
+    if args.output:
+        plt.savefig(args.output, bbox_inches='tight')
+    else:
+        plt.show()
@@ -1,52 +1,665 @@
+import os
+import sys
+import time
+import signal
+import stat
 import socket
-import subprocess
+import argparse
 import base64
+import binascii
+import resource
 import select
+import asyncio
+import json
+import threading
+import multiprocessing
+import itertools
+import collections
+from framing import FrameDecoder, FrameError, frame_buffers
+from timing_wheel import TimingWheel
+import kernel_profiles
+from common import ringlog
+
+# Replaced by a RingLog in each serving process (see open_log)
+log = ringlog.NullLog()
+
+READ_SIZE = 1024
+MAX_EVENTS = 1024
+# Edge-triggered: a socket is reported once per new readiness, so reads drain it until EAGAIN
+CLIENT_EVENTS = select.EPOLLIN | select.EPOLLRDHUP | select.EPOLLET
+
+# Stop reading a client once this much of its acks is unsent, resume below the low mark
+WRITE_HIGH_WATER = 64 * 1024
+WRITE_LOW_WATER = 16 * 1024
+# Most buffers handed to one sendmsg (the kernel's UIO_MAXIOV)
+IOV_MAX = 1024
+
+# Connections that send nothing within HANDSHAKE_TIMEOUT of being accepted, or nothing for
+# IDLE_TIMEOUT after that, are reaped (0 disables either); deadlines are checked every WHEEL_TICK
+HANDSHAKE_TIMEOUT = 10
+IDLE_TIMEOUT = 60
+WHEEL_TICK = 0.1
+
+# Per-server counters; in worker mode each worker owns one row of a shared array
+COUNTERS = ('accepted', 'messages', 'bytes_in', 'bytes_out', 'closed', 'decode_errors',
+            'reaped_handshake', 'reaped_idle')
+(ACCEPTED, MESSAGES, BYTES_IN, BYTES_OUT, CLOSED, DECODE_ERRORS,
+ REAPED_HANDSHAKE, REAPED_IDLE) = range(len(COUNTERS))
+# Followed in the same row by fixed log2 histograms: bucket b counts values below 2**b
+# (b = value.bit_length()), the last bucket also takes everything larger
+HISTOGRAMS = ('service_us', 'lifetime_ms')  # recv to ack handed to the kernel; accept to close
+BUCKETS = 32
+SERVICE_US = len(COUNTERS)
+LIFETIME_MS = SERVICE_US + BUCKETS
+ROW_SIZE = len(COUNTERS) + len(HISTOGRAMS) * BUCKETS
+
+def observe(stats, histogram, value):
+    stats[histogram + min(int(value).bit_length(), BUCKETS - 1)] += 1
+
+def acknowledge(message):
+    """Decode one base64 message and build its base64 ack; raises binascii.Error on bad input"""
+    decoded_msg = base64.b64decode(message).decode(errors='ignore')
+    if log.level <= ringlog.INFO:  # skip formatting a record that would be dropped
+        log.info('received', f"Received from client: {decoded_msg}")
+    return base64.b64encode(f"Ack: {decoded_msg}".encode())
 
 class StealthServer:
-    def __init__(self, host='0.0.0.0', port=8080):
+    def __init__(self, host='0.0.0.0', port=8080, stats=None, framed=False,
+                 idle_timeout=IDLE_TIMEOUT, handshake_timeout=HANDSHAKE_TIMEOUT, backlog=socket.SOMAXCONN):
         self.host = host
         self.port = port
+        self.stats = stats if stats is not None else [0] * ROW_SIZE
+        self.framed = framed   # length-prefixed messages (framing.py) instead of one message per recv
+        self.idle_timeout = idle_timeout
+        self.handshake_timeout = handshake_timeout
+        self.backlog = backlog  # listen() backlog; the kernel caps it at net.core.somaxconn
+        self.wheel = TimingWheel(WHEEL_TICK, now=time.perf_counter_ns() / 1e9)
+        self.last_read = {}    # fd -> perf_counter_ns of the last message, absent until the first one
+        self.connections = {}  # fd -> socket
+        self.decoders = {}     # fd -> FrameDecoder, in framed mode
+        self.pending = {}      # fd -> deque of response buffers the socket could not take yet
+        self.unsent = {}       # fd -> total bytes in pending[fd]
+        self.paused = set()    # fds not read until their unsent acks drain below WRITE_LOW_WATER
+        self.opened = {}       # fd -> accept time (perf_counter_ns)
+        self.accept_paused = None  # open connections when accept() last failed (e.g. EMFILE)
+        self.poller = None
 
-    def handle_clients(self, server):
-        inputs = [server]
+    def accept_connections(self, server):
+        """Accept every queued connection; with edge-triggered epoll one wakeup may cover many"""
         while True:
-            readable, _, _ = select.select(inputs, [], [])
-            for s in readable:
-                if s is server:
-                    conn, addr = server.accept()
-                    inputs.append(conn)
-                else:
-                    try:
-                        message = s.recv(1024)
-                        if not message:
-                            inputs.remove(s)
-                            s.close()
-                            continue
-                        decoded_msg = base64.b64decode(message).decode(errors='ignore')
-                        print(f"Received from client: {decoded_msg}")
-                        response = base64.b64encode(f"Ack: {decoded_msg}".encode())
-                        s.send(response)
-                    except:
-                        inputs.remove(s)
-                        s.close()
-
-    def start_server(self):
+            try:
+                conn, addr = server.accept()
+            except BlockingIOError:
+                self.accept_paused = None
+                return
+            except OSError as e:
+                # e.g. EMFILE: the rest stay in the backlog. The edge-triggered listener will not
+                # report them again, so handle_clients retries once a connection has closed
+                if self.accept_paused is None:
+                    log.warning('accept_failed', f"Accept failed: {e}")
+                self.accept_paused = len(self.connections)
+                return
+            conn.setblocking(False)
+            self.stats[ACCEPTED] += 1
+            self.connections[conn.fileno()] = conn
+            self.opened[conn.fileno()] = time.perf_counter_ns()
+            limit = self.handshake_timeout or self.idle_timeout
+            if limit:
+                self.wheel.schedule(conn.fileno(), self.opened[conn.fileno()] / 1e9 + limit)
+            if self.framed:
+                self.decoders[conn.fileno()] = FrameDecoder()
+            self.poller.register(conn.fileno(), CLIENT_EVENTS)
+
+    def close_connection(self, fd):
+        conn = self.connections.pop(fd, None)
+        self.pending.pop(fd, None)
+        self.unsent.pop(fd, None)
+        self.paused.discard(fd)
+        self.decoders.pop(fd, None)
+        self.last_read.pop(fd, None)
+        self.wheel.cancel(fd)
+        if conn is not None:
+            self.stats[CLOSED] += 1
+            observe(self.stats, LIFETIME_MS, (time.perf_counter_ns() - self.opened.pop(fd)) // 1000000)
+            self.poller.unregister(fd)
+            conn.close()
+
+    def read_messages(self, fd):
+        """Read until the socket would block, answering each message"""
+        conn = self.connections[fd]
+        while fd in self.connections and fd not in self.paused:
+            try:
+                message = conn.recv(READ_SIZE)
+            except BlockingIOError:
+                return
+            except OSError:
+                self.close_connection(fd)
+                return
+            if not message:
+                self.close_connection(fd)
+                return
+            received = self.last_read[fd] = time.perf_counter_ns()
+            self.stats[BYTES_IN] += len(message)
+            try:
+                response = acknowledge(message)
+            except binascii.Error:
+                self.stats[DECODE_ERRORS] += 1
+                self.close_connection(fd)
+                return
+            self.stats[MESSAGES] += 1
+            self.send(fd, [response])
+            observe(self.stats, SERVICE_US, (time.perf_counter_ns() - received) // 1000)
+
+    def read_frames(self, fd):
+        """Framed mode: read into the connection's decoder and answer all frames of a read with one sendmsg"""
+        conn, decoder = self.connections[fd], self.decoders[fd]
+        while fd in self.connections and fd not in self.paused:
+            try:
+                with decoder.writable() as view:
+                    n = conn.recv_into(view)
+            except BlockingIOError:
+                return
+            except OSError:
+                self.close_connection(fd)
+                return
+            if not n:
+                self.close_connection(fd)
+                return
+            received = self.last_read[fd] = time.perf_counter_ns()
+            decoder.commit(n)
+            self.stats[BYTES_IN] += n
+            try:
+                acks = [acknowledge(frame) for frame in decoder.frames()]
+            except (binascii.Error, FrameError):
+                self.stats[DECODE_ERRORS] += 1
+                self.close_connection(fd)
+                return
+            if acks:
+                self.stats[MESSAGES] += len(acks)
+                self.send(fd, frame_buffers(acks))
+                observe(self.stats, SERVICE_US, (time.perf_counter_ns() - received) // 1000)
+
+    def send(self, fd, buffers):
+        """Send now if the socket takes it; otherwise queue the rest and wait for EPOLLOUT"""
+        if fd in self.pending:
+            self.queue(fd, buffers)
+            return
+        try:
+            sent = self.connections[fd].sendmsg(buffers)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self.close_connection(fd)
+            return
+        self.stats[BYTES_OUT] += sent
+        if sent < sum(map(len, buffers)):
+            self.pending[fd], self.unsent[fd] = collections.deque(buffers), sum(map(len, buffers))
+            self.consume(fd, sent)
+            if self.unsent[fd] > WRITE_HIGH_WATER:
+                self.paused.add(fd)
+            self.update_events(fd)
+
+    def queue(self, fd, buffers):
+        """Append to the unsent acks; a client that does not read them stops being read too"""
+        self.pending[fd].extend(buffers)
+        self.unsent[fd] += sum(map(len, buffers))
+        if self.unsent[fd] > WRITE_HIGH_WATER and fd not in self.paused:
+            self.paused.add(fd)
+            self.update_events(fd)
+
+    def consume(self, fd, sent):
+        """Drop `sent` bytes from the front of the fd's queue, keeping the rest of a partly sent buffer"""
+        queue = self.pending[fd]
+        self.unsent[fd] -= sent
+        while sent:
+            head = queue[0]
+            if sent < len(head):
+                queue[0] = memoryview(head)[sent:]
+                return
+            sent -= len(head)
+            queue.popleft()
+
+    def flush(self, fd):
+        """EPOLLOUT: send queued acks until the socket is full (edge-triggered) or the queue is empty"""
+        queue = self.pending[fd]
+        while queue:
+            buffers = list(itertools.islice(queue, IOV_MAX))
+            try:
+                sent = self.connections[fd].sendmsg(buffers)
+            except BlockingIOError:
+                break
+            except OSError:
+                self.close_connection(fd)
+                return
+            self.stats[BYTES_OUT] += sent
+            self.consume(fd, sent)
+            if sent < sum(map(len, buffers)):
+                break
+        resume = fd in self.paused and self.unsent[fd] <= WRITE_LOW_WATER
+        if resume:
+            self.paused.discard(fd)
+        if not queue:
+            del self.pending[fd], self.unsent[fd]
+        if resume or fd not in self.pending:
+            # Re-adding EPOLLIN makes epoll report data that arrived while paused
+            self.update_events(fd)
+
+    def update_events(self, fd):
+        events = CLIENT_EVENTS & ~select.EPOLLIN if fd in self.paused else CLIENT_EVENTS
+        self.poller.modify(fd, events | select.EPOLLOUT if fd in self.pending else events)
+
+    def reap(self, fd, now):
+        """Close a connection whose wheel deadline passed, unless it has been active since"""
+        last = self.last_read.get(fd)
+        if last is None:
+            self.stats[REAPED_HANDSHAKE if self.handshake_timeout else REAPED_IDLE] += 1
+            self.close_connection(fd)
+        elif not self.idle_timeout:
+            pass  # handshake done and idle reaping disabled
+        elif now - last / 1e9 >= self.idle_timeout:
+            self.stats[REAPED_IDLE] += 1
+            self.close_connection(fd)
+        else:
+            # Reads only record their time; the deadline is pushed back here, once per idle period
+            self.wheel.schedule(fd, last / 1e9 + self.idle_timeout)
+
+    def handle_clients(self, server):
+        server.setblocking(False)
+        server_fd = server.fileno()
+        self.poller = select.epoll()
+        self.poller.register(server_fd, select.EPOLLIN | select.EPOLLET)
+        try:
+            while True:
+                # Only sockets with new events come back: cost is O(active), not O(connections)
+                for fd, events in self.poller.poll(WHEEL_TICK if self.wheel else -1, MAX_EVENTS):
+                    if fd == server_fd:
+                        self.accept_connections(server)
+                        continue
+                    if events & select.EPOLLOUT and fd in self.pending:
+                        self.flush(fd)
+                    if events & (select.EPOLLIN | select.EPOLLRDHUP | select.EPOLLHUP | select.EPOLLERR):
+                        if fd in self.connections:
+                            if self.framed:
+                                self.read_frames(fd)
+                            else:
+                                self.read_messages(fd)
+                # Expire all deadlines of the ticks that passed in one batch
+                now = time.perf_counter_ns() / 1e9
+                for fd in self.wheel.advance(now):
+                    self.reap(fd, now)
+                if self.accept_paused is not None and len(self.connections) < self.accept_paused:
+                    self.accept_connections(server)
+        finally:
+            for fd in list(self.connections):
+                self.close_connection(fd)
+            self.poller.close()
+
+    def start_server(self, reuse_port=False):
+        raise_file_limit()
         server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if reuse_port:
+            # Every worker binds its own listener; the kernel spreads new connections across them
+            server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         server.bind((self.host, self.port))
-        server.listen()
+        server.listen(self.backlog)
         print(f"Server running on {self.host}:{self.port}")
         self.handle_clients(server)
 
-def set_kernel_parameters():
+class AckProtocol(asyncio.Protocol):
+    """One client connection of the asyncio backend; same acks as StealthServer.read_messages.
+
+    The transport buffers what the socket cannot take yet. Past WRITE_HIGH_WATER
+    bytes the transport calls pause_writing and the client is no longer read, so
+    a peer that does not drain its acks stops producing work instead of growing
+    the buffer or holding up the other connections.
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.last_activity = 0.0
+        self.received = False  # any data yet; until then the handshake timeout applies
+        self.opened = time.perf_counter_ns()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        transport.set_write_buffer_limits(high=WRITE_HIGH_WATER, low=WRITE_LOW_WATER)
+        self.server.stats[ACCEPTED] += 1
+        self.touch()
+        limit = self.server.handshake_timeout or self.server.idle_timeout
+        if limit:
+            self.server.wheel.schedule(self, self.last_activity + limit)
+
+    def touch(self):
+        # Cheaper than moving the deadline per read: reap() pushes it back when it comes due early
+        self.last_activity = time.monotonic()
+
+    def reap(self, now):
+        """Called by the server's timing wheel when this connection's deadline has passed"""
+        if not self.received:
+            self.server.stats[REAPED_HANDSHAKE if self.server.handshake_timeout else REAPED_IDLE] += 1
+            self.transport.abort()
+        elif not self.server.idle_timeout:
+            pass  # handshake done and idle reaping disabled
+        elif now - self.last_activity >= self.server.idle_timeout:
+            self.server.stats[REAPED_IDLE] += 1
+            self.transport.abort()
+        else:
+            self.server.wheel.schedule(self, self.last_activity + self.server.idle_timeout)
+
+    def data_received(self, message):
+        self.touch()
+        self.received = True
+        received = time.perf_counter_ns()
+        self.server.stats[BYTES_IN] += len(message)
+        try:
+            response = acknowledge(message)
+        except binascii.Error:
+            self.server.stats[DECODE_ERRORS] += 1
+            self.transport.close()
+            return
+        self.server.stats[MESSAGES] += 1
+        self.server.stats[BYTES_OUT] += len(response)
+        self.transport.write(response)
+        observe(self.server.stats, SERVICE_US, (time.perf_counter_ns() - received) // 1000)
+
+    def pause_writing(self):
+        self.transport.pause_reading()
+
+    def resume_writing(self):
+        self.touch()
+        self.transport.resume_reading()
+
+    def connection_lost(self, exc):
+        self.server.stats[CLOSED] += 1
+        observe(self.server.stats, LIFETIME_MS, (time.perf_counter_ns() - self.opened) // 1000000)
+        self.server.wheel.cancel(self)
+
+class FramedAckProtocol(AckProtocol, asyncio.BufferedProtocol):
+    """Framed mode: the loop reads straight into the FrameDecoder's buffer"""
+
+    def __init__(self, server):
+        super().__init__(server)
+        self.decoder = FrameDecoder()
+
+    def get_buffer(self, sizehint):
+        return self.decoder.writable()
+
+    def buffer_updated(self, nbytes):
+        self.touch()
+        self.received = True
+        received = time.perf_counter_ns()
+        self.decoder.commit(nbytes)
+        self.server.stats[BYTES_IN] += nbytes
+        try:
+            acks = [acknowledge(frame) for frame in self.decoder.frames()]
+        except (binascii.Error, FrameError):
+            self.server.stats[DECODE_ERRORS] += 1
+            self.transport.close()
+            return
+        if acks:
+            buffers = frame_buffers(acks)
+            self.server.stats[MESSAGES] += len(acks)
+            self.server.stats[BYTES_OUT] += sum(map(len, buffers))
+            self.transport.writelines(buffers)  # one writev-style send for the whole batch
+            observe(self.server.stats, SERVICE_US, (time.perf_counter_ns() - received) // 1000)
+
+class AsyncStealthServer:
+    """asyncio counterpart of StealthServer with per-connection write buffers and the same reaping"""
+
+    def __init__(self, host='0.0.0.0', port=8080, stats=None, framed=False,
+                 idle_timeout=IDLE_TIMEOUT, handshake_timeout=HANDSHAKE_TIMEOUT, backlog=socket.SOMAXCONN):
+        self.host = host
+        self.port = port
+        self.stats = stats if stats is not None else [0] * ROW_SIZE
+        self.framed = framed
+        self.idle_timeout = idle_timeout
+        self.handshake_timeout = handshake_timeout
+        self.backlog = backlog  # listen() backlog; the kernel caps it at net.core.somaxconn
+        self.wheel = TimingWheel(WHEEL_TICK, now=time.monotonic())
+
+    def expire(self):
+        """Reap the connections whose deadlines passed since the last tick, then re-arm"""
+        now = time.monotonic()
+        for protocol in self.wheel.advance(now):
+            protocol.reap(now)
+        asyncio.get_running_loop().call_later(WHEEL_TICK, self.expire)
+
+    async def serve(self, reuse_port=False):
+        loop = asyncio.get_running_loop()
+        protocol = FramedAckProtocol if self.framed else AckProtocol
+        server = await loop.create_server(lambda: protocol(self), self.host, self.port,
+                                          backlog=self.backlog, reuse_address=True,
+                                          reuse_port=reuse_port or None)
+        print(f"Server running on {self.host}:{self.port} (asyncio)")
+        loop.call_later(WHEEL_TICK, self.expire)
+        async with server:
+            await server.serve_forever()
+
+    def start_server(self, reuse_port=False):
+        raise_file_limit()
+        try:
+            asyncio.run(self.serve(reuse_port))
+        except KeyboardInterrupt:
+            pass
+
+BACKENDS = {'epoll': StealthServer, 'asyncio': AsyncStealthServer}
+
+def snapshot(row, workers=1):
+    """JSON-ready view of one row (or the sum of all worker rows) of counters and histograms"""
+    return {'time': time.time(), 'pid': os.getpid(), 'workers': workers,
+            'active': row[ACCEPTED] - row[CLOSED],
+            'counters': dict(zip(COUNTERS, row)),
+            'histograms': {name: list(row[SERVICE_US + i * BUCKETS:SERVICE_US + (i + 1) * BUCKETS])
+                           for i, name in enumerate(HISTOGRAMS)}}
+
+class StatsEndpoint:
+    """Answers every connection to a local UNIX socket path (or host:port) with one JSON snapshot.
+
+    Runs on its own thread so polling it never waits on, or delays, the serving loop;
+    server_stats.py is the client.
+    """
+
+    def __init__(self, address, snapshot):
+        self.address = address
+        self.snapshot = snapshot
+        if '/' in address or ':' not in address:
+            try:
+                mode = os.stat(address).st_mode
+            except FileNotFoundError:
+                pass
+            else:
+                # A socket left behind by an earlier run; anything else is not ours to delete
+                if not stat.S_ISSOCK(mode):
+                    raise FileExistsError(f"{address} exists and is not a socket")
+                os.unlink(address)
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.bind(address)
+        else:
+            host, port = address.rsplit(':', 1)
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.sock.bind((host, int(port)))
+        self.sock.listen(16)
+        threading.Thread(target=self.serve, name='stats', daemon=True).start()
+
+    def serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return  # closed
+            with conn:
+                try:
+                    conn.sendall(json.dumps(self.snapshot()).encode() + b'\n')
+                except OSError:
+                    pass
+
+    def close(self):
+        self.sock.close()
+        if self.sock.family == socket.AF_UNIX:
+            try:
+                os.unlink(self.address)
+            except FileNotFoundError:
+                pass
+
+def counter_slot(shared, i):
+    """Worker i's row of the shared counter array"""
+    view = memoryview(shared).cast('B').cast('Q')
+    return view[i * ROW_SIZE:(i + 1) * ROW_SIZE]
+
+def open_log(options):
+    global log
+    log = ringlog.RingLog(**options)
+
+def run_worker(host, port, shared, i, backend='epoll', server_options=None, log_options=None):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the supervisor decides when workers stop
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))  # unwind so the log gets flushed
+    options = dict(log_options or {})
+    if options.get('path'):
+        options['path'] += f'.{i}'  # one log per worker
+    open_log(options)
     try:
-        subprocess.run(['sudo', 'sysctl', '-w', 'net.ipv4.tcp_max_syn_backlog=2048'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        subprocess.run(['sudo', 'sysctl', '-w', 'net.ipv4.tcp_syncookies=1'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        subprocess.run(['sudo', 'sysctl', '-w', 'net.ipv4.tcp_synack_retries=2'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    except:
-        pass
+        server = BACKENDS[backend](host, port, counter_slot(shared, i), **(server_options or {}))
+        server.start_server(reuse_port=True)
+    finally:
+        log.close()
+
+class Supervisor:
+    """Runs N SO_REUSEPORT worker processes, restarts any that die and reports their summed counters"""
+
+    def __init__(self, host='0.0.0.0', port=8080, workers=None, interval=5, backend='epoll',
+                 server_options=None, log_options=None, stats_address=None):
+        self.host = host
+        self.port = port
+        self.backend = backend
+        self.server_options = server_options  # backend keyword arguments (framed, timeouts)
+        self.log_options = log_options
+        self.stats_address = stats_address
+        self.interval = interval
+        workers = workers or os.cpu_count() or 1
+        # One row of counters per worker slot; each worker only writes its own row
+        self.shared = multiprocessing.RawArray('Q', workers * ROW_SIZE)
+        self.workers = [None] * workers
+        self.restarts = 0
+
+    def start_worker(self, i):
+        worker = multiprocessing.Process(target=run_worker, name=f'worker-{i}', daemon=True,
+                                         args=(self.host, self.port, self.shared, i, self.backend,
+                                               self.server_options, self.log_options))
+        worker.start()
+        self.workers[i] = worker
+
+    def retire_row(self, i):
+        """Count the connections dead worker i still had open as closed (the kernel closed them
+        with its sockets), so 'active' does not keep them once the slot's next worker starts"""
+        row = counter_slot(self.shared, i)
+        orphaned = row[ACCEPTED] - row[CLOSED]
+        row[CLOSED] += orphaned
+        return orphaned
+
+    def totals(self):
+        view = memoryview(self.shared).cast('B').cast('Q')
+        return [sum(view[i::ROW_SIZE]) for i in range(ROW_SIZE)]
+
+    def run(self):
+        raise_file_limit()
+        endpoint = None
+        if self.stats_address:
+            endpoint = StatsEndpoint(self.stats_address, lambda: snapshot(self.totals(), len(self.workers)))
+        for i in range(len(self.workers)):
+            self.start_worker(i)
+        print(f"Server running on {self.host}:{self.port} with {len(self.workers)} workers")
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        last, last_time = self.totals(), time.time()
+        try:
+            while True:
+                time.sleep(self.interval)
+                for i, worker in enumerate(self.workers):
+                    if not worker.is_alive():
+                        orphaned = self.retire_row(i)
+                        print(f"Worker {i} (pid {worker.pid}) exited with {worker.exitcode} "
+                              f"and {orphaned} open connections, restarting")
+                        self.restarts += 1
+                        self.start_worker(i)
+                now, totals = time.time(), self.totals()
+                rates = [(b - a) / (now - last_time) for a, b in zip(last, totals)]
+                print(f"Workers {len(self.workers)} (restarts {self.restarts}): "
+                      f"{totals[ACCEPTED]} connections ({rates[ACCEPTED]:.0f}/s), "
+                      f"{totals[MESSAGES]} messages ({rates[MESSAGES]:.0f}/s), "
+                      f"{totals[CLOSED]} closed ({totals[REAPED_HANDSHAKE]} handshake and "
+                      f"{totals[REAPED_IDLE]} idle timeouts), {totals[DECODE_ERRORS]} decode errors")
+                last, last_time = totals, now
+        finally:
+            if endpoint is not None:
+                endpoint.close()
+            for worker in self.workers:
+                worker.terminate()
+            for worker in self.workers:
+                worker.join()
+
+def raise_file_limit():
+    """Allow as many open sockets as the hard limit permits (the soft limit is often 1024)"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    target = hard
+    if hard == resource.RLIM_INFINITY:
+        # An unlimited soft limit is refused; the kernel's real ceiling is fs.nr_open
+        try:
+            with open('/proc/sys/fs/nr_open') as f:
+                target = int(f.read())
+        except (OSError, ValueError):
+            return
+    if soft != resource.RLIM_INFINITY and soft < target:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+        except (ValueError, OSError) as e:
+            print(f"Cannot raise the open file limit to {target}: {e}", file=sys.stderr)
 
 if __name__ == "__main__":
-    set_kernel_parameters()
-    server = StealthServer()
-    server.start_server()
+    parser = argparse.ArgumentParser(description='Base64 echo/ack server for the Task2 experiments')
+    parser.add_argument('--host', default='0.0.0.0', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on')
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='epoll',
+                        help='epoll: edge-triggered loop; asyncio: Protocol server with write backpressure')
+    parser.add_argument('--framed', action='store_true',
+                        help='Expect 4-byte length-prefixed messages (framing.py) and answer in kind')
+    parser.add_argument('--idle-timeout', type=float, default=IDLE_TIMEOUT,
+                        help='Reap connections silent for this many seconds after their first message (0: never)')
+    parser.add_argument('--handshake-timeout', type=float, default=HANDSHAKE_TIMEOUT,
+                        help='Reap connections that send nothing this long after being accepted (0: never)')
+    parser.add_argument('--backlog', type=int, default=socket.SOMAXCONN, help='listen() backlog')
+    parser.add_argument('--kernel-profile', choices=sorted(kernel_profiles.PROFILES) + ['none'], default='none',
+                        help='sysctl profile (kernel_profiles.py) to apply while the server runs, restored on exit; '
+                             'needs root or passwordless sudo ("assignment" is what the server used to apply)')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='Run N SO_REUSEPORT worker processes under a supervisor (0: single process)')
+    parser.add_argument('--stats-interval', type=float, default=5,
+                        help='Seconds between the supervisor\'s aggregated counter reports')
+    parser.add_argument('--stats-socket', default=None, metavar='PATH|HOST:PORT',
+                        help='Serve JSON counter/histogram snapshots here (read them with server_stats.py)')
+    ringlog.add_arguments(parser)
+    args = parser.parse_args()
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))  # unwind so the log and sysctls get restored
+    saved_sysctls = {} if args.kernel_profile == 'none' else kernel_profiles.apply_profile(args.kernel_profile)
+    server_options = {'framed': args.framed, 'idle_timeout': args.idle_timeout,
+                      'handshake_timeout': args.handshake_timeout, 'backlog': args.backlog}
+    try:
+        if args.workers:
+            Supervisor(args.host, args.port, args.workers, args.stats_interval, args.backend, server_options,
+                       ringlog.options(args), args.stats_socket).run()
+        else:
+            open_log(ringlog.options(args))
+            server = BACKENDS[args.backend](args.host, args.port, **server_options)
+            endpoint = StatsEndpoint(args.stats_socket, lambda: snapshot(server.stats)) if args.stats_socket else None
+            try:
+                server.start_server()
+            finally:
+                if endpoint is not None:
+                    endpoint.close()
+                log.close()
+    except FileExistsError as e:
+        sys.exit(f"Cannot serve stats: {e}")
+    finally:
+        kernel_profiles.restore(saved_sysctls)
@@ -0,0 +1,75 @@
+import sys
+import json
+import time
+import socket
+import argparse
+from latency import percentile_bucket
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+def fetch(address):
+    """One snapshot from a server's --stats-socket (a UNIX socket path or host:port)"""
+    if '/' in address or ':' not in address:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        target = address
+    else:
+        host, port = address.rsplit(':', 1)
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        target = (host, int(port))
+    with sock:
+        sock.settimeout(5)
+        sock.connect(target)
+        data = b''
+        while chunk := sock.recv(65536):
+            data += chunk
+    return json.loads(data)
+
+def percentile(counts, q):
+    """Upper bound of the bucket holding the q-th percentile; as in server.py, bucket b counts values below 2**b"""
+    bucket = percentile_bucket(counts, q)
+    return None if bucket is None else 2 ** bucket
+
+def summary(histogram, unit):
+    values = [percentile(histogram, q) for q in PERCENTILES]
+    if values[0] is None:
+        return 'no samples'
+    return ', '.join(f'p{q:g} <{value}{unit}' for q, value in zip(PERCENTILES, values))
+
+def report(current, previous=None):
+    counters, histograms = current['counters'], current['histograms']
+    lines = [f"{time.strftime('%H:%M:%S', time.localtime(current['time']))} "
+             f"workers {current['workers']}, active {current['active']}"]
+    if previous is None:
+        lines.append('  ' + ', '.join(f'{name} {value}' for name, value in counters.items()))
+    else:
+        # Rates and latency percentiles over the last interval only
+        elapsed = current['time'] - previous['time']
+        lines.append('  ' + ', '.join(f'{name} {value} ({(value - previous["counters"][name]) / elapsed:.0f}/s)'
+                                      for name, value in counters.items()))
+        histograms = {name: [a - b for a, b in zip(counts, previous['histograms'][name])]
+                      for name, counts in histograms.items()}
+    lines.append(f"  service time: {summary(histograms['service_us'], 'us')}")
+    lines.append(f"  connection lifetime: {summary(histograms['lifetime_ms'], 'ms')}")
+    return '\n'.join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Read counters and latency histograms from server.py --stats-socket')
+    parser.add_argument('address', help='The server\'s --stats-socket (UNIX socket path or host:port)')
+    parser.add_argument('--watch', type=float, default=0, metavar='SECONDS',
+                        help='Poll every SECONDS and show per-interval rates (default: one snapshot)')
+    parser.add_argument('--json', action='store_true', help='Print the raw snapshot(s)')
+    args = parser.parse_args()
+
+    try:
+        previous = None
+        while True:
+            current = fetch(args.address)
+            print(json.dumps(current) if args.json else report(current, previous), flush=True)
+            if not args.watch:
+                break
+            previous = current
+            time.sleep(args.watch)
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        sys.exit(f"Cannot read stats from {args.address}: {e}")
@@ -0,0 +1,62 @@
+import random
+import socket
+import pytest
+from framing import FrameDecoder, FrameError, MAX_FRAME, HEADER, encode_frame, frame_buffers
+
+
+def payloads(rng, count):
+    sizes = [0, 1, 3, 4, 5, 4095, 4096, 70000]
+    return [rng.randbytes(rng.choice(sizes) if rng.random() < 0.2 else rng.randrange(200)) for _ in range(count)]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_random_splits(seed):
+    rng = random.Random(seed)
+    messages = payloads(rng, 500)
+    stream = b''.join(map(encode_frame, messages))
+    decoder, out, pos = FrameDecoder(size=1024), [], 0
+    while pos < len(stream):
+        n = rng.choice([1, 2, 3, 7, 100, 5000, 100000])
+        decoder.feed(stream[pos:pos + n])
+        pos += n
+        out.extend(bytes(frame) for frame in decoder.frames())
+    assert out == messages
+
+
+def test_recv_into_writable():
+    messages = [b'a' * n for n in (10, 0, 90000, 5)]
+    left, right = socket.socketpair()
+    with left, right:
+        left.sendall(b''.join(frame_buffers(messages)))
+        left.shutdown(socket.SHUT_WR)
+        decoder, out = FrameDecoder(size=16), []
+        while True:
+            with decoder.writable() as view:
+                n = right.recv_into(view)
+            if not n:
+                break
+            decoder.commit(n)
+            out.extend(map(bytes, decoder.frames()))
+    assert out == messages
+
+
+def test_partial_frame_kept():
+    decoder = FrameDecoder()
+    data = encode_frame(b'hello') + encode_frame(b'world')
+    decoder.feed(data[:-2])
+    assert list(map(bytes, decoder.frames())) == [b'hello']
+    assert list(decoder.frames()) == []
+    decoder.feed(data[-2:])
+    assert list(map(bytes, decoder.frames())) == [b'world']
+
+
+def test_oversized_frame():
+    decoder = FrameDecoder()
+    decoder.feed(HEADER.pack(MAX_FRAME + 1) + b'x')
+    with pytest.raises(FrameError):
+        list(decoder.frames())
+
+
+def test_frame_buffers_match_encode():
+    messages = [b'', b'abc', b'\x00' * 10]
+    assert b''.join(frame_buffers(messages)) == b''.join(map(encode_frame, messages))
@@ -0,0 +1,61 @@
+import argparse
+import pytest
+import kernel_profiles
+import handshake_probe
+
+
+class FakeServer:
+    def __init__(self, *args, **kwargs):
+        self.returncode = None
+        FakeServer.started.append(self)
+
+    def poll(self):
+        return self.returncode
+
+    def terminate(self):
+        self.returncode = -15
+
+    def wait(self):
+        return self.returncode
+
+
+@pytest.fixture
+def restored(monkeypatch):
+    restored = []
+    FakeServer.started = []
+    monkeypatch.setattr(kernel_profiles, 'apply_profile', lambda profile: {'saved': profile})
+    monkeypatch.setattr(kernel_profiles, 'verify_profile', lambda profile: [])
+    monkeypatch.setattr(kernel_profiles, 'restore', restored.append)
+    monkeypatch.setattr(handshake_probe.subprocess, 'Popen', FakeServer)
+    return restored
+
+
+ARGS = argparse.Namespace(host='127.0.0.1', port=1, server_args='')
+
+
+def test_profile_restored_when_verify_fails(monkeypatch, restored):
+    def verify(profile):
+        raise PermissionError('sysctl not readable')
+    monkeypatch.setattr(kernel_profiles, 'verify_profile', verify)
+    with pytest.raises(PermissionError):
+        handshake_probe.run_case(ARGS, 'small', 128)
+    assert restored == [{'saved': 'small'}]
+    assert FakeServer.started == []
+
+
+def test_profile_restored_when_server_cannot_spawn(monkeypatch, restored):
+    def spawn(*args, **kwargs):
+        raise FileNotFoundError('python')
+    monkeypatch.setattr(handshake_probe.subprocess, 'Popen', spawn)
+    with pytest.raises(FileNotFoundError):
+        handshake_probe.run_case(ARGS, 'large', 128)
+    assert restored == [{'saved': 'large'}]
+
+
+def test_server_stopped_when_it_does_not_listen(monkeypatch, restored):
+    monkeypatch.setattr(handshake_probe, 'wait_listening', lambda host, port: False)
+    with pytest.raises(RuntimeError):
+        handshake_probe.run_case(ARGS, 'assignment', 4096)
+    server, = FakeServer.started
+    assert server.returncode == -15
+    assert restored == [{'saved': 'assignment'}]
@@ -0,0 +1,45 @@
+import math
+import random
+import pytest
+from latency import LatencyHistogram, percentile_bucket, SUB_BITS
+from server_stats import percentile as log2_percentile
+
+
+def nearest_rank(values, q):
+    ordered = sorted(values)
+    return ordered[max(math.ceil(len(ordered) * q / 100), 1) - 1]
+
+
+@pytest.mark.parametrize('q', [0, 1, 50, 90, 99, 99.9, 100])
+def test_histogram_percentiles(q):
+    rng = random.Random(3)
+    values = [int(rng.lognormvariate(8, 2)) for _ in range(5000)]
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(value)
+    exact = nearest_rank(values, q)
+    # The bucket's lowest value, within one sub-bucket of the sample
+    assert exact * (1 - 2 ** (1 - SUB_BITS)) <= histogram.percentile(q) <= exact
+
+
+def test_exact_small_values():
+    histogram = LatencyHistogram()
+    for value in range(1, 101):
+        histogram.record(value)
+    assert [histogram.percentile(q) for q in (0, 1, 50, 99, 99.5, 100)] == [1, 1, 50, 99, 100, 100]
+
+
+def test_empty():
+    assert LatencyHistogram().percentile(50) is None
+    assert percentile_bucket([0, 0, 0], 99) is None
+    assert log2_percentile([0, 0, 0], 99) is None
+
+
+def test_log2_buckets_use_the_same_rank():
+    values = [3] * 90 + [100] * 9 + [5000]
+    counts = [0] * 16
+    for value in values:
+        counts[value.bit_length()] += 1
+    for q in (0, 50, 90, 91, 99, 99.1, 100):
+        # Upper bound of the log2 bucket that holds the nearest-rank sample
+        assert log2_percentile(counts, q) == 2 ** nearest_rank(values, q).bit_length()
@@ -0,0 +1,82 @@
+import random
+import numpy as np
+import pytest
+import pcap_shards
+from pcap_shards import EVENT_DTYPE, reduce_events, analyze
+from common.pcap_testing import tcp_frame, write_pcap
+
+FIN, SYN, RST, ACK = 0x01, 0x02, 0x04, 0x10
+
+
+def events(*rows):
+    return np.array(list(rows), dtype=EVENT_DTYPE)
+
+
+def test_reduce_earliest_syn_and_first_close_after_it():
+    start, end = reduce_events(events(
+        (1, 2, 2.0, False),  # a close before any SYN of the connection does not count
+        (1, 2, 5.0, False),
+        (1, 2, 3.0, True),
+        (1, 2, 4.0, True),   # SYN retransmission: the first SYN is the start
+        (1, 2, 9.0, False),
+        (1, 2, 7.0, False),  # shards need not be in time order
+        (3, 4, 2.0, True),   # never closed
+        (5, 6, 1.0, False),  # close without a SYN: not a connection
+    ))
+    assert start.tolist() == [3.0, 2.0]
+    assert end[0] == 5.0
+    assert np.isnan(end[1])
+
+
+def test_reduce_empty_and_no_syn():
+    for rows in ((), ((1, 2, 1.0, False),)):
+        start, end = reduce_events(events(*rows))
+        assert len(start) == len(end) == 0
+
+
+def test_analyze_both_directions(tmp_path):
+    path = tmp_path / 'c.pcap'
+    client, server = '10.0.0.1', '10.0.0.2'
+    write_pcap(path, [
+        (100.0, tcp_frame(client, 40000, server, 8080, SYN)),
+        (100.1, tcp_frame(server, 8080, client, 40000, SYN | ACK)),  # a SYN-ACK opens nothing
+        (100.2, tcp_frame(client, 40000, server, 8080, ACK, payload=b'x' * 2000)),  # over max_size: ignored
+        (100.3, tcp_frame(client, 40001, server, 8080, SYN)),
+        (100.5, tcp_frame(server, 8080, client, 40000, FIN | ACK)),  # closed from the server's side
+        (100.6, tcp_frame(client, 40000, server, 8080, FIN | ACK)),
+        (100.9, tcp_frame(server, 8080, client, 40001, RST)),
+        (101.0, tcp_frame(client, 40002, server, 8080, SYN, vlan=[0x88a8, 0x8100])),  # QinQ, never closed
+    ])
+    result = analyze(str(path), workers=1)
+    assert result['start'] == pytest.approx([100.0, 100.3, 101.0])
+    assert result['end'][:2] == pytest.approx([100.5, 100.9])
+    assert np.isnan(result['end'][2])
+    assert result['packets'] == 8
+    assert result['ignored'] == 1
+
+
+def test_shards_match_a_single_pass(tmp_path, monkeypatch):
+    rng = random.Random(1)
+    frames, when = [], 1000.0
+    for port in range(40000, 40300):
+        for flags in (SYN, SYN | ACK, ACK, FIN | ACK, FIN | ACK):
+            when += rng.random() / 100
+            # Random payloads so shard boundaries land mid-record and the resync has to find headers
+            frames.append((when, tcp_frame('10.0.0.1', port, '10.0.0.2', 8080, flags,
+                                           payload=rng.randbytes(rng.randrange(1400)))))
+    path = tmp_path / 'c.pcap'
+    write_pcap(path, frames)
+    whole = analyze(str(path), workers=1)
+    monkeypatch.setattr(pcap_shards, 'MIN_SHARD', 4096)
+    sharded = analyze(str(path), workers=4)
+    assert len(whole['start']) == 300
+    for name in ('start', 'end'):
+        assert np.array_equal(sharded[name], whole[name])
+    assert (sharded['packets'], sharded['ignored']) == (whole['packets'], whole['ignored'])
+
+
+def test_unknown_cpu_count(tmp_path, monkeypatch):
+    path = tmp_path / 'c.pcap'
+    write_pcap(path, [(1.0, tcp_frame('10.0.0.1', 1, '10.0.0.2', 2, SYN))])
+    monkeypatch.setattr(pcap_shards.os, 'cpu_count', lambda: None)
+    assert analyze(str(path))['start'].tolist() == [1.0]
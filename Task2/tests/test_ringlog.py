@@ -0,0 +1,62 @@
+import json
+from common import ringlog
+
+
+def read_back(log, path):
+    log.close()
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_long_messages_survive(tmp_path):
+    path = tmp_path / 'out.log'
+    log = ringlog.RingLog(str(path), flush_interval=60)
+    messages = ['x' * n for n in (0, 1, 103, 104, 105, 5000)]
+    for message in messages:
+        log.info('sent', message)
+    assert read_back(log, path).decode().splitlines() == messages
+
+
+def test_truncation_is_marked(tmp_path):
+    path = tmp_path / 'out.jsonl'
+    log = ringlog.RingLog(str(path), fmt='jsonl', flush_interval=60)
+    log.error('big', 'y' * (ringlog.MAX_MESSAGE + 10))
+    record = json.loads(read_back(log, path))
+    assert len(record['message']) == ringlog.MAX_MESSAGE
+    assert record['message'].endswith('...') and record['level'] == 'error' and record['event'] == 'big'
+
+
+def test_wraparound_and_drops(tmp_path):
+    path = tmp_path / 'out.bin'
+    log = ringlog.RingLog(str(path), fmt='binary', capacity=1000, flush_interval=60)
+    log.closing = True  # stop the writer thread so only the explicit flushes drain the ring
+    log.wakeup.set()
+    log.thread.join()
+    written = []
+    for round_ in range(20):
+        for i in range(3):
+            message = f'{round_}-{i}-' + 'z' * (round_ * 7 % 90)
+            log.info('e', message)
+            written.append(message)
+        log.flush()
+    for i in range(100):  # overfill: whole records are dropped, never partial ones
+        log.info('e', 'w' * 50)
+    dropped = log.dropped
+    got = [record[3] for record in ringlog.records(read_back(log, path))]
+    assert got[:len(written)] == written
+    assert dropped and len(got) == len(written) + 100 - dropped
+
+
+def test_level_and_sampling(tmp_path):
+    path = tmp_path / 'out.log'
+    log = ringlog.RingLog(str(path), level=ringlog.INFO, sample=3, flush_interval=60)
+    log.debug('d', 'hidden')
+    for i in range(9):
+        log.info('i', str(i))
+    log.warning('w', 'always')
+    assert read_back(log, path).decode().splitlines() == ['2', '5', '8', 'always']
+
+
+def test_records_ignores_cut_off_tail():
+    data = ringlog.HEADER.pack(1.0, ringlog.INFO, 1, 2) + b'eab'
+    assert list(ringlog.records(data + data[:-1])) == [(1.0, ringlog.INFO, 'e', 'ab')]
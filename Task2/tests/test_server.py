@@ -0,0 +1,78 @@
+import time
+import base64
+import socket
+import threading
+import server as server_module
+from framing import FrameDecoder, frame_buffers
+from server import (StealthServer, Supervisor, MESSAGES, WRITE_HIGH_WATER, ACCEPTED, CLOSED,
+                    acknowledge, counter_slot, snapshot)
+from common import ringlog
+
+
+def start_server(**options):
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(('127.0.0.1', 0))
+    listener.listen()
+    server = StealthServer(**options)
+    threading.Thread(target=server.handle_clients, args=(listener,), daemon=True).start()
+    return server, listener.getsockname()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def test_client_that_never_reads_is_paused():
+    server, address = start_server(framed=True, idle_timeout=0, handshake_timeout=0)
+    messages = [base64.b64encode(b'%06d' % i + b'x' * 700) for i in range(20000)]
+    with socket.create_connection(address) as client:
+        sender = threading.Thread(target=client.sendall, args=(b''.join(frame_buffers(messages)),), daemon=True)
+        sender.start()
+        wait_for(lambda: server.paused)
+        time.sleep(0.3)
+        # ~20 MB of acks are owed, but the server holds only about one read's worth past the high mark
+        fd, = server.connections
+        assert fd in server.paused
+        assert server.unsent[fd] < 4 * WRITE_HIGH_WATER
+        assert server.stats[MESSAGES] < len(messages)
+
+        # Reading resumes the client and every message still gets its ack, in order
+        decoder, acks = FrameDecoder(), []
+        while len(acks) < len(messages):
+            with decoder.writable() as view:
+                n = client.recv_into(view)
+            assert n
+            decoder.commit(n)
+            acks.extend(bytes(frame) for frame in decoder.frames())
+        sender.join(5)
+    assert [base64.b64decode(ack)[5:11] for ack in acks[::997]] == [b'%06d' % i for i in range(0, 20000, 997)]
+    wait_for(lambda: not server.connections)
+    assert not server.pending and not server.unsent and not server.paused
+
+
+def test_acknowledge_skips_filtered_log(monkeypatch):
+    class QuietLog:
+        level = ringlog.WARNING
+
+        def info(self, event, message=''):
+            raise AssertionError('info record built below the log level')
+    monkeypatch.setattr(server_module, 'log', QuietLog())
+    assert acknowledge(base64.b64encode(b'hello')) == base64.b64encode(b'Ack: hello')
+
+
+def test_restarted_slot_drops_orphaned_connections():
+    supervisor = Supervisor(workers=2)
+    for i, (accepted, closed) in enumerate([(10, 4), (7, 7)]):
+        row = counter_slot(supervisor.shared, i)
+        row[ACCEPTED], row[CLOSED] = accepted, closed
+    assert snapshot(supervisor.totals())['active'] == 6
+
+    # Worker 0 died with 6 connections open; they are gone with it
+    assert supervisor.retire_row(0) == 6
+    assert snapshot(supervisor.totals())['active'] == 0
+    assert supervisor.totals()[ACCEPTED] == 17
+    counter_slot(supervisor.shared, 0)[ACCEPTED] += 1  # the replacement accepts a connection
+    assert snapshot(supervisor.totals())['active'] == 1
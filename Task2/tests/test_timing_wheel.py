@@ -0,0 +1,62 @@
+import math
+import random
+import pytest
+from timing_wheel import TimingWheel
+
+
+class Reference:
+    """The wheel's contract with none of its structure: a dict of due ticks"""
+
+    def __init__(self, tick):
+        self.tick = tick
+        self.due = {}
+        self.current = 0
+
+    def schedule(self, key, deadline):
+        self.due[key] = max(math.ceil(deadline / self.tick), self.current + 1)
+
+    def cancel(self, key):
+        self.due.pop(key, None)
+
+    def advance(self, now):
+        self.current = max(self.current, int(now / self.tick))
+        expired = sorted((due, key) for key, due in self.due.items() if due <= self.current)
+        for _, key in expired:
+            del self.due[key]
+        return expired
+
+
+# Small wheels so that wrap-arounds, cascades and entries parked past the top level all happen often
+@pytest.mark.parametrize('slots,levels', [(4, 1), (4, 2), (8, 3), (256, 3)])
+@pytest.mark.parametrize('seed', range(3))
+def test_matches_reference(slots, levels, seed):
+    rng = random.Random(seed)
+    tick = 1.0
+    far = min(slots ** levels * 3, 20000)  # advance() steps tick by tick, so keep the big wheel's horizon sane
+    wheel, reference = TimingWheel(tick=tick, slots=slots, levels=levels), Reference(tick)
+    now = 0.0
+    for _ in range(3000):
+        action = rng.random()
+        key = rng.randrange(200)
+        if action < 0.5:
+            # Mostly near deadlines, some far beyond every level's span, a few already past
+            horizon = rng.choice([3, 30, far])
+            deadline = now + rng.uniform(-2, horizon)
+            wheel.schedule(key, deadline)
+            reference.schedule(key, deadline)
+        elif action < 0.6:
+            wheel.cancel(key)
+            reference.cancel(key)
+        else:
+            now += rng.choice([0, 0.3, 1, 2.5, 10, slots * 1.7])
+            expired = reference.advance(now)
+            got = wheel.advance(now)
+            # Keys due on the same tick may come out in any order
+            due = {key: due_tick for due_tick, key in expired}
+            assert sorted(got) == sorted(due)
+            assert [due[key] for key in got] == sorted(due.values())
+        assert len(wheel) == len(reference.due)
+    # Everything left expires once the clock passes the last deadline
+    now += max(30, far) + 10
+    assert sorted(wheel.advance(now)) == sorted(key for _, key in reference.advance(now))
+    assert len(wheel) == 0
@@ -0,0 +1,80 @@
+import math
+
+class TimingWheel:
+    """Hierarchical timing wheel (Varghese & Lauck) for many coarse per-connection deadlines.
+
+    Level l has `slots` buckets of `tick * slots**l` seconds each. schedule() and
+    cancel() are O(1) dict operations; advance() walks the ticks that have passed,
+    returns every key whose deadline is due in one batch, and cascades entries
+    from a higher level down when a lower level wraps around.
+    """
+
+    def __init__(self, tick=0.1, slots=256, levels=3, now=0.0):
+        self.tick = tick
+        self.slots = slots
+        self.levels = [[{} for _ in range(slots)] for _ in range(levels)]
+        self.slot_of = {}  # key -> the bucket dict that holds it
+        self.current = int(now / tick)  # last tick processed
+
+    def __len__(self):
+        return len(self.slot_of)
+
+    def schedule(self, key, deadline):
+        """(Re)arm `key` to expire at `deadline` (same clock as advance)"""
+        self.cancel(key)
+        self._insert(key, max(math.ceil(deadline / self.tick), self.current + 1))
+
+    def _insert(self, key, due):
+        delta, level, span = due - self.current, 0, self.slots
+        while delta >= span and level < len(self.levels) - 1:
+            level += 1
+            span *= self.slots
+        # Beyond the top level's span the entry parks in the top level and is re-filed when it cascades
+        bucket = self.levels[level][(due // self.slots ** level) % self.slots]
+        bucket[key] = due
+        self.slot_of[key] = bucket
+
+    def cancel(self, key):
+        bucket = self.slot_of.pop(key, None)
+        if bucket is not None:
+            del bucket[key]
+
+    def advance(self, now):
+        """Move the wheel to `now` and return the keys that expired, in tick order"""
+        target = int(now / self.tick)
+        if not self.slot_of:
+            self.current = max(self.current, target)
+            return []
+        expired = []
+        while self.current < target and self.slot_of:
+            self.current += 1
+            index = self.current % self.slots
+            if index == 0:
+                self._cascade()
+            bucket = self.levels[0][index]
+            if bucket:
+                # Empty the bucket first: with a single level, a parked entry is re-filed into this same bucket
+                entries = list(bucket.items())
+                bucket.clear()
+                for key, due in entries:
+                    del self.slot_of[key]
+                    if due <= self.current:
+                        expired.append(key)
+                    else:
+                        self._insert(key, due)  # parked past the top level's span
+        self.current = max(self.current, target)
+        return expired
+
+    def _cascade(self):
+        """Re-file the next bucket of each higher level whose lower level just wrapped"""
+        for level in range(1, len(self.levels)):
+            span = self.slots ** level
+            index = (self.current // span) % self.slots
+            bucket = self.levels[level][index]
+            entries = list(bucket.items())
+            bucket.clear()
+            for key, due in entries:
+                del self.slot_of[key]
+                self._insert(key, due)
+            if index != 0:
+                break
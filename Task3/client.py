@@ -1,6 +1,10 @@
 import socket
 import time
 import argparse
+from common import ringlog
+
+# Replaced by a RingLog when run as a script
+log = ringlog.NullLog()
 
 def setup_client(nagle_enabled, delayed_ack_enabled):
     # Create a TCP/IP socket
@@ -16,7 +20,7 @@ def setup_client(nagle_enabled, delayed_ack_enabled):
         try:
             client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
         except AttributeError:
-            print("TCP_QUICKACK not supported on this platform")
+            log.warning('no_quickack', "TCP_QUICKACK not supported on this platform")
     
     return client_socket
 
@@ -25,8 +29,8 @@ def run_client(nagle_enabled, delayed_ack_enabled):
     
     # Connect to the server
     server_address = ('localhost', 10000)
-    print(f"Connecting to {server_address} with Nagle: {'Enabled' if nagle_enabled else 'Disabled'}, "
-          f"Delayed-ACK: {'Enabled' if delayed_ack_enabled else 'Disabled'}")
+    log.info('connecting', f"Connecting to {server_address} with Nagle: {'Enabled' if nagle_enabled else 'Disabled'}, "
+                           f"Delayed-ACK: {'Enabled' if delayed_ack_enabled else 'Disabled'}")
     client_socket.connect(server_address)
     
     try:
@@ -40,7 +44,7 @@ def run_client(nagle_enabled, delayed_ack_enabled):
         chunk_size = 40
         
         start_time = time.time()
-        print("Starting data transfer...")
+        log.info('transfer_started', "Starting data transfer...")
         
         # Send data at specified rate for ~2 minutes
         running_time = 0
@@ -52,6 +56,7 @@ def run_client(nagle_enabled, delayed_ack_enabled):
                 
                 # Send the chunk
                 client_socket.sendall(chunk)
+                log.debug('sent', f"Sent {len(chunk)} bytes")
                 
                 # Update bytes sent
                 bytes_sent += len(chunk)
@@ -59,7 +64,7 @@ def run_client(nagle_enabled, delayed_ack_enabled):
                 # If we've sent all the data, start over
                 if bytes_sent >= data_size:
                     bytes_sent = 0
-                    print(f"Completed one cycle of sending 4KB file at {time.time() - start_time:.2f} seconds")
+                    log.info('cycle', f"Completed one cycle of sending 4KB file at {time.time() - start_time:.2f} seconds")
                 
                 # If we need to disable delayed ACK for each packet
                 if not delayed_ack_enabled:
@@ -73,10 +78,10 @@ def run_client(nagle_enabled, delayed_ack_enabled):
             
             running_time = time.time() - start_time
         
-        print(f"Transfer completed after {running_time:.2f} seconds")
+        log.info('transfer_completed', f"Transfer completed after {running_time:.2f} seconds")
         
     finally:
-        print("Closing socket")
+        log.info('closing', "Closing socket")
         client_socket.close()
 
 if __name__ == "__main__":
@@ -90,6 +95,11 @@ if __name__ == "__main__":
     parser.add_argument('--no-delayed-ack', dest='delayed_ack', action='store_false',
                         help='Disable Delayed ACK')
     
+    ringlog.add_arguments(parser)
     args = parser.parse_args()
     
-    run_client(args.nagle, args.delayed_ack)
+    log = ringlog.RingLog(**ringlog.options(args))
+    try:
+        run_client(args.nagle, args.delayed_ack)
+    finally:
+        log.close()
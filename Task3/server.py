@@ -1,8 +1,14 @@
+import sys
 import socket
 import time
+import signal
 import argparse
 import csv
 from datetime import datetime
+from common import ringlog
+
+# Replaced by a RingLog when run as a script
+log = ringlog.NullLog()
 
 def setup_server(nagle_enabled, delayed_ack_enabled):
     # Create a TCP/IP socket
@@ -18,7 +24,7 @@ def setup_server(nagle_enabled, delayed_ack_enabled):
         try:
             server_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
         except AttributeError:
-            print("TCP_QUICKACK not supported on this platform")
+            log.warning('no_quickack', "TCP_QUICKACK not supported on this platform")
     
     # Bind the socket to the address
     server_address = ('localhost', 10000)
@@ -32,12 +38,12 @@ def setup_server(nagle_enabled, delayed_ack_enabled):
 def run_server(nagle_enabled, delayed_ack_enabled):
     server_socket = setup_server(nagle_enabled, delayed_ack_enabled)
     
-    print(f"Server started with Nagle: {'Enabled' if nagle_enabled else 'Disabled'}, "
-          f"Delayed-ACK: {'Enabled' if delayed_ack_enabled else 'Disabled'}")
+    log.info('started', f"Server started with Nagle: {'Enabled' if nagle_enabled else 'Disabled'}, "
+                        f"Delayed-ACK: {'Enabled' if delayed_ack_enabled else 'Disabled'}")
     
-    print('Waiting for a connection...')
+    log.info('waiting', 'Waiting for a connection...')
     connection, client_address = server_socket.accept()
-    print(f'Connection from {client_address}')
+    log.info('connected', f'Connection from {client_address}')
     
     try:
         # Performance metrics
@@ -67,6 +73,7 @@ def run_server(nagle_enabled, delayed_ack_enabled):
                     actual_data_bytes += packet_size
                     max_packet_size = max(max_packet_size, packet_size)
                     data_buffer.extend(data)
+                    log.debug('received', f"Received {packet_size} bytes")
                     
                     # If we need to disable delayed ACK for each packet
                     if not delayed_ack_enabled:
@@ -155,6 +162,12 @@ if __name__ == "__main__":
     parser.add_argument('--no-delayed-ack', dest='delayed_ack', action='store_false',
                         help='Disable Delayed ACK')
     
+    ringlog.add_arguments(parser)
     args = parser.parse_args()
     
-    run_server(args.nagle, args.delayed_ack)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))  # run_experiments may terminate us; flush the log first
+    log = ringlog.RingLog(**ringlog.options(args))
+    try:
+        run_server(args.nagle, args.delayed_ack)
+    finally:
+        log.close()
@@ -0,0 +1,199 @@
+"""Vectorized decoding of classic pcap captures into columns of IPv4 TCP header fields.
+
+Shared by Task1 (analyze_results, capture) and Task2 (pcap_shards), so one
+capture decodes the same way in both. The file is memory-mapped and each
+header field is gathered for many records at once with NumPy fancy indexing,
+so no Python object is created per packet.
+"""
+
+import mmap
+import struct
+from array import array
+import numpy as np
+
+# Global header magic numbers -> (byte order, timestamp divisor)
+PCAP_MAGIC = {
+    b'\xd4\xc3\xb2\xa1': ('<', 1e6),   # little-endian, microseconds
+    b'\xa1\xb2\xc3\xd4': ('>', 1e6),   # big-endian, microseconds
+    b'\x4d\x3c\xb2\xa1': ('<', 1e9),   # little-endian, nanoseconds
+    b'\xa1\xb2\x3c\x4d': ('>', 1e9),   # big-endian, nanoseconds
+}
+
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_VLAN = (0x8100, 0x88a8)
+IPPROTO_TCP = 6
+
+GLOBAL_HEADER_LEN = 24
+RECORD_HEADER_LEN = 16
+# Records decoded per batch: bounds the offset list and the NumPy temporaries of decode_tcp
+CHUNK_RECORDS = 1 << 16
+
+
+def read_global_header(header):
+    """Parse the 24-byte pcap global header into (byte order, timestamp divisor, snaplen, linktype)"""
+    if len(header) < GLOBAL_HEADER_LEN or header[:4] not in PCAP_MAGIC:
+        raise ValueError('not a classic pcap file (pcapng is not supported)')
+    endian, ts_div = PCAP_MAGIC[header[:4]]
+    snaplen, linktype = struct.unpack_from(endian + 'II', header, 16)
+    return endian, ts_div, snaplen, linktype & 0x0fffffff
+
+
+def window_scale_option(options):
+    """Return the shift count of the TCP window-scale option in an options block, or -1"""
+    i = 0
+    while i < len(options):
+        kind = options[i]
+        if kind == 0:  # end of option list
+            break
+        if kind == 1:  # no-op
+            i += 1
+            continue
+        if i + 1 >= len(options) or options[i + 1] < 2:
+            break  # malformed or truncated
+        if kind == 3 and options[i + 1] == 3 and i + 2 < len(options):
+            return min(options[i + 2], 14)  # RFC 7323 caps the shift at 14
+        i += options[i + 1]
+    return -1
+
+
+# Columnar layout produced by decode_tcp (addresses are host-order IPv4 integers)
+TCP_DTYPE = np.dtype([
+    ('time', 'f8'),
+    ('src', 'u4'),
+    ('sport', 'u2'),
+    ('dst', 'u4'),
+    ('dport', 'u2'),
+    ('flags', 'u2'),
+    ('seq', 'u4'),
+    ('ack', 'u4'),
+    ('window', 'u2'),
+    ('payload_len', 'u4'),
+    ('wire_len', 'u4'),  # length of the frame on the wire, before any snaplen cut
+    ('wscale', 'i1'),  # window-scale shift announced by a SYN segment, -1 if absent (or not decoded)
+])
+
+
+def record_chunks(buf, endian, start=GLOBAL_HEADER_LEN, end=None, chunk=None):
+    """Walk the record headers from `start` and yield the byte offsets of the complete records
+    that start before `end` (default: the end of the buffer), `chunk` (CHUNK_RECORDS) at a time"""
+    incl_len = struct.Struct(endian + 'I').unpack_from
+    chunk = chunk or CHUNK_RECORDS
+    offsets = array('q')
+    size = len(buf)
+    end = size if end is None else end
+    pos = start
+    while pos < end and pos + RECORD_HEADER_LEN <= size:
+        next_pos = pos + RECORD_HEADER_LEN + incl_len(buf, pos + 8)[0]
+        if next_pos > size:
+            break  # truncated last record
+        offsets.append(pos)
+        if len(offsets) == chunk:
+            yield np.frombuffer(offsets, dtype=np.int64)
+            offsets = array('q')
+        pos = next_pos
+    if offsets:
+        yield np.frombuffer(offsets, dtype=np.int64)
+
+
+def _gather(data, pos, width, big_endian=True):
+    """Read an unsigned big/little-endian integer of `width` bytes at every position in `pos`"""
+    value = np.zeros(len(pos), dtype=np.uint64)
+    last = len(data) - 1
+    for i in range(width):
+        shift = 8 * (width - 1 - i) if big_endian else 8 * i
+        # Clamp so that short records never index past the buffer; callers mask them out
+        value |= data[np.minimum(pos + i, last)].astype(np.uint64) << np.uint64(shift)
+    return value
+
+
+def decode_tcp(data, offsets, endian, ts_div, linktype, options=True):
+    """TCP_DTYPE columns of the IPv4 TCP packets among the records at `offsets` of `data`
+    (the whole capture as a uint8 array). With options=False the SYN options are not
+    parsed and wscale stays -1."""
+    big = endian == '>'
+    last = len(data) - 1
+
+    def at(pos):
+        return np.minimum(pos, last)
+
+    ts_sec = _gather(data, offsets, 4, big)
+    ts_frac = _gather(data, offsets + 4, 4, big)
+    caplen = _gather(data, offsets + 8, 4, big).astype(np.int64)
+    wire_len = _gather(data, offsets + 12, 4, big)
+    frame = offsets + RECORD_HEADER_LEN
+    frame_end = frame + caplen
+
+    # Link layer -> offset of the IPv4 header
+    if linktype in (LINKTYPE_ETHERNET, LINKTYPE_LINUX_SLL):
+        type_pos = 12 if linktype == LINKTYPE_ETHERNET else 14
+        ip = frame + type_pos + 2
+        ethertype = _gather(data, frame + type_pos, 2)
+        for _ in range(2):  # up to two stacked VLAN tags
+            vlan = np.isin(ethertype, ETHERTYPE_VLAN) & (ip + 4 <= frame_end)
+            ethertype = np.where(vlan, _gather(data, ip + 2, 2), ethertype)
+            ip = np.where(vlan, ip + 4, ip)
+        ok = ethertype == ETHERTYPE_IPV4
+    elif linktype == LINKTYPE_RAW:
+        ip = frame
+        ok = (data[at(ip)] >> 4) == 4
+    else:
+        raise ValueError(f'unsupported pcap linktype {linktype}')
+
+    ok &= ip + 20 <= frame_end
+    ihl = (data[at(ip)] & 0x0f).astype(np.int64) * 4
+    ok &= (data[at(ip + 9)] == IPPROTO_TCP) & (ihl >= 20)
+    tcp = ip + ihl
+    ok &= tcp + 20 <= frame_end
+
+    ip, tcp = ip[ok], tcp[ok]
+    cols = np.empty(len(ip), dtype=TCP_DTYPE)
+    cols['time'] = ts_sec[ok] + ts_frac[ok] / ts_div
+    cols['src'] = _gather(data, ip + 12, 4)
+    cols['dst'] = _gather(data, ip + 16, 4)
+    cols['sport'] = _gather(data, tcp, 2)
+    cols['dport'] = _gather(data, tcp + 2, 2)
+    cols['seq'] = _gather(data, tcp + 4, 4)
+    cols['ack'] = _gather(data, tcp + 8, 4)
+    off_flags = _gather(data, tcp + 12, 2)
+    cols['flags'] = off_flags & 0x01ff
+    cols['window'] = _gather(data, tcp + 14, 2)
+    total_len = _gather(data, ip + 2, 2).astype(np.int64)
+    data_off = (off_flags >> np.uint64(12)).astype(np.int64) * 4
+    cols['payload_len'] = np.maximum(total_len - ihl[ok] - data_off, 0)
+    cols['wire_len'] = wire_len[ok]
+
+    # Options are only decoded for the handful of SYN segments that can carry a window scale
+    cols['wscale'] = -1
+    if options:
+        syn = np.flatnonzero(cols['flags'] & 0x02)
+        opt_end = np.minimum(tcp[syn] + data_off[syn], frame_end[ok][syn])
+        for i, start, end in zip(syn, tcp[syn] + 20, opt_end):
+            cols['wscale'][i] = window_scale_option(data[start:end].tobytes())
+    return cols
+
+
+def read_tcp_columns(file_path):
+    """Decode every IPv4 TCP packet of a capture into a TCP_DTYPE structured array.
+
+    Records are decoded CHUNK_RECORDS at a time, so the offsets and NumPy
+    temporaries stay bounded however large the capture is; only the result grows with it.
+    """
+    with open(file_path, 'rb') as f:
+        if f.seek(0, 2) < GLOBAL_HEADER_LEN:
+            raise ValueError('not a classic pcap file (pcapng is not supported)')
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    data = None
+    try:
+        endian, ts_div, _, linktype = read_global_header(mm[:GLOBAL_HEADER_LEN])
+        data = np.frombuffer(mm, dtype=np.uint8)
+        parts = [decode_tcp(data, offsets, endian, ts_div, linktype) for offsets in record_chunks(mm, endian)]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=TCP_DTYPE)
+    finally:
+        # Release the buffer export before the mapping is closed
+        del data
+        mm.close()
@@ -0,0 +1,25 @@
+"""Builders for small synthetic captures, used by the tests of both tasks' pcap code"""
+
+import struct
+
+
+def tcp_frame(src, sport, dst, dport, flags, seq=0, ack=0, window=1000, payload=b'', options=b'',
+              vlan=(), proto=6):
+    """An Ethernet/IPv4/TCP frame; `vlan` lists the TPIDs of stacked VLAN tags (outermost first)"""
+    tcp = struct.pack('!HHIIHHHH', sport, dport, seq, ack, ((20 + len(options)) // 4) << 12 | flags,
+                      window, 0, 0) + options + payload
+    ip = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + len(tcp), 0, 0, 64, proto, 0,
+                     bytes(map(int, src.split('.'))), bytes(map(int, dst.split('.'))))
+    tags = b''.join(struct.pack('!HH', tpid, 1) for tpid in vlan)
+    return b'\x00' * 12 + tags + b'\x08\x00' + ip + tcp
+
+
+def write_pcap(path, frames, endian='<', nano=False, linktype=1, snaplen=65535):
+    """Write (time, frame) pairs as a classic pcap, cutting frames at `snaplen`"""
+    magic = 0xa1b23c4d if nano else 0xa1b2c3d4
+    with open(path, 'wb') as f:
+        f.write(struct.pack(endian + 'IHHiIII', magic, 2, 4, 0, 0, snaplen, linktype))
+        for when, frame in frames:
+            sec, frac = divmod(round(when * (1e9 if nano else 1e6)), 10 ** 9 if nano else 10 ** 6)
+            caplen = min(len(frame), snaplen)
+            f.write(struct.pack(endian + 'IIII', sec, frac, caplen, len(frame)) + frame[:caplen])
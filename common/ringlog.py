@@ -0,0 +1,194 @@
+"""Non-blocking structured logging for the Task2/Task3 servers and clients.
+
+Log calls pack a length-prefixed record into a preallocated byte ring and return;
+a background thread drains the ring every `flush_interval` (or sooner once it
+is half full) and writes each batch with a single write. When the writer
+cannot keep up the ring fills and new records are counted as dropped, so the
+hot path never waits on a terminal, pipe or disk.
+
+Formats: 'text' (the message only, like the old prints), 'jsonl', and
+'binary' (the raw records; `python ringlog.py FILE` turns them into JSONL).
+"""
+
+import sys
+import json
+import time
+import struct
+import argparse
+import threading
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVELS = {'debug': DEBUG, 'info': INFO, 'warning': WARNING, 'error': ERROR}
+LEVEL_NAMES = {value: name for name, value in LEVELS.items()}
+
+# time, level, event name length, message length; followed by the name and message bytes
+HEADER = struct.Struct('<dBBH')
+MAX_EVENT = 255
+MAX_MESSAGE = 65535  # longer messages are cut and end in TRUNCATED
+TRUNCATED = b'...'
+CAPACITY = 8 << 20  # bytes
+FLUSH_INTERVAL = 0.2
+
+
+class RingLog:
+    """Single-producer byte ring of variable-length log records with a background writer"""
+
+    def __init__(self, path=None, fmt='text', level=INFO, sample=1, capacity=CAPACITY,
+                 flush_interval=FLUSH_INTERVAL):
+        self.fmt = fmt
+        self.level = level
+        self.sample = sample  # keep 1 of every `sample` records below WARNING
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.ring = bytearray(capacity)
+        self.head = 0  # bytes written, only advanced by the logging thread
+        self.tail = 0  # bytes flushed, only advanced by the writer thread
+        self.seen = 0
+        self.dropped = 0
+        if path is None:
+            self.out = sys.stdout.buffer
+        else:
+            self.out = open(path, 'ab')
+        self.wakeup = threading.Event()
+        self.closing = False
+        self.thread = threading.Thread(target=self._run, name='ringlog', daemon=True)
+        self.thread.start()
+
+    def log(self, level, event, message=''):
+        if level < self.level:
+            return
+        if level < WARNING and self.sample > 1:
+            self.seen += 1
+            if self.seen % self.sample:
+                return
+        name = event.encode()[:MAX_EVENT]
+        text = message.encode(errors='replace')
+        if len(text) > MAX_MESSAGE:
+            text = text[:MAX_MESSAGE - len(TRUNCATED)] + TRUNCATED
+        size = HEADER.size + len(name) + len(text)
+        used = self.head - self.tail
+        if used + size > self.capacity:
+            self.dropped += 1
+            return
+        record = HEADER.pack(time.time(), level, len(name), len(text)) + name + text
+        pos = self.head % self.capacity
+        first = min(size, self.capacity - pos)
+        self.ring[pos:pos + first] = record[:first]
+        if first < size:
+            self.ring[:size - first] = record[first:]  # wraps around the end of the ring
+        self.head += size
+        if used < self.capacity // 2 <= used + size:
+            self.wakeup.set()
+
+    def debug(self, event, message=''):
+        self.log(DEBUG, event, message)
+
+    def info(self, event, message=''):
+        self.log(INFO, event, message)
+
+    def warning(self, event, message=''):
+        self.log(WARNING, event, message)
+
+    def error(self, event, message=''):
+        self.log(ERROR, event, message)
+
+    def _run(self):
+        while not self.closing:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        head, tail = self.head, self.tail
+        if head == tail:
+            return
+        start, end = tail % self.capacity, head % self.capacity
+        if start < end:
+            batch = self.ring[start:end]
+        else:
+            batch = self.ring[start:] + self.ring[:end]
+        self.tail = head  # the bytes are free again once they are copied out
+        if self.fmt == 'binary':
+            data = batch
+        else:
+            data = ''.join(map(self._format, records(batch))).encode()
+        self.out.write(data)
+        self.out.flush()
+
+    def _format(self, record):
+        if self.fmt == 'jsonl':
+            return to_json(record) + '\n'
+        return record[3] + '\n'
+
+    def close(self):
+        """Stop the writer, flush what is left and report drops"""
+        self.closing = True
+        self.wakeup.set()
+        self.thread.join()
+        self.flush()
+        if self.dropped:
+            sys.stderr.write(f"ringlog: dropped {self.dropped} records\n")
+        if self.out is not sys.stdout.buffer:
+            self.out.close()
+
+
+class NullLog:
+    """Stand-in that discards everything, for code used without a configured log"""
+
+    level = ERROR + 1
+    dropped = 0
+
+    def log(self, level, event, message=''):
+        pass
+
+    debug = info = warning = error = lambda self, event, message='': None
+
+    def close(self):
+        pass
+
+
+def records(data):
+    """Unpack binary records into (time, level, event, message) tuples, ignoring a cut-off last record"""
+    pos = 0
+    while pos + HEADER.size <= len(data):
+        when, level, event_len, message_len = HEADER.unpack_from(data, pos)
+        body = pos + HEADER.size
+        end = body + event_len + message_len
+        if end > len(data):
+            return
+        yield (when, level, bytes(data[body:body + event_len]).decode(errors='ignore'),
+               bytes(data[body + event_len:end]).decode(errors='ignore'))
+        pos = end
+
+
+def to_json(record):
+    when, level, event, message = record
+    return json.dumps({'time': when, 'level': LEVEL_NAMES.get(level, level), 'event': event, 'message': message})
+
+
+def add_arguments(parser):
+    """The --log* options shared by the scripts that log through RingLog"""
+    parser.add_argument('--log', default=None, help='Log file (default: stdout)')
+    parser.add_argument('--log-format', choices=('text', 'jsonl', 'binary'), default='text',
+                        help='Log record format')
+    parser.add_argument('--log-level', choices=sorted(LEVELS, key=LEVELS.get), default='info',
+                        help='Drop records below this level')
+    parser.add_argument('--log-sample', type=int, default=1, metavar='N',
+                        help='Keep 1 of every N debug/info records')
+
+
+def options(args):
+    """RingLog keyword arguments from parsed add_arguments() options"""
+    return {'path': args.log, 'fmt': args.log_format, 'level': LEVELS[args.log_level],
+            'sample': args.log_sample}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Print a binary ringlog file as JSON lines')
+    parser.add_argument('file', help='File written with --log-format binary')
+    args = parser.parse_args()
+
+    with open(args.file, 'rb') as f:
+        data = f.read()
+    for record in records(data):
+        print(to_json(record))